@@ -0,0 +1,226 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: the batch operations work on whole columns (data[0::3] etc.) with
+# map() over operator functions, so the per-element loop runs in C.
+
+import math
+from array import array
+from operator import add, mul, sub
+from regular_obj import Vector, Edge, Plane, Bound, Face
+
+
+class VectorArray:
+  """Stores N 3D points in one contiguous float64 buffer, row by row."""
+  def __init__(self, points=None):
+    """Initializes a VectorArray object."""
+    self.data: array = self._init_data(points)
+
+  @staticmethod
+  def _init_data(points):
+    """Returns a flat (x0, y0, z0, x1, ...) buffer of the points."""
+    if isinstance(points, array):
+      return points
+    if points is None:
+      return array('d')
+    return array('d', (c for p in points for c in p))
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'VectorArray({len(self)} points)'
+
+  def __len__(self):
+    """Returns the number of points."""
+    return len(self.data) // 3
+
+  def __getitem__(self, i):
+    """Returns point i as a Vector."""
+    return Vector(self.row(i))
+
+  def __iter__(self):
+    """Iterates the points as Vector objects."""
+    for i in range(len(self)):
+      yield self[i]
+
+  def __add__(self, other):
+    """Adds row by row (or one Vector to every row)."""
+    return self._zip(self, other, add)
+
+  def __sub__(self, other):
+    """Subtracts row by row (or one Vector from every row)."""
+    return self._zip(self, other, sub)
+
+  def __mul__(self, scalar):
+    """Performs scalar multiplication of every row."""
+    return VectorArray(array('d', (scalar * c for c in self.data)))
+
+  def __rmul__(self, scalar):
+    """Performs right-hand scalar multiplication."""
+    return self * scalar
+
+  @staticmethod
+  def _columns(points, n):
+    """Returns the x, y and z columns, broadcasting a single point to n."""
+    if isinstance(points, VectorArray):
+      return points.data[0::3], points.data[1::3], points.data[2::3]
+    x, y, z = points
+    return array('d', [x]) * n, array('d', [y]) * n, array('d', [z]) * n
+
+  @staticmethod
+  def _interleave(xs, ys, zs):
+    """Returns a VectorArray from x, y and z columns."""
+    data = array('d', bytes(24 * len(xs)))
+    data[0::3], data[1::3], data[2::3] = xs, ys, zs
+    return VectorArray(data)
+
+  @staticmethod
+  def _zip(a, b, op):
+    """Applies op element-wise to two point batches."""
+    n = len(a)
+    (ax, ay, az), (bx, by, bz) = a._columns(a, n), a._columns(b, n)
+    return VectorArray._interleave(array('d', map(op, ax, bx)),
+                                   array('d', map(op, ay, by)),
+                                   array('d', map(op, az, bz)))
+
+  def row(self, i):
+    """Returns point i as an (x, y, z) tuple."""
+    if i < 0:
+      i += len(self)
+    return tuple(self.data[3*i:3*i+3])
+
+  def append(self, v):
+    """Appends a point, returning its index."""
+    self.data.extend(v)
+    return len(self) - 1
+
+  def take(self, indices):
+    """Returns the points at the indices, as a new VectorArray."""
+    data = self.data
+    return VectorArray(array('d', (data[3*i+k] for i in indices
+                                   for k in range(3))))
+
+  def dot(self, other):
+    """Returns the row-wise dot products."""
+    n = len(self)
+    (ax, ay, az), (bx, by, bz) = self._columns(self, n), \
+                                 self._columns(other, n)
+    return array('d', map(add, map(add, map(mul, ax, bx), map(mul, ay, by)),
+                          map(mul, az, bz)))
+
+  def cross(self, other):
+    """Returns the row-wise cross products."""
+    n = len(self)
+    (ax, ay, az), (bx, by, bz) = self._columns(self, n), \
+                                 self._columns(other, n)
+    cx = array('d', map(sub, map(mul, ay, bz), map(mul, az, by)))
+    cy = array('d', map(sub, map(mul, az, bx), map(mul, ax, bz)))
+    cz = array('d', map(sub, map(mul, ax, by), map(mul, ay, bx)))
+    return self._interleave(cx, cy, cz)
+
+  def norm(self):
+    """Returns the row-wise norms."""
+    data = self.data
+    return array('d', map(math.hypot, data[0::3], data[1::3], data[2::3]))
+
+  def unit(self):
+    """Returns the row-wise unit vectors (zero rows stay zero)."""
+    scale = array('d', (1/n if n else 0.0 for n in self.norm()))
+    xs, ys, zs = self.data[0::3], self.data[1::3], self.data[2::3]
+    return self._interleave(array('d', map(mul, xs, scale)),
+                            array('d', map(mul, ys, scale)),
+                            array('d', map(mul, zs, scale)))
+
+
+class FaceSoA:
+  """Stores planar faces' loops as indices into one VectorArray."""
+  def __init__(self, faces=None):
+    """Initializes a FaceSoA object."""
+    self.vertices = VectorArray()
+    # Loop l's vertices are loop_indices[loop_offsets[l]:loop_offsets[l+1]].
+    self.loop_offsets = array('q', [0])
+    self.loop_indices = array('q')
+    # Face i's loops are face_loops[i]:face_loops[i+1], the outer one first.
+    self.face_loops = array('q', [0])
+    self.anchors = VectorArray()
+    self.normals = VectorArray()
+    self.vertex_ids: dict = dict()
+    for face in faces or ():
+      self.append(face)
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'FaceSoA({len(self)} faces, {len(self.vertices)} vertices)'
+
+  def __len__(self):
+    """Returns the number of faces."""
+    return len(self.face_loops) - 1
+
+  def _vertex_index(self, v):
+    """Returns the index of a vertex, adding it when it is new."""
+    key = tuple(v)
+    index = self.vertex_ids.get(key)
+    if index is None:
+      index = self.vertices.append(key)
+      self.vertex_ids[key] = index
+    return index
+
+  def append(self, face):
+    """Adds a Face with its holes, sharing the vertices already stored."""
+    for bound in [face.bound] + face.holes:
+      for v in bound.get_vertex_loop():
+        self.loop_indices.append(self._vertex_index(v))
+      self.loop_offsets.append(len(self.loop_indices))
+    self.face_loops.append(len(self.loop_offsets) - 1)
+    self.anchors.append(face.plane.location)
+    self.normals.append(face.plane.axis)
+    return len(self) - 1
+
+  def loops_of(self, i):
+    """Returns the loop ids of face i (its outer loop first)."""
+    return range(self.face_loops[i], self.face_loops[i+1])
+
+  def loop(self, l):
+    """Returns the vertex indices of loop l."""
+    return self.loop_indices[self.loop_offsets[l]:self.loop_offsets[l+1]]
+
+  def edges(self):
+    """Returns the (start, end) index arrays of every loop's edges."""
+    starts, ends = array('q'), array('q')
+    for l in range(len(self.loop_offsets) - 1):
+      loop = self.loop(l)
+      starts.extend(loop)
+      ends.extend(loop[1:])
+      ends.append(loop[0])
+    return starts, ends
+
+  def areas(self):
+    """Returns every face's area less its holes, by the shoelace formula."""
+    starts, ends = self.edges()
+    crosses = self.vertices.take(starts).cross(self.vertices.take(ends))
+    xs, ys, zs = crosses.data[0::3], crosses.data[1::3], crosses.data[2::3]
+    loop_areas = array('d')
+    for l in range(len(self.loop_offsets) - 1):
+      lo, hi = self.loop_offsets[l], self.loop_offsets[l+1]
+      loop_areas.append(math.hypot(sum(xs[lo:hi]), sum(ys[lo:hi]),
+                                   sum(zs[lo:hi])) / 2)
+    areas = array('d')
+    for i in range(len(self)):
+      first, end = self.face_loops[i], self.face_loops[i+1]
+      areas.append(loop_areas[first] - sum(loop_areas[first+1:end]))
+    return areas
+
+  def face(self, i):
+    """Returns face i as a Face object, with its holes."""
+    bounds = []
+    for l in self.loops_of(i):
+      loop = [self.vertices.row(k) for k in self.loop(l)]
+      bounds.append(Bound([Edge(loop[k-1], loop[k])
+                           for k in range(len(loop))]))
+    plane = Plane(self.anchors.row(i), self.normals.row(i))
+    return Face(plane, bounds[0], bounds[1:])
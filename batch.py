@@ -0,0 +1,127 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+import argparse
+import glob
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from regular_obj import Face
+from stp_reader import STPFile, FaceSummary, collect_faces
+
+
+def expand_paths(patterns) -> list:
+  """Returns the files matched by a pattern or a list of patterns."""
+  if isinstance(patterns, str):
+    patterns = [patterns]
+  paths = []
+  for pattern in patterns:
+    matches = sorted(glob.glob(pattern))
+    paths.extend(matches if matches else [pattern])
+  return paths
+
+
+def analyze_file(path, precision, types, backend='native',
+                 cache_dir=None) -> dict:
+  """Reads one file and returns its statistics (runs inside a worker)."""
+  start = time.perf_counter()
+  report = {'path': path, 'face_types': {}, 'unreadable': 0,
+            'unreadable_types': [], 'faces': 0, 'directions': [],
+            'seconds': 0.0, 'error': None}
+  try:
+    design = STPFile(path, backend, cache_dir)
+    # Note: only counts are reported, so faces are summarized as streamed;
+    # directions are told apart at the precision.
+    faces = collect_faces(design.iter_3D_objects(types, cache_dir is not None),
+                          summary=True, decimals=precision)
+    report['face_types'] = dict(design.face_types)
+    report['unreadable'] = design.unreadable_count
+    report['unreadable_types'] = sorted(design.unreadable_types)
+    report['faces'] = len(faces)
+    report['directions'] = [{'direction': list(direction.coordinates),
+                             'faces': count}
+                            for direction, (count, _, _)
+                            in faces.parallel.items()]
+  except Exception as e:
+    report['error'] = f'{type(e).__name__}: {e}'
+  report['seconds'] = time.perf_counter() - start
+  return report
+
+
+def sweep_precisions(path, precisions, backend='native',
+                     cache_dir=None) -> dict:
+  """Returns per-precision face and direction counts of one conversion."""
+  # Note: geometry is converted unrounded, so the file is read only once.
+  design = STPFile(path, backend, cache_dir)
+  faces = [f for _, f in design.iter_3D_objects(['advanced_face'])
+           if isinstance(f, Face)]
+  sweep = dict()
+  for precision in precisions:
+    summary = FaceSummary(faces, decimals=precision)
+    sweep[precision] = {'faces': len(summary),
+                        'directions': len(summary.parallel)}
+  return sweep
+
+
+def summarize(reports) -> dict:
+  """Merges per-file reports into totals."""
+  totals = {'files': len(reports), 'failed': 0, 'face_types': {},
+            'unreadable': 0, 'unreadable_types': set(), 'faces': 0,
+            'seconds': 0.0}
+  for report in reports:
+    if report['error'] is not None:
+      totals['failed'] += 1
+    for k, n in report['face_types'].items():
+      totals['face_types'][k] = totals['face_types'].get(k, 0) + n
+    totals['unreadable'] += report['unreadable']
+    totals['unreadable_types'].update(report['unreadable_types'])
+    totals['faces'] += report['faces']
+    totals['seconds'] += report['seconds']
+  totals['unreadable_types'] = sorted(totals['unreadable_types'])
+  return totals
+
+
+def analyze_batch(paths, precision, types, backend='native',
+                  workers=None, cache_dir=None) -> dict:
+  """Analyzes many files in a process pool, one file per task."""
+  files = expand_paths(paths)
+  start = time.perf_counter()
+  task = partial(analyze_file, precision=precision, types=types,
+                 backend=backend, cache_dir=cache_dir)
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    reports = list(pool.map(task, files, chunksize=1))
+  totals = summarize(reports)
+  totals['wall_seconds'] = time.perf_counter() - start
+  return {'files': reports, 'totals': totals}
+
+
+# ------Execution below.------
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Analyzes many STP files.')
+  parser.add_argument('paths', nargs='+', help='files or glob patterns')
+  parser.add_argument('--precision', type=int, default=3)
+  parser.add_argument('--types', nargs='+',
+                      default=['advanced_face', 'vertex_point'])
+  parser.add_argument('--backend', default='native',
+                      choices=['steptools', 'native'])
+  parser.add_argument('--workers', type=int, default=None)
+  parser.add_argument('--cache-dir', default=None)
+  parser.add_argument('--out', default=None, help='JSON report path')
+  args = parser.parse_args()
+
+  result = analyze_batch(args.paths, args.precision, args.types,
+                         args.backend, args.workers, args.cache_dir)
+  if args.out is None:
+    print(json.dumps(result, indent=2))
+  else:
+    with open(args.out, 'w') as out:
+      json.dump(result, out, indent=2)
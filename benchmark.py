@@ -0,0 +1,215 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: times are taken with tracemalloc off (best of --repeat runs), then
+# one more run with tracemalloc on gives each stage's peak memory.
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from regular_obj import Bound, Face
+from stp_reader import STPFile, FaceCollection
+
+
+STP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stp_files')
+STAGES = ('open', 'traversal', 'convert', 'bound', 'collection', 'shadow')
+DEFAULT_FILES = ('test1.stp', 'test2.stp', 'test3.stp', 'test4.stp',
+                 'sample_surface.stp', 'hard.stp', 'hud_shell.stp',
+                 'surface.stp')
+
+
+class StageTimer:
+  """Measures the time (and optionally peak memory) of named stages."""
+  def __init__(self, memory=False):
+    """Initializes a StageTimer object."""
+    self.memory = memory
+    self.seconds: dict = dict()
+    self.peaks: dict = dict()
+    self.items: dict = dict()
+
+  def run(self, stage, func, *args):
+    """Runs func(*args) as a stage, returning (result, number of items)."""
+    if self.memory:
+      tracemalloc.reset_peak()
+      base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result, items = func(*args)
+    self.seconds[stage] = time.perf_counter() - start
+    if self.memory:
+      self.peaks[stage] = tracemalloc.get_traced_memory()[1] - base
+    self.items[stage] = items
+    return result
+
+
+def _open(path, backend):
+  """Opens (and, natively, indexes) the file."""
+  design = STPFile(path, backend)
+  stp_file = design._open()
+  return design, len(getattr(stp_file, 'ids', ()))
+
+
+def _traverse(design, types):
+  """Visits the entities of the requested types without converting them."""
+  keys = set(types)
+  entities = [obj for obj in design._cursor(keys)
+              if design.step.type(obj) in keys]
+  return entities, len(entities)
+
+
+def _convert(design, entities):
+  """Converts the entities, as get_3D_objects does."""
+  objects = dict()
+  for obj in entities:
+    design._count_face_type(obj)
+    try:
+      objects.setdefault(design.step.type(obj), []).append(
+        design._convert(obj))
+    except Exception:
+      design.unreadable.append(obj)
+      design.unreadable_count += 1
+  return objects, len(entities)
+
+
+def _rebuild_bounds(faces):
+  """Builds every face's Bounds from its loops, as its first use would."""
+  # Note: from face.loops, so the faces' own lazy Bounds stay unbuilt and
+  # nothing but this one build is timed.
+  return [Bound(loop=loop) for face in faces
+          for loop in [face.loops[0]] + face.loops[1]], len(faces)
+
+
+def _collect(faces, decimals):
+  """Groups and sorts the faces."""
+  return FaceCollection(faces, decimals=decimals), len(faces)
+
+
+def _shadow(collection):
+  """Finds the shadowing pairs of every direction."""
+  pairs = [pair for direction in collection.parallel
+           for pair in collection.overlapping_pairs(direction)]
+  return pairs, len(collection)
+
+
+def run_stages(path, types, backend='native', memory=False,
+               decimals=None) -> StageTimer:
+  """Runs every stage once on a file, querying at decimals."""
+  timer = StageTimer(memory)
+  design = timer.run('open', _open, path, backend)
+  entities = timer.run('traversal', _traverse, design, types)
+  objects = timer.run('convert', _convert, design, entities)
+  faces = [f for f in objects.get('advanced_face', []) if isinstance(f, Face)]
+  timer.run('bound', _rebuild_bounds, faces)
+  collection = timer.run('collection', _collect, faces, decimals)
+  timer.run('shadow', _shadow, collection)
+  return timer
+
+
+def benchmark_file(path, precision=3, types=('advanced_face',),
+                   backend='native', repeat=3) -> dict:
+  """Returns the per-stage seconds, peak bytes and items/sec of a file."""
+  # Note: the precision goes to the collection (and so to its queries),
+  # leaving Config.DECIMALS as the caller set it.
+  runs = [run_stages(path, types, backend, decimals=precision)
+          for _ in range(repeat)]
+  tracemalloc.start()
+  try:
+    peaks = run_stages(path, types, backend, True, precision).peaks
+  finally:
+    tracemalloc.stop()
+  stages = dict()
+  for stage in STAGES:
+    seconds = min(run.seconds[stage] for run in runs)
+    items = runs[0].items[stage]
+    stages[stage] = {'seconds': seconds, 'peak_bytes': peaks[stage],
+                     'items': items,
+                     'items_per_sec': items / seconds if seconds else None}
+  total = sum(s['seconds'] for s in stages.values())
+  entities = stages['open']['items']
+  return {'path': path, 'stages': stages, 'seconds': total,
+          'peak_bytes': max(peaks.values()), 'entities': entities,
+          'entities_per_sec': entities / total if total else None}
+
+
+def benchmark(paths, precision=3, types=('advanced_face',),
+              backend='native', repeat=3) -> dict:
+  """Benchmarks many files."""
+  return {'precision': precision, 'types': sorted(types),
+          'backend': backend, 'repeat': repeat,
+          'python': sys.version.split()[0],
+          'files': {os.path.basename(p): benchmark_file(p, precision, types,
+                                                        backend, repeat)
+                    for p in paths}}
+
+
+def compare(result, baseline, threshold=0.25, min_seconds=0.001) -> list:
+  """Returns the stages that got slower than baseline by over threshold."""
+  regressions = []
+  for name, report in result['files'].items():
+    old = baseline['files'].get(name)
+    if old is None:
+      continue
+    for stage, new_stage in report['stages'].items():
+      old_seconds = old['stages'].get(stage, {}).get('seconds')
+      # Note: sub-millisecond stages are mostly timer noise.
+      if old_seconds and new_stage['seconds'] > min_seconds and \
+         new_stage['seconds'] > old_seconds * (1+threshold):
+        regressions.append({'file': name, 'stage': stage,
+                            'baseline': old_seconds,
+                            'seconds': new_stage['seconds'],
+                            'ratio': new_stage['seconds'] / old_seconds})
+  return regressions
+
+
+def print_report(result, regressions=None):
+  """Prints a table of stage times per file."""
+  print(f'{"file":<20}' + ''.join(f'{s:>12}' for s in STAGES) +
+        f'{"peak MiB":>10}{"ent/s":>10}')
+  for name, report in result['files'].items():
+    cells = ''.join(f'{report["stages"][s]["seconds"]*1000:>10.1f}ms'
+                    for s in STAGES)
+    rate = report['entities_per_sec'] or 0
+    print(f'{name:<20}{cells}{report["peak_bytes"]/2**20:>10.2f}'
+          f'{rate:>10.0f}')
+  for r in regressions or ():
+    print(f'- Regression: {r["file"]} {r["stage"]} {r["baseline"]:.4f}s '
+          f'-> {r["seconds"]:.4f}s (x{r["ratio"]:.2f})')
+
+
+# ------Execution below.------
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmarks the STP reader.')
+  parser.add_argument('paths', nargs='*', help='defaults to stp_files/')
+  parser.add_argument('--precision', type=int, default=3)
+  parser.add_argument('--types', nargs='+', default=['advanced_face'])
+  parser.add_argument('--backend', default='native',
+                      choices=['steptools', 'native'])
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--out', default=None, help='JSON result path')
+  parser.add_argument('--baseline', default=None, help='JSON to compare to')
+  parser.add_argument('--threshold', type=float, default=0.25)
+  args = parser.parse_args()
+
+  paths = args.paths or [os.path.join(STP_DIR, f) for f in DEFAULT_FILES]
+  result = benchmark(paths, args.precision, args.types, args.backend,
+                     args.repeat)
+  regressions = None
+  if args.baseline is not None:
+    with open(args.baseline) as f:
+      regressions = compare(result, json.load(f), args.threshold)
+    result['regressions'] = regressions
+  print_report(result, regressions)
+  if args.out is not None:
+    with open(args.out, 'w') as out:
+      json.dump(result, out, indent=2)
+  sys.exit(1 if regressions else 0)
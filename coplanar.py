@@ -0,0 +1,149 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: coplanar faces are merged when they share whole edges (end points
+# within the tolerance). An edge used by two faces of a group is inside the
+# merged region; the edges used once are its boundary.
+
+import math
+from regular_obj import Bound, Edge, Face, tolerance
+from direction_index import NEIGHBOURS
+
+
+class MergedFace(Face):
+  """Stores a Face made of coplanar faces sharing edges."""
+  def __init__(self, plane=None, bound=None, holes=None, sources=None):
+    """Initializes a MergedFace object."""
+    super().__init__(plane, bound, holes)
+    # Note: the faces merged, in bucket order.
+    self.sources: list = sources if sources is not None else []
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'MergedFace({len(self.sources)} faces, {self.plane})'
+
+
+def _point_key(v, tol, cells):
+  """Returns a point's key: the first point seen within tol of it."""
+  # Note: points are filed in a grid of the tolerance's size, and the 27
+  # neighbouring cells are checked, as DirectionIndex does, so two points
+  # straddling a cell boundary still share one key.
+  coordinates = tuple(v)
+  i, j, k = (math.floor(c / tol) for c in coordinates)
+  for di, dj, dk in NEIGHBOURS:
+    for anchor in cells.get((i+di, j+dj, k+dk), ()):
+      if all(abs(a-b) <= tol for a, b in zip(anchor, coordinates)):
+        return anchor
+  cells.setdefault((i, j, k), []).append(coordinates)
+  return coordinates
+
+
+def _edge_key(edge, tol, cells):
+  """Returns an edge's key, the same both ways round."""
+  a, b = _point_key(edge.start, tol, cells), _point_key(edge.end, tol, cells)
+  return (a, b) if a <= b else (b, a)
+
+
+def _loops_of(face):
+  """Returns the edges of every loop of a face."""
+  return [face.bound.edges] + [hole.edges for hole in face.holes]
+
+
+def coplanar_clusters(parallel, positions, tol=None) -> list:
+  """Returns the groups of faces on one plane, from sorted buckets."""
+  # Note: one sweep per bucket; a group spans tol from its first face.
+  tol = tolerance(tol)
+  clusters = []
+  for direction, faces in parallel.items():
+    start = None
+    for pos, face in zip(positions[direction], faces):
+      if start is None or pos - start > tol:
+        start = pos
+        clusters.append([])
+      clusters[-1].append(face)
+  return clusters
+
+
+def _components(faces, tol):
+  """Returns the groups of faces connected through shared edges."""
+  parent = list(range(len(faces)))
+
+  def find(i):
+    while parent[i] != i:
+      parent[i] = parent[parent[i]]
+      i = parent[i]
+    return i
+
+  owner, cells = dict(), dict()
+  for i, face in enumerate(faces):
+    for loop in _loops_of(face):
+      for edge in loop:
+        j = owner.setdefault(_edge_key(edge, tol, cells), i)
+        if j != i:
+          parent[find(i)] = find(j)
+  groups = dict()
+  for i in range(len(faces)):
+    groups.setdefault(find(i), []).append(faces[i])
+  return list(groups.values())
+
+
+def _boundary_loops(faces, tol):
+  """Returns the boundary edges of faces as loops, or None if not simple."""
+  count, edges, cells = dict(), dict(), dict()
+  for face in faces:
+    for loop in _loops_of(face):
+      for edge in loop:
+        key = _edge_key(edge, tol, cells)
+        count[key] = count.get(key, 0) + 1
+        # Note: between the keys' points, so near ends meet exactly.
+        edges.setdefault(key, Edge(*key))
+  boundary = [key for key in count if count[key] == 1]
+  neighbours = dict()
+  for a, b in boundary:
+    neighbours.setdefault(a, []).append(b)
+    neighbours.setdefault(b, []).append(a)
+  if any(len(n) != 2 for n in neighbours.values()):
+    return None # Note: faces touching at a corner do not make a loop.
+  loops, seen = [], set()
+  for start in neighbours:
+    if start in seen:
+      continue
+    loop, stack = [], [start]
+    seen.add(start)
+    while stack:
+      a = stack.pop()
+      for b in neighbours[a]:
+        if a <= b: # Note: each edge once, from its lower end.
+          loop.append(edges[(a, b)])
+        if b not in seen:
+          seen.add(b)
+          stack.append(b)
+    loops.append(loop)
+  return loops
+
+
+def merge_faces(faces, tol=None) -> list:
+  """Merges coplanar faces sharing edges; the others are kept as they are."""
+  tol = tolerance(tol)
+  merged = []
+  for group in _components(faces, tol):
+    loops = _boundary_loops(group, tol) if len(group) > 1 else None
+    if loops is None:
+      merged.extend(group)
+      continue
+    bounds = sorted((Bound(loop) for loop in loops), key=lambda b: b.area(),
+                    reverse=True)
+    merged.append(MergedFace(group[0].plane, bounds[0], bounds[1:], group))
+  return merged
+
+
+def merge_coplanar(parallel, positions, tol=None) -> list:
+  """Returns the faces with every coplanar group merged."""
+  return [face for cluster in coplanar_clusters(parallel, positions, tol)
+          for face in merge_faces(cluster, tol)]
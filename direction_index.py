@@ -0,0 +1,68 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+import math
+from itertools import product
+from regular_obj import Config, Vector
+
+
+# The 27 cell offsets around (and including) a cell.
+NEIGHBOURS = tuple(product((-1, 0, 1), repeat=3))
+
+
+class DirectionIndex:
+  """Groups directions (or any 3D points) equal within tolerance, in O(1)."""
+  def __init__(self, decimals=None):
+    """Initializes a DirectionIndex object."""
+    self.decimals = Config.DECIMALS if decimals is None else decimals
+    self.tol = 1/math.pow(10, self.decimals)
+    # Cell -> [(raw direction, key)] of the groups anchored in that cell.
+    self.cells: dict = dict()
+    self.keys: list = []
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'DirectionIndex({len(self.keys)} directions, tol={self.tol})'
+
+  def __len__(self):
+    """Returns the number of direction groups."""
+    return len(self.keys)
+
+  @staticmethod
+  def _cell(coordinates, tol):
+    """Returns the grid cell of a direction."""
+    return tuple(math.floor(c / tol) for c in coordinates)
+
+  def find(self, direction):
+    """Returns the key of the group matching the direction, or None."""
+    coordinates = tuple(direction)
+    i, j, k = self._cell(coordinates, self.tol)
+    for di, dj, dk in NEIGHBOURS:
+      for raw, key in self.cells.get((i+di, j+dj, k+dk), ()):
+        if all(abs(a-b) <= self.tol for a, b in zip(raw, coordinates)):
+          return key
+    return None
+
+  def key(self, direction):
+    """Returns the group key of the direction, starting a group if new."""
+    key = self.find(direction)
+    if key is None:
+      coordinates = tuple(direction)
+      key = Vector(tuple(round(c, self.decimals) for c in coordinates))
+      cell = self._cell(coordinates, self.tol)
+      self.cells.setdefault(cell, []).append((coordinates, key))
+      self.keys.append(key)
+    return key
+
+  def group(self, items, direction_of):
+    """Returns a dictionary of key -> items sharing that direction."""
+    groups = dict()
+    for item in items:
+      groups.setdefault(self.key(direction_of(item)), []).append(item)
+    return groups
@@ -0,0 +1,195 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: the file is MAGIC, the layout's length (8 bytes, little-endian),
+# the layout as JSON, then each column's raw array, 8-byte aligned. Faces
+# are stored bucket by bucket, already sorted by position, so loading
+# needs no grouping or sorting, and the columns are read in place.
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from regular_obj import Vector, Bound, Plane, LazyFace, loop_area
+from array_obj import FaceSoA
+
+
+MAGIC = b'STPFACE1'
+ALIGN = 8
+# Column name -> array type code.
+COLUMNS = {
+  'vertices': 'd',       # x, y, z per vertex.
+  'loop_offsets': 'q',   # Loop l is loop_indices[offsets[l]:offsets[l+1]].
+  'loop_indices': 'q',   # Vertex indices, in loop order.
+  'face_loops': 'q',     # Face f's loops (outer first) are f_l[f]:f_l[f+1].
+  'planes': 'd',         # Location and axis, 6 per face.
+  'positions': 'd',      # Axis position per face.
+  'directions': 'd',     # x, y, z per direction bucket.
+  'bucket_offsets': 'q', # Bucket k's faces are offsets[k]:offsets[k+1].
+}
+
+
+def _columns(collection) -> dict:
+  """Returns the arrays of a FaceCollection, bucket by bucket."""
+  # Note: FaceSoA shares the vertices and lays out the loops; the buckets
+  # only add their directions, positions and offsets around it.
+  soa = FaceSoA(f for faces in collection.parallel.values() for f in faces)
+  cols = {name: array(code) for name, code in COLUMNS.items()}
+  cols.update(vertices=soa.vertices.data, loop_offsets=soa.loop_offsets,
+              loop_indices=soa.loop_indices, face_loops=soa.face_loops)
+  cols['bucket_offsets'].append(0)
+  for i in range(len(soa)):
+    cols['planes'].extend(soa.anchors.row(i) + soa.normals.row(i))
+  for direction, faces in collection.parallel.items():
+    cols['directions'].extend(direction)
+    cols['positions'].extend(collection.positions[direction])
+    cols['bucket_offsets'].append(cols['bucket_offsets'][-1] + len(faces))
+  return cols
+
+
+def export_faces(collection, path, face_types=None):
+  """Writes a FaceCollection (and face type counts) as a columnar file."""
+  cols = _columns(collection)
+  layout = {'decimals': collection.directions.decimals,
+            'byteorder': sys.byteorder,
+            'faces': len(cols['face_loops']) - 1,
+            'face_types': dict(face_types or {}), 'columns': {}}
+  start = 0
+  for name, col in cols.items():
+    layout['columns'][name] = [col.typecode, start, len(col)]
+    start += -(-len(col)*col.itemsize // ALIGN) * ALIGN
+  header = json.dumps(layout).encode()
+  header += b' ' * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+  with open(path, 'wb') as out:
+    out.write(MAGIC + struct.pack('<Q', len(header)) + header)
+    for col in cols.values():
+      data = col.tobytes()
+      out.write(data + bytes(-len(data) % ALIGN))
+
+
+class StoredFace(LazyFace):
+  """Stores a LazyFace whose Bounds are built from a FaceStore's loops."""
+  def __init__(self, plane=None, store=None, index=0):
+    """Initializes a StoredFace object."""
+    self.plane = plane
+    # Note: bound and holes are set by __getattr__, from the store's loops.
+    self.store = store
+    self.index = index
+
+  def __getattr__(self, name):
+    """Builds the bound and holes on first access, caching them."""
+    if name not in ('bound', 'holes'):
+      raise AttributeError(name)
+    bounds = [Bound(loop=[Vector(p) for p in self.store.loop_points(l)])
+              for l in self.store.loops_of(self.index)]
+    self.bound, self.holes = bounds[0], bounds[1:]
+    return getattr(self, name)
+
+  def __getstate__(self):
+    """Returns the state to pickle: the built Bounds, not the mapped store."""
+    self.bound # Note: builds both.
+    return {k: v for k, v in self.__dict__.items() if k != 'store'}
+
+
+class FaceStore:
+  """Stores a memory-mapped columnar face file, read in place."""
+  def __init__(self, path=None):
+    """Initializes a FaceStore object."""
+    self.path = path
+    self.buffer = self._map(path) if path else b''
+    self.layout: dict = dict()
+    # Column name -> memoryview of its values, straight from the buffer.
+    self.columns: dict = dict()
+    if path:
+      self.layout, self.columns = self._read(self.buffer)
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'FaceStore({self.path}, {len(self)} faces)'
+
+  def __len__(self):
+    """Returns the number of faces."""
+    return self.layout.get('faces', 0)
+
+  @staticmethod
+  def _map(path):
+    """Memory-maps the file read-only."""
+    with open(path, 'rb') as f:
+      if os.fstat(f.fileno()).st_size == 0:
+        raise ValueError(f'{path} is empty.')
+      return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+  @staticmethod
+  def _read(buffer):
+    """Returns the layout and the column views of a mapped file."""
+    if buffer[:len(MAGIC)] != MAGIC:
+      raise ValueError('Not a face store file.')
+    size, = struct.unpack_from('<Q', buffer, len(MAGIC))
+    base = len(MAGIC) + 8
+    layout = json.loads(bytes(buffer[base:base+size]))
+    if layout['byteorder'] != sys.byteorder:
+      raise ValueError('The face store was written on another byte order.')
+    view, base = memoryview(buffer), base + size
+    columns = dict()
+    for name, (code, start, count) in layout['columns'].items():
+      itemsize = array(code).itemsize
+      columns[name] = view[base+start:base+start+count*itemsize].cast(code)
+    return layout, columns
+
+  def close(self):
+    """Releases the views and unmaps the file."""
+    for col in self.columns.values():
+      col.release()
+    self.columns = dict()
+    if isinstance(self.buffer, mmap.mmap):
+      self.buffer.close()
+
+  def loops_of(self, f):
+    """Returns the loop ids of face f (its outer loop first)."""
+    face_loops = self.columns['face_loops']
+    return range(face_loops[f], face_loops[f+1])
+
+  def loop_points(self, l):
+    """Returns loop l's vertices, as (x, y, z) tuples in loop order."""
+    offsets, verts = self.columns['loop_offsets'], self.columns['vertices']
+    return [tuple(verts[3*k:3*k+3])
+            for k in self.columns['loop_indices'][offsets[l]:offsets[l+1]]]
+
+  def plane(self, f):
+    """Returns face f's Plane."""
+    params = self.columns['planes'][6*f:6*f+6]
+    return Plane(tuple(params[:3]), tuple(params[3:]))
+
+  def face(self, f):
+    """Returns face f, its Bounds read from the store on first use."""
+    return StoredFace(self.plane(f), self, f)
+
+  def buckets(self):
+    """Returns each direction with its (first, end) range of faces."""
+    dirs, offsets = self.columns['directions'], self.columns['bucket_offsets']
+    return [(Vector(tuple(dirs[3*k:3*k+3])), offsets[k], offsets[k+1])
+            for k in range(len(offsets) - 1)]
+
+  def areas(self):
+    """Returns every face's area (less its holes), from the columns alone."""
+    areas = array('d')
+    for f in range(len(self)):
+      outer, *holes = [loop_area(self.loop_points(l))
+                       for l in self.loops_of(f)]
+      areas.append(outer - sum(holes))
+    return areas
+
+  def to_buckets(self):
+    """Returns {direction: (faces, positions)}, in the stored order."""
+    positions = self.columns['positions']
+    return {direction: ([self.face(f) for f in range(first, end)],
+                        list(positions[first:end]))
+            for direction, first, end in self.buckets()}
@@ -0,0 +1,454 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: surfaces are evaluated a whole parameter grid at a time. The basis
+# functions of every u and every v value are computed once (Cox-de Boor),
+# then the tensor product is split in two: each u row first blends the
+# control net down to one curve, which every v value then reads.
+
+import math
+from array import array
+from regular_obj import Vector, tolerance
+from array_obj import VectorArray
+from shadow_engine import Overlap, convex_pieces, pieces_overlap, \
+                          subtract_pieces, signed_area, EPS
+
+
+# NOTE! Segments per knot span are doubled until within the chordal
+# tolerance, or until this many.
+MAX_SEGMENTS = 16
+
+
+def expand_knots(knots, multiplicities) -> list:
+  """Returns the full knot vector from distinct knots and multiplicities."""
+  return [k for k, m in zip(knots, multiplicities) for _ in range(m)]
+
+
+def find_span(knots, degree, t) -> int:
+  """Returns the knot span index i with knots[i] <= t < knots[i+1]."""
+  n = len(knots) - degree - 2
+  if t >= knots[n+1]:
+    return n # Note: the end of the domain belongs to the last span.
+  low, high = degree, n+1
+  while high - low > 1:
+    mid = (low + high) // 2
+    if t < knots[mid]:
+      high = mid
+    else:
+      low = mid
+  return low
+
+
+def basis_table(knots, degree, params) -> tuple:
+  """Returns each parameter's span and degree+1 basis values (flat)."""
+  # Note: The NURBS Book, algorithm A2.2, over a batch of parameters.
+  spans, values = array('q'), array('d')
+  left, right = [0.0] * (degree+1), [0.0] * (degree+1)
+  for t in params:
+    i = find_span(knots, degree, t)
+    n = [1.0] + [0.0] * degree
+    for j in range(1, degree+1):
+      left[j], right[j] = t - knots[i+1-j], knots[i+j] - t
+      saved = 0.0
+      for r in range(j):
+        denom = right[r+1] + left[j-r]
+        temp = n[r] / denom if denom else 0.0
+        n[r] = saved + right[r+1] * temp
+        saved = left[j-r] * temp
+      n[j] = saved
+    spans.append(i)
+    values.extend(n)
+  return spans, values
+
+
+class BSplineCurve:
+  """Stores a (rational) B-spline curve: degree, knots, weighted points."""
+  def __init__(self, degree=None, points=None, knots=None, weights=None):
+    """Initializes a BSplineCurve object."""
+    self.degree = degree
+    self.points: list = points if points is not None else []
+    self.knots: list = knots if knots is not None else []
+    self.weights: list = weights
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'BSplineCurve({self.degree}, {len(self.points)} points' \
+           f'{", rational" if self.weights is not None else ""})'
+
+  def domain(self):
+    """Returns the (t0, t1) parameter domain."""
+    return self.knots[self.degree], self.knots[-self.degree-1]
+
+  def evaluate(self, params) -> list:
+    """Returns the (x, y, z) points at the parameters."""
+    p = self.degree
+    spans, basis = basis_table(self.knots, p, params)
+    out = []
+    for i, span in enumerate(spans):
+      x = y = z = w = 0.0
+      for k in range(p+1):
+        n = basis[i*(p+1)+k]
+        j = span-p+k
+        weight = self.weights[j] if self.weights is not None else 1.0
+        px, py, pz = self.points[j]
+        x += n * weight * px
+        y += n * weight * py
+        z += n * weight * pz
+        w += n * weight
+      out.append((x/w, y/w, z/w))
+    return out
+
+  def sample(self, segments=4) -> list:
+    """Returns points splitting each non-empty knot span into segments."""
+    p = self.degree
+    params = [self.knots[p]]
+    for a, b in zip(self.knots[p:-p-1], self.knots[p+1:-p]):
+      if b > a:
+        params.extend(a + (b-a)*k/segments for k in range(1, segments+1))
+    return self.evaluate(params)
+
+
+class BSplineSurface:
+  """Stores a (rational) B-spline surface: degrees, knots, weighted net."""
+  def __init__(self, u_degree=None, v_degree=None, points=None,
+               u_knots=None, v_knots=None, weights=None):
+    """Initializes a BSplineSurface object."""
+    self.u_degree = u_degree
+    self.v_degree = v_degree
+    # Note: points[a][b] is the control point of u index a, v index b.
+    self.points: list = points if points is not None else []
+    self.u_knots: list = u_knots if u_knots is not None else []
+    self.v_knots: list = v_knots if v_knots is not None else []
+    self.weights: list = weights
+    # Homogeneous (x*w, y*w, z*w, w) rows, flat, one per u index.
+    self.net: list = self._make_net(self.points, weights)
+
+  def __repr__(self):
+    """Returns the string representation."""
+    rows = len(self.points)
+    cols = len(self.points[0]) if rows else 0
+    return f'BSplineSurface({self.u_degree}x{self.v_degree}, {rows}x{cols}' \
+           f'{", rational" if self.weights is not None else ""})'
+
+  @staticmethod
+  def _make_net(points, weights):
+    """Returns the homogeneous control net, one flat array per row."""
+    net = []
+    for a, row in enumerate(points):
+      flat = array('d')
+      for b, (x, y, z) in enumerate(row):
+        w = weights[a][b] if weights is not None else 1.0
+        flat.extend((x*w, y*w, z*w, w))
+      net.append(flat)
+    return net
+
+  def domain(self):
+    """Returns the ((u0, u1), (v0, v1)) parameter domain."""
+    p, q = self.u_degree, self.v_degree
+    return (self.u_knots[p], self.u_knots[-p-1]), \
+           (self.v_knots[q], self.v_knots[-q-1])
+
+  def spans(self, lo=None, hi=None, v=False):
+    """Returns the non-empty knot spans within [lo, hi], along u or v."""
+    knots, degree = (self.v_knots, self.v_degree) if v else \
+                    (self.u_knots, self.u_degree)
+    start, end = knots[degree], knots[-degree-1]
+    lo = start if lo is None else max(lo, start)
+    hi = end if hi is None else min(hi, end)
+    spans = []
+    for a, b in zip(knots[degree:-degree-1], knots[degree+1:-degree]):
+      a, b = max(a, lo), min(b, hi)
+      if b > a:
+        spans.append((a, b))
+    return spans
+
+  def evaluate_grid(self, us, vs):
+    """Returns the points at every (u, v) of the grid, u-major."""
+    p, q = self.u_degree, self.v_degree
+    u_spans, u_basis = basis_table(self.u_knots, p, us)
+    v_spans, v_basis = basis_table(self.v_knots, q, vs)
+    width = len(self.net[0])
+    out = array('d')
+    for i, span in enumerate(u_spans):
+      # Blends the p+1 rows of the net into one curve (all v indices).
+      curve = array('d', bytes(8 * width))
+      for k in range(p+1):
+        n = u_basis[i*(p+1)+k]
+        if n:
+          row = self.net[span-p+k]
+          curve = array('d', [c + n*r for c, r in zip(curve, row)])
+      for j, vspan in enumerate(v_spans):
+        x = y = z = w = 0.0
+        base = 4 * (vspan-q)
+        for k in range(q+1):
+          m = v_basis[j*(q+1)+k]
+          o = base + 4*k
+          x += m * curve[o]
+          y += m * curve[o+1]
+          z += m * curve[o+2]
+          w += m * curve[o+3]
+        out.extend((x/w, y/w, z/w))
+    return VectorArray(out)
+
+
+class Mesh:
+  """Stores a triangle mesh: vertices and index triples."""
+  def __init__(self, vertices=None, triangles=None):
+    """Initializes a Mesh object."""
+    self.vertices: VectorArray = vertices if vertices is not None else \
+                                 VectorArray()
+    self.triangles = triangles if triangles is not None else array('q')
+    # Per axis, the (low, high) arrays of the triangles' boxes, on demand.
+    self.boxes: list = None
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'Mesh({len(self.vertices)} vertices, {len(self)} triangles)'
+
+  def __len__(self):
+    """Returns the number of triangles."""
+    return len(self.triangles) // 3
+
+  @staticmethod
+  def _grid_triangles(nu, nv):
+    """Returns the two triangles of every cell of an nu x nv vertex grid."""
+    tris = array('q')
+    for i in range(nu-1):
+      for j in range(nv-1):
+        a, b = i*nv + j, i*nv + j + 1
+        c, d = a + nv, b + nv
+        tris.extend((a, c, d, a, d, b))
+    return tris
+
+  def corners(self):
+    """Returns the VectorArrays of every triangle's three corners."""
+    t = self.triangles
+    return self.vertices.take(t[0::3]), self.vertices.take(t[1::3]), \
+           self.vertices.take(t[2::3])
+
+  def areas(self):
+    """Returns the area of every triangle."""
+    a, b, c = self.corners()
+    return array('d', (n/2 for n in (b-a).cross(c-a).norm()))
+
+  def area(self):
+    """Returns the total area."""
+    return math.fsum(self.areas())
+
+  def get_boxes(self):
+    """Returns the triangles' bounding boxes, computing them once."""
+    if self.boxes is None:
+      a, b, c = self.corners()
+      self.boxes = []
+      for k in range(3):
+        xs = a.data[k::3], b.data[k::3], c.data[k::3]
+        self.boxes.append((array('d', map(min, *xs)),
+                           array('d', map(max, *xs))))
+    return self.boxes
+
+  def contains(self, v, tol):
+    """Determines if v is within tol of a triangle."""
+    p = Vector(tuple(v))
+    hits = range(len(self))
+    for (low, high), x in zip(self.get_boxes(), p):
+      hits = [i for i in hits if low[i] - tol <= x <= high[i] + tol]
+    vertices, t = self.vertices, self.triangles
+    for i in hits:
+      a, b, c = (vertices[k] for k in t[3*i:3*i+3])
+      if self._near_triangle(p, a, b, c, tol):
+        return True
+    return False
+
+  @staticmethod
+  def _near_triangle(p, a, b, c, tol):
+    """Determines if p is within tol of triangle abc."""
+    n = (b-a).cross_product(c-a)
+    if n.norm() < EPS:
+      return False
+    n = n.unit()
+    if abs((p-a).dot_product(n)) >= tol:
+      return False
+    # Note: inside all three edges, or within tol of one of them.
+    for s, t in ((a, b), (b, c), (c, a)):
+      edge = t - s
+      if (edge.cross_product(p-s)).dot_product(n) < 0:
+        k = max(0.0, min(1.0, (p-s).dot_product(edge) /
+                         max(edge.dot_product(edge), EPS)))
+        return (s + edge*k).distance_to_point(p) < tol
+    return True
+
+  def project(self, u, v):
+    """Returns the triangles as (s, t) tuples in the (u, v) frame."""
+    s, t = self.vertices.dot(u), self.vertices.dot(v)
+    tris = self.triangles
+    return [[(s[k], t[k]) for k in tris[i:i+3]]
+            for i in range(0, len(tris), 3)]
+
+
+class BSplineFace:
+  """Stores a face on a B-spline surface, tessellated on first use."""
+  def __init__(self, surface=None, points=None):
+    """Initializes a BSplineFace object."""
+    self.surface = surface
+    # Note: boundary points; they trim the parameter domain.
+    self.points: list = points if points is not None else []
+    # Tolerance -> Mesh, since the chordal tolerance depends on it.
+    self.meshes: dict = dict()
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'BSplineFace({self.surface})'
+
+  @staticmethod
+  def _params(spans, counts):
+    """Returns the parameter values splitting each span into counts[i]."""
+    params = []
+    for (a, b), n in zip(spans, counts):
+      params.extend(a + (b-a)*k/n for k in range(n))
+    params.append(spans[-1][1])
+    return params
+
+  @staticmethod
+  def _deviations(surface, us, vs, grid, along_v):
+    """Returns, per interval of us (or vs), the largest chordal error."""
+    nv = len(vs)
+    if along_v:
+      mids = [(a+b)/2 for a, b in zip(vs, vs[1:])]
+      mid = surface.evaluate_grid(us, mids)
+      count = len(mids)
+      index = lambda i, k: (i*nv + k, i*nv + k + 1, i*count + k)
+      outer = len(us)
+    else:
+      mids = [(a+b)/2 for a, b in zip(us, us[1:])]
+      mid = surface.evaluate_grid(mids, vs)
+      count = len(mids)
+      index = lambda j, k: (k*nv + j, (k+1)*nv + j, k*nv + j)
+      outer = nv
+    g, m = grid.data, mid.data
+    errors = [0.0] * count
+    for o in range(outer):
+      for k in range(count):
+        a, b, c = index(o, k)
+        err = math.hypot((g[3*a]+g[3*b])/2 - m[3*c],
+                         (g[3*a+1]+g[3*b+1])/2 - m[3*c+1],
+                         (g[3*a+2]+g[3*b+2])/2 - m[3*c+2])
+        errors[k] = max(errors[k], err)
+    return errors
+
+  @staticmethod
+  def _refine(spans, counts, errors, tol):
+    """Doubles the segments of the spans with an interval over tol."""
+    changed, k = False, 0
+    for i, n in enumerate(counts):
+      if n < MAX_SEGMENTS and max(errors[k:k+n]) > tol:
+        counts[i] = 2*n
+        changed = True
+      k += n
+    return changed
+
+  @staticmethod
+  def _nearest(grid, p):
+    """Returns the index of the grid point nearest to p."""
+    data, (x, y, z) = grid.data, p
+    return min(range(len(grid)), key=lambda i: (data[3*i]-x)**2 +
+               (data[3*i+1]-y)**2 + (data[3*i+2]-z)**2)
+
+  @staticmethod
+  def _invert(surface, p, u, v, du, dv, steps=12):
+    """Returns the (u, v) of p, refining a guess by local 5 x 5 searches."""
+    (u0, u1), (v0, v1) = surface.domain()
+    for _ in range(steps):
+      us = [min(u1, max(u0, u + du*k/2)) for k in range(-2, 3)]
+      vs = [min(v1, max(v0, v + dv*k/2)) for k in range(-2, 3)]
+      best = BSplineFace._nearest(surface.evaluate_grid(us, vs), p)
+      u, v, du, dv = us[best // 5], vs[best % 5], du/2, dv/2
+    return u, v
+
+  def _trim(self, n=16):
+    """Returns the parameter rectangle spanned by the boundary points."""
+    s = self.surface
+    (u0, u1), (v0, v1) = s.domain()
+    if not self.points:
+      return (u0, u1), (v0, v1)
+    du, dv = (u1-u0)/n, (v1-v0)/n
+    us = [u0 + du*k for k in range(n+1)]
+    vs = [v0 + dv*k for k in range(n+1)]
+    grid = s.evaluate_grid(us, vs)
+    # Note: a coarse inversion of every point, then a fine one for those
+    # within a cell of the extremes.
+    found = [divmod(self._nearest(grid, p), n+1) for p in self.points]
+    fine = dict()
+    bounds = []
+    for axis in (0, 1):
+      for pick, side in ((min, -1), (max, 1)):
+        edge = pick(f[axis] for f in found)
+        for k, (i, j) in enumerate(found):
+          if abs(found[k][axis] - edge) <= 1 and k not in fine:
+            fine[k] = self._invert(s, self.points[k], us[i], vs[j], du, dv)
+        bounds.append(pick(uv[axis] for k, uv in fine.items()
+                           if abs(found[k][axis] - edge) <= 1))
+    lo_u, hi_u, lo_v, hi_v = bounds
+    if hi_u - lo_u < EPS or hi_v - lo_v < EPS:
+      return (u0, u1), (v0, v1)
+    # Note: padded by the fine search's last step, within the domain.
+    pad_u, pad_v = du / 2**10, dv / 2**10
+    return (max(u0, lo_u-pad_u), min(u1, hi_u+pad_u)), \
+           (max(v0, lo_v-pad_v), min(v1, hi_v+pad_v))
+
+  def tessellate(self, tol):
+    """Returns a Mesh within the chordal tolerance of the surface."""
+    (u0, u1), (v0, v1) = self._trim()
+    s = self.surface
+    u_spans, v_spans = s.spans(u0, u1), s.spans(v0, v1, v=True)
+    u_counts = [max(1, s.u_degree)] * len(u_spans)
+    v_counts = [max(1, s.v_degree)] * len(v_spans)
+    while True:
+      us, vs = self._params(u_spans, u_counts), self._params(v_spans, v_counts)
+      grid = s.evaluate_grid(us, vs)
+      u_errors = self._deviations(s, us, vs, grid, False)
+      v_errors = self._deviations(s, us, vs, grid, True)
+      refined_u = self._refine(u_spans, u_counts, u_errors, tol)
+      refined_v = self._refine(v_spans, v_counts, v_errors, tol)
+      if not (refined_u or refined_v):
+        return Mesh(grid, Mesh._grid_triangles(len(us), len(vs)))
+
+  def get_mesh(self, tol=None):
+    """Returns the mesh at the tolerance, tessellating once per tolerance."""
+    tol = tolerance(tol)
+    if tol not in self.meshes:
+      self.meshes[tol] = self.tessellate(tol)
+    return self.meshes[tol]
+
+  def area(self, tol=None):
+    """Returns the area of the mesh."""
+    return self.get_mesh(tol).area()
+
+  def contains(self, v, tol=None):
+    """Determines if v rests on the face (within the tolerance)."""
+    # Note: the mesh itself may be off the surface by the tolerance.
+    tol = tolerance(tol)
+    return self.get_mesh(tol).contains(v, 2*tol)
+
+  def overlap(self, face, tol=None):
+    """Returns the Overlap of the face's shadow on a planar face."""
+    u, v = face.plane.abs_unit_dir().orthonormal_basis()
+    outline = face.bound.get_pieces(u, v)
+    pieces = []
+    for tri in self.get_mesh(tol).project(u, v):
+      if abs(signed_area(tri)) > EPS:
+        pieces.extend(pieces_overlap(convex_pieces(tri), outline))
+    for hole in face.holes:
+      pieces = subtract_pieces(pieces, hole.get_pieces(u, v))
+    return Overlap(pieces, u, v)
+
+  def shadow(self, face, tol=None):
+    """Determines if the face's shadow overlaps a planar face."""
+    tol = tolerance(tol)
+    overlap = self.overlap(face, tol)
+    return bool(overlap) and not overlap.is_sliver(tol)
@@ -0,0 +1,102 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: instrumentation is off unless a Recorder is active, and then the
+# hooks cost one global lookup per call.
+
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+
+_ACTIVE = None
+
+
+class Recorder:
+  """Stores the call counts, total times and errors of instrumented hooks."""
+  def __init__(self, trace=False, callback=None):
+    """Initializes a Recorder object."""
+    self.counts: dict = dict()
+    self.seconds: dict = dict()
+    self.errors: dict = dict()
+    # Note: with trace, every call is kept as (name, start, seconds).
+    self.trace = trace
+    self.events: list = []
+    self.callback = callback
+    self.origin = time.perf_counter()
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'Recorder({len(self.counts)} hooks)'
+
+  def add(self, name, start, seconds, failed=False):
+    """Records one call of a hook."""
+    self.counts[name] = self.counts.get(name, 0) + 1
+    self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+    if failed:
+      self.errors[name] = self.errors.get(name, 0) + 1
+    if self.trace:
+      self.events.append((name, start, seconds))
+    if self.callback is not None:
+      self.callback(name, seconds)
+
+  def to_dict(self):
+    """Returns the totals per hook, slowest first."""
+    names = sorted(self.seconds, key=self.seconds.get, reverse=True)
+    return {name: {'count': self.counts[name],
+                   'seconds': self.seconds[name],
+                   'errors': self.errors.get(name, 0)} for name in names}
+
+  def to_trace(self):
+    """Returns the calls in the Chrome trace event format (microseconds)."""
+    return {'traceEvents': [{'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                             'ts': (start-self.origin) * 1e6,
+                             'dur': seconds * 1e6}
+                            for name, start, seconds in self.events]}
+
+  def dump(self, path):
+    """Writes the totals (and the trace, if kept) as JSON."""
+    data = {'hooks': self.to_dict()}
+    if self.trace:
+      data.update(self.to_trace())
+    with open(path, 'w') as out:
+      json.dump(data, out, indent=2)
+
+
+@contextmanager
+def recording(trace=False, callback=None):
+  """Activates a Recorder for the duration of a with block."""
+  global _ACTIVE
+  previous, _ACTIVE = _ACTIVE, Recorder(trace, callback)
+  try:
+    yield _ACTIVE
+  finally:
+    _ACTIVE = previous
+
+
+def timed(name, key=None):
+  """Decorates a hook; key(*args) may refine its name, e.g. by type."""
+  def decorate(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      recorder = _ACTIVE
+      if recorder is None:
+        return func(*args, **kwargs)
+      label = name if key is None else f'{name}.{key(*args)}'
+      failed = True
+      start = time.perf_counter()
+      try:
+        result = func(*args, **kwargs)
+        failed = False
+        return result
+      finally:
+        recorder.add(label, start, time.perf_counter() - start, failed)
+    return wrapper
+  return decorate
@@ -18,21 +18,28 @@ if __name__ == '__main__':
   PRECISION = 3
   PATHS = ['sample_surface.stp', 'hard.stp', 'hud_shell.stp', 'surface.stp']
   TYPES = 'advanced_face', 'vertex_point'
+  BACKEND = 'native' # Or 'steptools' (licensed), which is not memoized.
+  # Note: statistics stream in flat memory; a cache dir (e.g. '.stp_cache')
+  # reuses converted geometry across runs, but keeps every face to store it.
+  CACHE_DIR = None
   
   # Executes the program.
-  main(PRECISION, f'stp_files/sample_surface.stp', TYPES, out=False)
+  main(PRECISION, f'stp_files/sample_surface.stp', TYPES, out=False,
+       backend=BACKEND, cache_dir=CACHE_DIR)
   print('Start of Test')
 
   # NOTE: TEST with test bundle.
   for i in range(1, 5):
     print(f'Test: test{i}.stp')
-    main(PRECISION, f'stp_files/test{i}.stp', TYPES)
+    main(PRECISION, f'stp_files/test{i}.stp', TYPES, backend=BACKEND,
+         cache_dir=CACHE_DIR)
     print()
 
   # NOTE: TEST with real life projects.
   for PATH in PATHS:
     print(f'Test: {PATH}')
-    main(PRECISION, f'stp_files/{PATH}', TYPES)
+    main(PRECISION, f'stp_files/{PATH}', TYPES, backend=BACKEND,
+         cache_dir=CACHE_DIR)
     print()
 
   print('End of Test')
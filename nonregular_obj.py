@@ -7,31 +7,454 @@
 # 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
 
 
+# NOTE: a face of revolution is described in its surface's frame (origin on
+# the axis, z along it) by cylindrical coordinates (rho, theta, h). Its
+# angular extent is the smallest arc covering its boundary points, so arcs
+# are sampled at least every ARC_STEP; a wider gap is where the face ends.
+# Its region is bounded by its loops in the surface's (s, t) parameters,
+# as planar faces are by their polygons: (theta, h), or (theta, phi) on a
+# torus, unwrapped across the periodic seams.
+
 import math
-from regular_obj import Plane
+from abc import ABC, abstractmethod
+from regular_obj import Vector, tolerance
+from direction_index import DirectionIndex
+
+
+TWO_PI = 2 * math.pi
+ARC_STEP = math.pi / 12
+
+
+def angular_range(angles, step=ARC_STEP) -> tuple:
+  """Returns the (start, sweep) of the smallest arc covering the angles."""
+  a = sorted(t % TWO_PI for t in angles)
+  if not a:
+    return 0.0, TWO_PI
+  gap, start = a[0] + TWO_PI - a[-1], a[0]
+  for prev, curr in zip(a, a[1:]):
+    if curr - prev > gap:
+      gap, start = curr - prev, curr
+  if gap <= step * (1 + 1e-6):
+    return 0.0, TWO_PI # Note: sampled all the way around.
+  return start, TWO_PI - gap
+
+
+def in_range(angle, start, sweep, tol=0.0) -> bool:
+  """Determines if an angle lies on the arc from start, within tol."""
+  if sweep >= TWO_PI:
+    return True
+  k = (angle - start) % TWO_PI
+  return k <= sweep + tol or k >= TWO_PI - tol
+
+
+def placement_frame(plane) -> tuple:
+  """Returns the (origin, x, y, z) unit frame of an axis placement."""
+  z = plane.normal
+  x = None
+  if plane.ref_direction is not None:
+    ref = Vector(tuple(plane.ref_direction))
+    x = ref - z * ref.dot_product(z)
+  if x is None or x.norm() < 1e-12:
+    x = z.orthonormal_basis()[0]
+  x = x.unit()
+  return plane.location, x, z.cross_product(x), z
 
 
 class Circle:
   """Stores a Circle object."""
-  def __init__(self, rad, plane):
+  def __init__(self, rad=None, plane=None):
+    """Initializes a Circle object."""
     self.radius = rad
     self.plane = plane
 
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'Circle({self.radius}, {self.plane})'
+
+  def arc_points(self, start, end, same_sense=True, step=ARC_STEP):
+    """Returns points at most step apart along the arc from start to end."""
+    # Note: the arc runs counterclockwise about the axis when same_sense.
+    o, x, y, _ = placement_frame(self.plane)
+    a0 = math.atan2((start-o).dot_product(y), (start-o).dot_product(x))
+    a1 = math.atan2((end-o).dot_product(y), (end-o).dot_product(x))
+    sweep = (a1-a0) % TWO_PI
+    if start.coordinates == end.coordinates:
+      sweep = TWO_PI # Note: a closed circle (exactly, not within tol).
+    if not same_sense:
+      sweep -= TWO_PI
+    n = max(1, math.ceil(abs(sweep) / step))
+    points = []
+    for k in range(n+1):
+      a = a0 + sweep * k / n
+      points.append(o + x * (self.radius*math.cos(a)) +
+                    y * (self.radius*math.sin(a)))
+    return points
+
 
-class ToroidalFace:
-  """Stores a ToroidalFace object."""
-  def __init__(self, plane, edge, maj_r, min_r):
+class RevolvedFace(ABC):
+  """Stores a face of revolution: its placement and boundary loops."""
+  # Note: the periods of the (s, t) surface parameters (None if aperiodic).
+  PERIODS = (TWO_PI, None)
+
+  def __init__(self, plane=None, points=None, loops=None):
+    """Initializes a RevolvedFace object."""
     self.plane = plane
-    self.edge = edge
+    # Note: ordered boundary loops (arcs and curves sampled); without them,
+    # only boundary points, and the face is taken as its whole extents.
+    self.loops: list = loops if loops is not None else []
+    self.points: list = points if points is not None else \
+                        [p for loop in self.loops for p in loop]
+    self.frame: tuple = placement_frame(plane) if plane is not None else None
+    # Note: (start, sweep) of theta, and (low, high) of h, over the points.
+    self.theta: tuple = angular_range([self.local(p)[1]
+                                       for p in self.points])
+    heights = [self.local(p)[2] for p in self.points]
+    self.heights: tuple = (min(heights), max(heights)) if heights else \
+                          (0.0, 0.0)
+    # Note: the loops in (s, t), as (chain, xs, ys); computed once.
+    self.polygons: list = None
+    # Note: where each period's seam is put (None: tried on both sides).
+    self.bases: tuple = (None, None)
+
+  def __repr__(self):
+    """Returns the string representation."""
+    start, sweep = self.theta
+    return f'{type(self).__name__}({self.plane}, theta from {start} by ' \
+           f'{sweep}, h from {self.heights[0]} to {self.heights[1]})'
+
+  @staticmethod
+  def _unwrap(values, period):
+    """Returns the values made continuous, then the first one again."""
+    out = [values[0]]
+    for v in values[1:] + values[:1]:
+      out.append(v + period * round((out[-1] - v) / period) if period else v)
+    return out
+
+  @staticmethod
+  def _make_polygons(loops, periods):
+    """Returns each (s, t) loop as (chain, xs, ys), and the seams' bases."""
+    # Note: a loop winding around a period (e.g. a full circle) is closed
+    # through a far line shared by all loops, so that region and area
+    # still follow the even-odd rule (and the far strips cancel out).
+    chains, winds = [], []
+    for loop in loops:
+      ss = RevolvedFace._unwrap([s for s, _ in loop], periods[0])
+      ts = RevolvedFace._unwrap([t for _, t in loop], periods[1])
+      if len(loop) == 1 and periods[0]:
+        ss[-1] += periods[0] # Note: a point (e.g. an apex) spans a turn.
+      chains.append(list(zip(ss, ts)))
+      winds.append((ss[-1] - ss[0], ts[-1] - ts[0]))
+    bases = [None, None]
+    for axis, other in ((0, 1), (1, 0)):
+      # Note: loops winding along the other parameter cut this period into
+      # bands; as loops keep the face on their left, the face lies above a
+      # loop winding in +s (below one winding in +t), so this period's
+      # seam is put just under such a loop, and every loop moved after it.
+      sign = 1 if other == 0 else -1
+      cuts = [chain for chain, wind in zip(chains, winds)
+              if wind[other] * sign > 0]
+      if periods[axis] and cuts:
+        period, base = periods[axis], min(p[axis] for p in cuts[0])
+        bases[axis] = base
+        for k, chain in enumerate(chains):
+          shift = period * math.floor((chain[0][axis] - base) / period)
+          chains[k] = [(s - shift, t) if axis == 0 else (s, t - shift)
+                       for s, t in chain]
+    far_s = max(s for chain in chains for s, _ in chain) + 1
+    far_t = max(t for chain in chains for _, t in chain) + 1
+    polygons = []
+    for chain, (wind_s, wind_t) in zip(chains, winds):
+      closed = list(chain)
+      if wind_s:
+        closed += [(chain[-1][0], far_t), (chain[0][0], far_t)]
+      elif wind_t:
+        closed += [(far_s, chain[-1][1]), (far_s, chain[0][1])]
+      polygons.append((chain, [s for s, _ in closed], [t for _, t in closed]))
+    return polygons, tuple(bases)
+
+  @staticmethod
+  def _shifts(s, t, periods, bases):
+    """Returns the copies of (s, t) to test against the loops."""
+    # Note: a period with a seam has one copy, after the seam; the others
+    # are tried a period either way (loops may cross them).
+    copies = []
+    for value, period, base in zip((s, t), periods, bases):
+      if not period:
+        copies.append((value,))
+      elif base is not None:
+        copies.append((base + (value - base) % period,))
+      else:
+        copies.append((value - period, value, value + period))
+    return [(x, y) for x in copies[0] for y in copies[1]]
+
+  @staticmethod
+  def _crossings(s, t, xs, ys):
+    """Determines if (s, t) is inside a closed polygon (even-odd rule)."""
+    inside = False
+    x1, y1 = xs[-1], ys[-1]
+    for x2, y2 in zip(xs, ys):
+      if (y1 > t) != (y2 > t) and s < x1 + (t-y1)*(x2-x1)/(y2-y1):
+        inside = not inside
+      x1, y1 = x2, y2
+    return inside
+
+  @staticmethod
+  def _probe(chain):
+    """Returns a point of a chain, off its vertices, to test nesting with."""
+    # Note: loops around a period share the seam's s, so vertices may lie
+    # on the other loops' edges; a point part way along an edge does not.
+    for (x1, y1), (x2, y2) in zip(chain, chain[1:]):
+      if (x1, y1) != (x2, y2):
+        return x1 + (x2-x1)*0.382, y1 + (y2-y1)*0.382
+    return chain[0]
+
+  @staticmethod
+  def _near_chain(s, t, chain, ks, kt, tol):
+    """Determines if (s, t) is within tol of a chain, scaled to lengths."""
+    for (x1, y1), (x2, y2) in zip(chain, chain[1:]):
+      ex, ey = (x2-x1)*ks, (y2-y1)*kt
+      px, py = (s-x1)*ks, (t-y1)*kt
+      length_sq = ex*ex + ey*ey
+      k = (px*ex + py*ey) / length_sq if length_sq else 0.0
+      k = min(1.0, max(0.0, k))
+      if math.hypot(px - k*ex, py - k*ey) < tol:
+        return True
+    return False
+
+  def local(self, v):
+    """Returns the (rho, theta, h) of a point in the surface's frame."""
+    o, x, y, z = self.frame
+    d = Vector(tuple(v)) - o
+    dx, dy = d.dot_product(x), d.dot_product(y)
+    return math.hypot(dx, dy), math.atan2(dy, dx), d.dot_product(z)
+
+  def param(self, v):
+    """Returns the (s, t) surface parameters of a point: (theta, h)."""
+    _, theta, h = self.local(v)
+    return theta, h
+
+  def scales(self, v):
+    """Returns the lengths per unit of s and t near a point."""
+    return max(self.local(v)[0], 1e-12), 1.0
+
+  @abstractmethod
+  def integral(self, t):
+    """Returns the area element's integral along t (per unit s)."""
+
+  @abstractmethod
+  def extent_area(self):
+    """Returns the area of the whole (s, t) extents."""
+
+  def abs_unit_dir(self):
+    """Returns the axis direction, with its first non-zero value positive."""
+    return self.plane.abs_unit_dir()
+
+  def axis_point(self):
+    """Returns the point of the axis closest to the origin."""
+    d = self.abs_unit_dir()
+    return self.plane.location - d * self.plane.location.dot_product(d)
+
+  def get_polygons(self):
+    """Returns the loops in (s, t) as (chain, xs, ys), computed once."""
+    if self.polygons is None:
+      loops = [[self.param(p) for p in loop] for loop in self.loops if loop]
+      self.polygons = []
+      if loops:
+        self.polygons, self.bases = self._make_polygons(loops, self.PERIODS)
+    return self.polygons
+
+  def in_extent(self, v, tol):
+    """Determines if v is within the face's (theta, h) extents."""
+    rho, theta, h = self.local(v)
+    low, high = self.heights
+    return low - tol <= h <= high + tol and \
+           in_range(theta, *self.theta, tol / max(rho, tol))
+
+  def in_region(self, v, tol):
+    """Determines if v's (s, t) is inside the loops (boundary included)."""
+    polygons = self.get_polygons()
+    if not polygons:
+      return self.in_extent(v, tol) # Note: only points, so the extents.
+    ks, kt = self.scales(v)
+    copies = self._shifts(*self.param(v), self.PERIODS, self.bases)
+    inside = False
+    for chain, xs, ys in polygons:
+      for s, t in copies:
+        if self._near_chain(s, t, chain, ks, kt, tol):
+          return True
+        if self._crossings(s, t, xs, ys):
+          inside = not inside
+    return inside
+
+  def area(self):
+    """Returns the area inside the loops (or of the extents, without)."""
+    # Note: Green's theorem, the area of g(t) ds dt being the sum of
+    # -G(t) ds along the loop (Simpson, exact for polynomial G up to 3);
+    # loops inside an odd number of others are subtracted.
+    polygons = self.get_polygons()
+    if not polygons:
+      return self.extent_area()
+    total = 0.0
+    for i, (chain, xs, ys) in enumerate(polygons):
+      g = self.integral
+      signed = 0.0
+      x1, y1 = xs[-1], ys[-1]
+      for x2, y2 in zip(xs, ys):
+        signed -= (x2-x1) * (g(y1) + 4*g((y1+y2)/2) + g(y2)) / 6
+        x1, y1 = x2, y2
+      copies = self._shifts(*self._probe(chain), self.PERIODS, self.bases)
+      depth = sum(self._crossings(s, t, other[1], other[2])
+                  for j, other in enumerate(polygons) if j != i
+                  for s, t in copies)
+      total += -abs(signed) if depth % 2 else abs(signed)
+    return total
+
+
+class CylindricalFace(RevolvedFace):
+  """Stores a face on a cylinder."""
+  def __init__(self, plane=None, radius=None, points=None, loops=None):
+    """Initializes a CylindricalFace object."""
+    self.radius = radius
+    super().__init__(plane, points, loops)
+
+  def integral(self, t):
+    """Returns the area element's integral along h (per radian)."""
+    return self.radius * t
+
+  def extent_area(self):
+    """Returns the area, from the angular and axial extents."""
+    return self.radius * self.theta[1] * (self.heights[1] - self.heights[0])
+
+  def contains(self, v, tol=None):
+    """Determines if v rests on the face."""
+    tol = tolerance(tol)
+    return abs(self.local(v)[0] - self.radius) < tol and \
+           self.in_region(v, tol)
+
+
+class ConicalFace(RevolvedFace):
+  """Stores a face on a cone (the semi_angle is in radians)."""
+  def __init__(self, plane=None, radius=None, semi_angle=None, points=None,
+               loops=None):
+    """Initializes a ConicalFace object."""
+    self.radius = radius
+    self.semi_angle = semi_angle
+    super().__init__(plane, points, loops)
+
+  def radius_at(self, h):
+    """Returns the radius at height h along the axis."""
+    return self.radius + h * math.tan(self.semi_angle)
+
+  def integral(self, t):
+    """Returns the area element's integral along h (per radian)."""
+    r, k = self.radius, math.tan(self.semi_angle)
+    return (r*t + k*t*t/2) / math.cos(self.semi_angle)
+
+  def extent_area(self):
+    """Returns the area, integrating the radius along the slant."""
+    low, high = self.heights
+    return self.theta[1] * (self.integral(high) - self.integral(low))
+
+  def contains(self, v, tol=None):
+    """Determines if v rests on the face."""
+    tol = tolerance(tol)
+    rho, _, h = self.local(v)
+    off = abs(rho - self.radius_at(h)) * math.cos(self.semi_angle)
+    return off < tol and self.in_region(v, tol)
+
+
+class ToroidalFace(RevolvedFace):
+  """Stores a face on a torus."""
+  PERIODS = (TWO_PI, TWO_PI)
+
+  def __init__(self, plane=None, maj_r=None, min_r=None, points=None,
+               loops=None):
+    """Initializes a ToroidalFace object."""
     self.major_radius = maj_r
     self.minor_radius = min_r
+    super().__init__(plane, points, loops)
+    # Note: (start, sweep) of the angle around the tube.
+    self.phi: tuple = angular_range([self.tube_angle(p)
+                                     for p in self.points])
+
+  def tube_angle(self, v):
+    """Returns the angle of a point around the tube."""
+    rho, _, h = self.local(v)
+    return math.atan2(h, rho - self.major_radius)
+
+  def param(self, v):
+    """Returns the (s, t) surface parameters of a point: (theta, phi)."""
+    return self.local(v)[1], self.tube_angle(v)
+
+  def scales(self, v):
+    """Returns the lengths per radian of theta and phi near a point."""
+    return max(self.local(v)[0], 1e-12), self.minor_radius
+
+  def integral(self, t):
+    """Returns the area element's integral along phi (per radian)."""
+    r, big_r = self.minor_radius, self.major_radius
+    return r * (big_r*t + r*math.sin(t))
+
+  def extent_area(self):
+    """Returns the area, from the angular extents around axis and tube."""
+    start, sweep = self.phi
+    return self.theta[1] * (self.integral(start+sweep) - self.integral(start))
+
+  def in_extent(self, v, tol):
+    """Determines if v is within the face's (theta, phi) extents."""
+    rho, theta, _ = self.local(v)
+    return in_range(theta, *self.theta, tol / max(rho, tol)) and \
+           in_range(self.tube_angle(v), *self.phi, tol / self.minor_radius)
+
+  def contains(self, v, tol=None):
+    """Determines if v rests on the face."""
+    tol = tolerance(tol)
+    rho, _, h = self.local(v)
+    tube = math.hypot(rho - self.major_radius, h)
+    return abs(tube - self.minor_radius) < tol and self.in_region(v, tol)
+
+
+class CoaxialCollection:
+  """Stores faces of revolution, grouped by shared axis."""
+  def __init__(self, faces=None, decimals=None):
+    """Initializes a CoaxialCollection object."""
+    self.faces = list(faces) if faces is not None else []
+    self.directions = DirectionIndex(decimals)
+    # Direction key -> index of the axes' closest points to the origin.
+    self.axis_points: dict = dict()
+    # (direction key, point key) -> faces on that axis.
+    self.coaxial: dict = dict()
+    for face in self.faces:
+      key = self._axis_key(face, self.directions, self.axis_points)
+      self.coaxial.setdefault(key, []).append(face)
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'CoaxialCollection({len(self.faces)} faces, ' \
+           f'{len(self.coaxial)} axes)'
+
+  def __len__(self):
+    """Returns the length of faces."""
+    return len(self.faces)
+
+  @staticmethod
+  def _axis_key(face, directions, axis_points):
+    """Returns the key of a face's axis line, indexing it if new."""
+    direction = directions.key(face.abs_unit_dir())
+    points = axis_points.setdefault(direction,
+                                    DirectionIndex(directions.decimals))
+    return direction, points.key(face.axis_point())
 
+  def add(self, face):
+    """Adds a face to its axis group."""
+    key = self._axis_key(face, self.directions, self.axis_points)
+    self.coaxial.setdefault(key, []).append(face)
+    self.faces.append(face)
 
-def do_something():
-  e_list = face_obj.bounds[0].bound.edge_list
-  edges = []
-  for edge in e_list:
-    v_s = edge.edge_element.edge_start.vertex_geometry
-    v_e = edge.edge_element.edge_end.vertex_geometry
-    eg = edge.edge_element.edge_geometry
-    # Now eg is a circle with radius and position (plane).
+  def faces_on_axis(self, face):
+    """Returns the faces sharing the face's axis (itself included)."""
+    direction = self.directions.find(face.abs_unit_dir())
+    if direction is None:
+      return []
+    point = self.axis_points[direction].find(face.axis_point())
+    return self.coaxial.get((direction, point), [])
@@ -0,0 +1,131 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: matrices are per direction bucket, indexed by bucket position (the
+# faces sorted by axis position), so rows of nearby faces are adjacent.
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from operator import sub
+from instrument import timed
+
+
+# NOTE! Shadow tests are sent to the pool this many pairs at a time.
+CHUNK_PAIRS = 256
+
+
+class DenseMatrix:
+  """Stores an n x n matrix of floats, flat and row-major."""
+  def __init__(self, n=0, data=None):
+    """Initializes a DenseMatrix object."""
+    self.n = n
+    self.data: array = data if data is not None else array('d', bytes(8*n*n))
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'DenseMatrix({self.n}x{self.n})'
+
+  def __len__(self):
+    """Returns the number of rows."""
+    return self.n
+
+  def __getitem__(self, ij):
+    """Returns the value at (i, j)."""
+    i, j = ij
+    return self.data[i*self.n + j]
+
+  def row(self, i):
+    """Returns row i."""
+    return self.data[i*self.n:(i+1)*self.n]
+
+
+class SparseMatrix:
+  """Stores a symmetric n x n boolean matrix as a CSR of its true entries."""
+  def __init__(self, n=0, pairs=None):
+    """Initializes a SparseMatrix object."""
+    self.n = n
+    # Note: row i's columns are indices[offsets[i]:offsets[i+1]], sorted.
+    self.offsets, self.indices = self._csr(n, pairs or ())
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'SparseMatrix({self.n}x{self.n}, {len(self)} entries)'
+
+  def __len__(self):
+    """Returns the number of true entries (each pair counts twice)."""
+    return len(self.indices)
+
+  def __contains__(self, ij):
+    """Determines if (i, j) is a true entry."""
+    i, j = ij
+    return j in self.row(i)
+
+  @staticmethod
+  def _csr(n, pairs):
+    """Returns the (offsets, indices) of the pairs, both ways round."""
+    rows = [[] for _ in range(n)]
+    for i, j in pairs:
+      rows[i].append(j)
+      rows[j].append(i)
+    offsets, indices = array('q', [0]), array('q')
+    for row in rows:
+      indices.extend(sorted(set(row)))
+      offsets.append(len(indices))
+    return offsets, indices
+
+  def row(self, i):
+    """Returns the columns of row i's true entries."""
+    return self.indices[self.offsets[i]:self.offsets[i+1]]
+
+  def pairs(self):
+    """Returns the true entries (i, j) with i < j."""
+    return [(i, j) for i in range(self.n) for j in self.row(i) if i < j]
+
+
+def distance_matrix(positions) -> DenseMatrix:
+  """Returns the distances between every two parallel planes."""
+  # Note: for one direction, the distance is the difference of positions.
+  n = len(positions)
+  data = array('d')
+  for p in positions:
+    data.extend(map(abs, map(sub, positions, repeat(p, n))))
+  return DenseMatrix(n, data)
+
+
+def _shadow_chunk(faces, pairs, tol) -> list:
+  """Returns the pairs whose faces shadow each other (runs in a worker)."""
+  return [(i, j) for i, j in pairs if faces[i].shadow(faces[j], tol)]
+
+
+@timed('pairwise.shadow_matrices')
+def shadow_matrices(parallel, index, workers=None) -> dict:
+  """Returns, per direction, the SparseMatrix of shadowing faces."""
+  # Note: only pairs with overlapping boxes are tested, in chunks spread
+  # over a process pool; each chunk carries just the faces it needs.
+  jobs = []
+  for direction, faces in parallel.items():
+    pairs = index.candidate_indices(direction)
+    for k in range(0, len(pairs), CHUNK_PAIRS):
+      chunk = pairs[k:k+CHUNK_PAIRS]
+      needed = {i: faces[i] for pair in chunk for i in pair}
+      jobs.append((direction, needed, chunk))
+  found = {direction: [] for direction in parallel}
+  if workers == 0:
+    for direction, needed, chunk in jobs:
+      found[direction].extend(_shadow_chunk(needed, chunk, index.tol))
+  elif jobs:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      futures = [(direction, pool.submit(_shadow_chunk, needed, chunk,
+                                         index.tol))
+                 for direction, needed, chunk in jobs]
+      for direction, future in futures:
+        found[direction].extend(future.result())
+  return {direction: SparseMatrix(len(parallel[direction]), pairs)
+          for direction, pairs in found.items()}
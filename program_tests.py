@@ -7,8 +7,58 @@
 # 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
 
 
+import asyncio
+import json
+import math
+import os
+import tempfile
 import unittest
-from regular_obj import Vector, Edge, Plane, Bound, Face
+import instrument
+import stp_parser
+from batch import analyze_batch, analyze_file, sweep_precisions
+from service import AnalysisService, serve, request
+from benchmark import benchmark, compare
+from regular_obj import Config, Vector, Edge, Plane, Bound, Face, LazyFace
+from array_obj import VectorArray, FaceSoA
+from direction_index import DirectionIndex
+from face_store import FaceStore, StoredFace
+from freeform_obj import BSplineCurve, BSplineSurface, BSplineFace, \
+                         expand_knots
+from nonregular_obj import Circle, RevolvedFace, CylindricalFace, \
+                           ConicalFace, ToroidalFace, CoaxialCollection
+from shadow_engine import signed_area
+from stp_cache import cache_key
+from stp_reader import STPFile, FaceCollection, collect_faces, load_faces
+
+
+STP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stp_files')
+
+
+def loop(corners):
+  """Returns a Bound through the corners, in order."""
+  return Bound([Edge(corners[i-1], corners[i]) for i in range(len(corners))])
+
+
+def rect_face(x0, y0, x1, y1, z):
+  """Returns a rectangular Face parallel to the xy plane."""
+  return Face(Plane((x0, y0, z), (0, 0, 1)),
+              loop([(x0, y0, z), (x1, y0, z), (x1, y1, z), (x0, y1, z)]))
+
+
+def square_face(x, y, z, size=1):
+  """Returns a square Face parallel to the xy plane."""
+  return rect_face(x, y, x+size, y+size, z)
+
+
+class DecimalsTest(unittest.TestCase):
+  """Runs each test at DECIMALS (if not None), then restores the global."""
+  DECIMALS = 3
+
+  def setUp(self):
+    """Sets Config.DECIMALS, restoring its value once the test is done."""
+    self.addCleanup(setattr, Config, 'DECIMALS', Config.DECIMALS)
+    if self.DECIMALS is not None:
+      Config.DECIMALS = self.DECIMALS
 
 
 class TestFaceContains1(unittest.TestCase):
@@ -24,8 +74,9 @@ class TestFaceContains1(unittest.TestCase):
     self.assertFalse(self.face.contains(point_outside))
 
 
-class TestFaceContains2(unittest.TestCase):
+class TestFaceContains2(DecimalsTest):
   def setUp(self):
+    super().setUp()
     c1, c2, c3 = (0, 0, 0), (1, 0, 0), (0, 1, 0)
     self.bound = Bound([Edge(c1, c2), Edge(c2, c3), Edge(c3, c1)])
     self.plane = Plane((0, 0, 0), (0, 0, 1))
@@ -99,6 +150,906 @@ class TestFaceContains6(unittest.TestCase):
     self.assertTrue(self.face.contains(point_origin))
 
 
+class TestPlaneInvariants(unittest.TestCase):
+  def test_flipped_axis(self):
+    """Test the canonical direction and signed offset of a flipped plane."""
+    plane = Plane((1, 2, -3), (0, 0, -2))
+    self.assertEqual(plane.normal.coordinates, (0, 0, -1))
+    self.assertEqual(plane.direction.coordinates, (0, 0, 1))
+    self.assertEqual(plane.pos_from_origin(), -3)
+    self.assertEqual(plane.pos_from_origin(Vector((0, 0, -5))), 2)
+    self.assertTrue(plane.contains(Vector((7, 7, -3))))
+    self.assertFalse(plane.contains(Vector((7, 7, -9))))
+    self.assertEqual(plane.distance_to_plane(Plane((0, 0, 4), (0, 0, 1))), 7)
+
+  def test_moved_plane(self):
+    """Test that setting the location or axis derives the invariants again."""
+    plane = Plane((0, 0, 1), (0, 0, 1))
+    plane.location = Vector((0, 0, 4))
+    self.assertEqual(plane.offset, 4)
+    plane.axis = Vector((1, 0, 0))
+    self.assertEqual((plane.direction.coordinates, plane.offset),
+                     ((1, 0, 0), 0))
+
+
+class TestFaceContainsMany(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    # An L shape: its notch is covered by a fan triangulation from (0, 0).
+    corners = [(0, 0, 0), (4, 0, 0), (4, 1, 0), (1, 1, 0), (1, 4, 0),
+               (0, 4, 0)]
+    self.face = Face(Plane((0, 0, 0), (0, 0, 1)), loop(corners))
+
+  def test_mask(self):
+    """Test a batch of inside, boundary, notch and off-plane points."""
+    points = [(0.5, 3, 0), (4, 0.5, 0), (3, 3, 0), (0.5, 3, 1)]
+    self.assertEqual(self.face.contains_many(points),
+                     [True, True, False, False])
+
+  def test_vector_array_input(self):
+    """Test that a VectorArray batch gives the same mask."""
+    points = [(0.5, 0.5, 0), (2, 2, 0)]
+    self.assertEqual(self.face.contains_many(VectorArray(points)),
+                     self.face.contains_many(points))
+
+  def test_contains_matches_batch(self):
+    """Test that Face.contains agrees with the batch query."""
+    self.assertFalse(self.face.contains(Vector((2, 2, 0))))
+    self.assertTrue(self.face.contains(Vector((2, 0.5, 0))))
+
+  def test_boundary_band_is_a_distance(self):
+    """Test that the boundary tolerance does not scale with edge length."""
+    strip = rect_face(0, 0, 100, 0.1, 0)
+    # Note: half a tol off the long edge, and two tols off the short one.
+    points = [(50, -0.0005, 0), (-0.002, 0.05, 0)]
+    self.assertEqual(strip.contains_many(points), [True, False])
+
+
+class TestSpatialIndex(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    self.low = square_face(0, 0, 0, 2)
+    self.high = square_face(1, 1, 1, 2)
+    self.far = square_face(10, 10, 2, 2)
+    self.coplanar = square_face(5, 0, 0, 2)
+    self.faces = FaceCollection([self.low, self.high, self.far,
+                                 self.coplanar])
+    self.direction = next(iter(self.faces.parallel))
+
+  def test_candidates_are_pruned(self):
+    """Test that distant boxes never become candidate pairs."""
+    pairs = self.faces.get_index().candidate_pairs(self.direction)
+    self.assertEqual(len(pairs), 1)
+
+  def test_overlapping_pairs(self):
+    """Test the pairs found against the exact shadow test."""
+    pairs = self.faces.overlapping_pairs(self.direction)
+    self.assertEqual([{id(a), id(b)} for a, b in pairs],
+                     [{id(self.low), id(self.high)}])
+
+  def test_overlapping_pairs_perturbed(self):
+    """Test that a direction within tolerance finds the bucket, else none."""
+    pairs = self.faces.overlapping_pairs(Vector((0, 0.0004, 0.9999999)))
+    self.assertEqual([{id(a), id(b)} for a, b in pairs],
+                     [{id(self.low), id(self.high)}])
+    self.assertEqual(self.faces.overlapping_pairs(Vector((0, 1, 0))), [])
+
+  def test_faces_shadowing(self):
+    """Test the per-face query, including coplanar neighbours."""
+    self.assertEqual(self.faces.faces_shadowing(self.high), [self.low])
+    self.assertEqual(self.faces.faces_shadowing(self.coplanar), [])
+
+  def test_pairwise_matrices(self):
+    """Test the distance matrix, and the shadow matrix serial and pooled."""
+    distances = self.faces.distance_matrices()[self.direction]
+    self.assertEqual(list(self.faces.positions[self.direction]), [0, 0, 1, 2])
+    self.assertEqual(list(distances.row(0)), [0, 0, 1, 2])
+    self.assertEqual(distances[3, 1], 2)
+    bucket = self.faces.parallel[self.direction]
+    low, high = bucket.index(self.low), bucket.index(self.high)
+    for workers in (0, 2):
+      shadows = self.faces.shadow_matrices(workers)[self.direction]
+      self.assertEqual(shadows.pairs(), [tuple(sorted((low, high)))])
+      self.assertIn((high, low), shadows)
+
+
+class TestIncrementalFaceCollection(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    self.faces = [square_face(0, 0, z) for z in (3, 1, 2)]
+    self.collection = FaceCollection(self.faces)
+    self.direction = next(iter(self.collection.parallel))
+
+  def test_sorted_positions(self):
+    """Test that buckets and cached positions are sorted together."""
+    self.assertEqual(self.collection.positions[self.direction], [1, 2, 3])
+    self.assertIs(self.collection.parallel[self.direction][0], self.faces[1])
+
+  def test_add_and_remove(self):
+    """Test that add and remove keep the bucket ordered."""
+    face = square_face(0, 0, 1.5)
+    self.collection.add(face)
+    self.assertIs(self.collection.parallel[self.direction][1], face)
+    self.assertEqual(len(self.collection), 4)
+    self.collection.remove(self.faces[0])
+    self.assertEqual(self.collection.positions[self.direction],
+                     [1, 1.5, 2])
+    self.assertEqual(len(self.collection), 3)
+
+  def test_range_and_nearest(self):
+    """Test the position range and nearest parallel face queries."""
+    found = self.collection.faces_between(self.direction, 1.5, 3)
+    self.assertEqual(found, [self.faces[2], self.faces[0]])
+    self.assertIs(self.collection.nearest_parallel(self.faces[1]),
+                  self.faces[2])
+
+
+class TestCoplanarMerge(DecimalsTest):
+  def test_ring_merges_with_hole(self):
+    """Test that a ring of squares merges into one face with a hole."""
+    ring = [square_face(x, y, 0) for x in range(3) for y in range(3)
+            if (x, y) != (1, 1)]
+    merged = FaceCollection(ring).merge_coplanar()
+    self.assertEqual(len(merged), 1)
+    face = merged.faces[0]
+    self.assertEqual(len(face.sources), 8)
+    self.assertEqual(len(face.holes), 1)
+    self.assertAlmostEqual(face.area(), 8)
+    self.assertFalse(face.contains(Vector((1.5, 1.5, 0))))
+
+  def test_only_coplanar_neighbours_merge(self):
+    """Test that faces apart, or on other planes, are kept as they are."""
+    faces = [rect_face(0, 0, 1, 1, 0), rect_face(1, 0, 2, 1, 0),
+             rect_face(5, 5, 6, 6, 0), rect_face(0, 0, 1, 1, 1),
+             rect_face(1, 1, 2, 2, 1)]
+    merged = FaceCollection(faces).merge_coplanar()
+    self.assertEqual(len(merged), 4)
+    areas = sorted(face.area() for face in merged.faces)
+    self.assertEqual([round(a, 6) for a in areas], [1, 1, 1, 2])
+
+  def test_shared_edge_straddling_cells(self):
+    """Test that end points within tol, across a grid cell, still merge."""
+    # Note: 1.0004 and 1.0006 round to different cells of 0.001.
+    faces = [rect_face(0, 0, 1.0004, 1, 0), rect_face(1.0006, 0, 2, 1, 0)]
+    merged = FaceCollection(faces).merge_coplanar()
+    self.assertEqual(len(merged), 1)
+    self.assertEqual(len(merged.faces[0].sources), 2)
+    self.assertAlmostEqual(merged.faces[0].area(), 2, 3)
+
+
+class TestFaceStore(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    ring = [square_face(x, y, 0) for x in range(3) for y in range(3)
+            if (x, y) != (1, 1)]
+    faces = ring + [square_face(0, 0, 2), rect_face(0, 0, 2, 1, 1)]
+    self.collection = FaceCollection(faces).merge_coplanar()
+    self.path = os.path.join(tempfile.mkdtemp(), 'faces.bin')
+    self.collection.export(self.path, {'advanced_face': 10})
+    self.store = FaceStore(self.path)
+
+  def tearDown(self):
+    self.store.close()
+
+  def test_columns_read_in_place(self):
+    """Test that areas and buckets come from the columns, holes included."""
+    self.assertEqual(len(self.store), len(self.collection))
+    self.assertEqual(self.store.layout['face_types'], {'advanced_face': 10})
+    expected = [f.area() for faces in self.collection.parallel.values()
+                for f in faces]
+    for a, b in zip(self.store.areas(), expected):
+      self.assertAlmostEqual(a, b)
+    (direction, first, end), = self.store.buckets()
+    self.assertEqual(direction, Vector((0, 0, 1)))
+    self.assertEqual(list(self.store.columns['positions'][first:end]),
+                     [0, 1, 2])
+
+  def test_reload_skips_sorting(self):
+    """Test that a reloaded collection matches, building Bounds lazily."""
+    loaded = load_faces(self.store)
+    self.assertEqual(loaded.positions, self.collection.positions)
+    face = loaded.faces_between(Vector((0, 0, 1)), 0, 0)[0]
+    self.assertIsInstance(face, StoredFace)
+    self.assertFalse(face.is_built())
+    self.assertAlmostEqual(face.area(), 8)
+    self.assertEqual(len(face.holes), 1)
+    self.assertFalse(face.contains(Vector((1.5, 1.5, 0))))
+    self.assertEqual(len(loaded.overlapping_pairs(Vector((0, 0, 1)))), 3)
+    loaded.remove(face)
+    self.assertEqual(len(loaded), 2)
+
+  def test_reload_keeps_stored_precision(self):
+    """Test that a coarser global keeps buckets, and coarser ones merge."""
+    tilted = square_face(0, 0, 0.5)
+    tilted.plane = Plane((0, 0, 0.5), (0.002, 0, 1))
+    path = os.path.join(tempfile.mkdtemp(), 'tilted.bin')
+    FaceCollection(self.collection.faces + [tilted]).export(path)
+    store = FaceStore(path)
+    self.addCleanup(store.close)
+    Config.DECIMALS = 1
+    self.assertEqual(len(load_faces(store).parallel), 2)
+    merged = load_faces(store, decimals=1)
+    (direction, faces), = merged.parallel.items()
+    self.assertEqual(len(faces), 4)
+    self.assertEqual(merged.positions[direction],
+                     sorted(merged.positions[direction]))
+
+
+class TestPrecisionIndependence(DecimalsTest):
+  DECIMALS = 0
+
+  def test_tolerance_per_query(self):
+    """Test that queries take their own tolerance over Config.DECIMALS."""
+    face = square_face(0, 0, 0)
+    point = Vector((0.5, 0.5, 0.004))
+    self.assertTrue(face.contains(point))
+    self.assertTrue(face.contains(point, 0.01))
+    self.assertFalse(face.contains(point, 0.001))
+    self.assertFalse(face.plane.contains(point, 0.001))
+
+  def test_tolerance_per_collection(self):
+    """Test that two precisions group the same faces side by side."""
+    tilted = square_face(0, 0, 1)
+    tilted.plane = Plane((0, 0, 1), (0.002, 0, 1))
+    faces = [square_face(0, 0, 0), tilted]
+    coarse = FaceCollection(faces, decimals=1)
+    fine = FaceCollection(faces, decimals=3)
+    self.assertEqual(len(coarse.parallel), 1)
+    self.assertEqual(len(fine.parallel), 2)
+    self.assertEqual(coarse.get_index().tol, 0.1)
+    self.assertEqual(len(coarse.shadow_matrices(workers=0)), 1)
+
+  def test_collection_tolerance_over_global(self):
+    """Test that a coarse collection's shadow tests ignore a fine global."""
+    Config.DECIMALS = 3
+    tilted = square_face(0, 0, 1)
+    tilted.plane = Plane((0, 0, 1), (0.002, 0, 1))
+    coarse = FaceCollection([square_face(0, 0, 0), tilted], decimals=1)
+    direction, = coarse.parallel
+    self.assertEqual(len(coarse.overlapping_pairs(direction)), 1)
+    matrix, = coarse.shadow_matrices(workers=0).values()
+    self.assertEqual(matrix.pairs(), [(0, 1)])
+
+  def test_sweep_converts_once(self):
+    """Test that a precision sweep reads the file once."""
+    sweep = sweep_precisions(os.path.join(STP_DIR, 'test1.stp'),
+                             range(1, 7), backend='native')
+    self.assertEqual(sorted(sweep), list(range(1, 7)))
+    self.assertEqual(len({s['faces'] for s in sweep.values()}), 1)
+
+
+class TestDirectionIndex(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    # Note: y rounds to 0.0 and 0.001, but the two are within tolerance.
+    self.a = Vector((1, 0.00049, 0)).unit()
+    self.b = Vector((1, 0.00051, 0)).unit()
+
+  def test_rounding_boundary(self):
+    """Test that directions straddling a rounding boundary share a key."""
+    index = DirectionIndex()
+    self.assertIs(index.key(self.a), index.key(self.b))
+    self.assertIsNone(index.find(Vector((0, 1, 0))))
+    self.assertEqual(len(index), 1)
+
+  def test_face_collection_grouping(self):
+    """Test that a FaceCollection puts such faces in one bucket."""
+    faces = [square_face(0, 0, z) for z in (0, 1)]
+    for face, d in zip(faces, (self.a, self.b)):
+      face.plane.axis = d
+    collection = FaceCollection(faces)
+    self.assertEqual(len(collection.parallel), 1)
+    self.assertEqual(len(collection.faces_between(self.b, -5, 5)), 2)
+
+
+class TestShadowEngine(DecimalsTest):
+  def test_cross_overlap(self):
+    """Test a cross where no vertex lies inside the other face."""
+    a, b = rect_face(0, 2, 6, 4, 0), rect_face(2, 0, 4, 6, 1)
+    self.assertAlmostEqual(a.overlap(b).area(), 4)
+    self.assertTrue(a.shadow(b))
+
+  def test_non_convex_overlap(self):
+    """Test the overlap of an L shape with a square over its notch."""
+    corners = [(0, 0, 0), (4, 0, 0), (4, 1, 0), (1, 1, 0), (1, 4, 0),
+               (0, 4, 0)]
+    l_shape = Face(Plane((0, 0, 0), (0, 0, 1)), loop(corners))
+    square = rect_face(0.5, 0.5, 3, 3, 2)
+    self.assertAlmostEqual(l_shape.overlap(square).area(), 2.5*0.5*2 - 0.25)
+    self.assertTrue(l_shape.shadow(square))
+
+  def test_touching_and_disjoint(self):
+    """Test that edge contact and distant faces do not shadow."""
+    a = rect_face(0, 0, 1, 1, 0)
+    self.assertFalse(a.shadow(rect_face(1, 0, 2, 1, 1)))
+    self.assertFalse(a.overlap(rect_face(5, 5, 6, 6, 1)))
+
+  def test_polygons_on_plane(self):
+    """Test that the overlap pieces are lifted onto a given plane."""
+    a, b = rect_face(0, 0, 2, 2, 0), rect_face(1, 1, 3, 3, 1)
+    loops = a.overlap(b).polygons(b.plane)
+    self.assertTrue(all(v.z == 1 for loop in loops for v in loop))
+
+  def test_few_convex_pieces(self):
+    """Test that a comb splits into one piece per tooth, cached per frame."""
+    teeth = [(0, 0, 0), (5, 0, 0), (5, 1, 0)]
+    for x in range(4, -1, -1):
+      teeth += [(x+0.5, 2, 0), (x, 1, 0)]
+    comb = Face(Plane((0, 0, 0), (0, 0, 1)), loop(teeth))
+    u, v = comb.plane.abs_unit_dir().orthonormal_basis()
+    pieces = comb.bound.get_pieces(u, v)
+    self.assertLessEqual(len(pieces), 6)
+    self.assertAlmostEqual(sum(map(signed_area, pieces)), comb.area())
+    self.assertIs(comb.bound.get_pieces(u, v), pieces)
+    self.assertAlmostEqual(comb.overlap(rect_face(0, 0, 5, 2, 1)).area(),
+                           comb.area())
+
+
+class TestFaceHoles(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    # A 4 x 4 plate with a 2 x 2 hole in the middle.
+    self.plate = Face(Plane((0, 0, 0), (0, 0, 1)),
+                      loop([(0, 0, 0), (4, 0, 0), (4, 4, 0), (0, 4, 0)]),
+                      [loop([(1, 1, 0), (1, 3, 0), (3, 3, 0), (3, 1, 0)])])
+
+  def test_area(self):
+    """Test that the hole is taken off the area."""
+    self.assertAlmostEqual(self.plate.area(), 12)
+
+  def test_contains(self):
+    """Test points in the ring, in the hole and on the hole's edge."""
+    points = [(0.5, 0.5, 0), (2, 2, 0), (1, 2, 0)]
+    self.assertEqual(self.plate.contains_many(points), [True, False, True])
+
+  def test_shadow_through_hole(self):
+    """Test that a face seen only through the hole is not shadowed."""
+    self.assertFalse(self.plate.shadow(rect_face(1.5, 1.5, 2.5, 2.5, 1)))
+    over = rect_face(0, 0, 2, 2, 1)
+    self.assertAlmostEqual(self.plate.overlap(over).area(), 3)
+    self.assertAlmostEqual(over.overlap(self.plate).area(), 3)
+
+
+class TestRevolvedFaces(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    self.axis = Plane((0, 0, 0), (0, 0, 1), (1, 0, 0))
+
+  def arc(self, radius, z, end=(0, 1), same_sense=True):
+    """Returns the sampled quarter (or full) arc at height z."""
+    circle = Circle(radius, Plane((0, 0, z), (0, 0, 1), (1, 0, 0)))
+    start = Vector((radius, 0, z))
+    stop = Vector((end[0]*radius, end[1]*radius, z))
+    return circle.arc_points(start, stop, same_sense)
+
+  def test_quarter_cylinder(self):
+    """Test the extents, area and containment of a quarter cylinder."""
+    face = CylindricalFace(self.axis, 2, self.arc(2, 0) + self.arc(2, 3))
+    self.assertAlmostEqual(face.theta[1], math.pi/2)
+    self.assertAlmostEqual(face.area(), 3*math.pi)
+    self.assertTrue(face.contains(Vector((math.sqrt(2), math.sqrt(2), 1))))
+    self.assertFalse(face.contains(Vector((-2, 0, 1))))
+    self.assertFalse(face.contains(Vector((1, 1, 1))))
+
+  def test_closed_circles_and_sense(self):
+    """Test that closed circles span a full turn, and the arc's sense."""
+    full = CylindricalFace(self.axis, 2, self.arc(2, 0, (1, 0)) +
+                                         self.arc(2, 1, (1, 0)))
+    self.assertAlmostEqual(full.area(), 4*math.pi)
+    reverse = CylindricalFace(self.axis, 2, self.arc(2, 0, (0, 1), False))
+    self.assertAlmostEqual(reverse.theta[1], 3*math.pi/2)
+
+  def test_cone_and_torus(self):
+    """Test the analytic areas of a full cone frustum and torus."""
+    cone = ConicalFace(self.axis, 1, math.pi/4, self.arc(1, 0, (1, 0)) +
+                                                self.arc(2, 1, (1, 0)))
+    self.assertAlmostEqual(cone.area(), math.pi*(1+2)*math.sqrt(2))
+    tube = Circle(1, Plane((3, 0, 0), (0, 1, 0), (1, 0, 0)))
+    points = tube.arc_points(Vector((4, 0, 0)), Vector((4, 0, 0)))
+    torus = ToroidalFace(self.axis, 3, 1, points + self.arc(4, 0, (1, 0)))
+    self.assertAlmostEqual(torus.area(), 4*math.pi**2*3)
+    self.assertTrue(torus.contains(Vector((0, 3, 1))))
+
+  def test_surface_area_is_abstract(self):
+    """Test that only surfaces defining their area can be created."""
+    with self.assertRaises(TypeError):
+      RevolvedFace(self.axis, self.arc(1, 0, (1, 0)))
+
+  def test_coaxial_groups(self):
+    """Test that faces on one axis line share a group."""
+    a = CylindricalFace(self.axis, 2, self.arc(2, 0))
+    b = CylindricalFace(Plane((0, 0, 5), (0, 0, -1)), 3, self.arc(3, 5))
+    c = CylindricalFace(Plane((1, 0, 0), (0, 0, 1)), 2, self.arc(2, 0))
+    faces = CoaxialCollection([a, b, c])
+    self.assertEqual(len(faces.coaxial), 2)
+    self.assertEqual(faces.faces_on_axis(b), [a, b])
+
+  def test_notched_loop(self):
+    """Test that a loop bounds the area and containment, not its extents."""
+    # Note: an L in (theta, h): the upper half of the first 1/8 turn is cut.
+    r, eighth = 2, math.pi/4
+    corner = Vector((r*math.cos(eighth), r*math.sin(eighth), 0))
+    loop = self.arc(r, 0) + [Vector((0, r, 3)),
+                             corner + Vector((0, 0, 3)),
+                             corner + Vector((0, 0, 1.5)),
+                             Vector((r, 0, 1.5))]
+    face = CylindricalFace(self.axis, r, None, [loop])
+    self.assertAlmostEqual(face.extent_area(), 3*math.pi)
+    self.assertAlmostEqual(face.area(), 9*math.pi/4)
+    notch = Vector((r*math.cos(eighth/2), r*math.sin(eighth/2), 2.5))
+    self.assertFalse(face.contains(notch))
+    self.assertTrue(face.contains(Vector((0, r, 2.5))))
+    self.assertTrue(face.contains(Vector((r, 0, 1))))
+
+  def test_torus_band_orientation(self):
+    """Test that the loops' sense picks which band of a torus is the face."""
+    inner = self.arc(2, 0, (1, 0))[:-1]
+    lower = self.arc(3, -1, (1, 0))[:-1][::-1]
+    band = ToroidalFace(self.axis, 3, 1, None, [inner, lower])
+    self.assertAlmostEqual(band.area(), 2*math.pi*(3*math.pi/2 - 1), 3)
+    self.assertTrue(band.contains(Vector((0, -3 + math.sqrt(0.5),
+                                          -math.sqrt(0.5)))))
+    self.assertFalse(band.contains(Vector((0, 4, 0))))
+    rest = ToroidalFace(self.axis, 3, 1, None, [inner[::-1], lower[::-1]])
+    self.assertAlmostEqual(rest.area(), 9*math.pi**2 + 2*math.pi, 3)
+    self.assertTrue(rest.contains(Vector((0, 4, 0))))
+
+  def test_converted_loops(self):
+    """Test that converted faces are trimmed by, and contain, their loops."""
+    design = STPFile(os.path.join(STP_DIR, 'test1.stp'))
+    faces = [face for _, face in design.iter_3D_objects(['advanced_face'])
+             if isinstance(face, CylindricalFace)]
+    self.assertEqual(len(faces), 2)
+    for face in faces:
+      self.assertTrue(0 < face.area() < face.extent_area())
+      for loop in face.loops:
+        self.assertTrue(all(face.contains(p) for p in loop))
+
+
+class TestBSplineFaces(DecimalsTest):
+  def quarter_cylinder(self):
+    """Returns a rational quarter cylinder of radius 1 and height 1."""
+    w = math.sqrt(2)/2
+    points = [[(1, 0, 0), (1, 0, 1)], [(1, 1, 0), (1, 1, 1)],
+              [(0, 1, 0), (0, 1, 1)]]
+    return BSplineSurface(2, 1, points, expand_knots([0, 1], [3, 3]),
+                          expand_knots([0, 1], [2, 2]),
+                          [[1, 1], [w, w], [1, 1]])
+
+  def test_flat_patch(self):
+    """Test the mesh, area and containment of a bilinear patch."""
+    points = [[(0, 0, 0), (0, 2, 0)], [(2, 0, 0), (2, 2, 0)]]
+    knots = expand_knots([0, 1], [2, 2])
+    face = BSplineFace(BSplineSurface(1, 1, points, knots, knots))
+    self.assertEqual(len(face.get_mesh()), 2)
+    self.assertAlmostEqual(face.area(), 4)
+    self.assertTrue(face.contains(Vector((1, 1, 0))))
+    self.assertFalse(face.contains(Vector((1, 1, 1))))
+
+  def test_rational_cylinder(self):
+    """Test that the tessellated area converges, and meshes are cached."""
+    face = BSplineFace(self.quarter_cylinder())
+    self.assertAlmostEqual(face.area(), math.pi/2, 2)
+    w = math.sqrt(2)/2
+    self.assertTrue(face.contains(Vector((w, w, 0.5))))
+    self.assertIs(face.get_mesh(), face.get_mesh())
+    self.assertLess(len(face.get_mesh(0.1)), len(face.get_mesh(0.001)))
+    self.assertEqual(len(face.meshes), 2)
+
+  def test_trim_and_shadow(self):
+    """Test trimming to the boundary points, and shadows on a plane."""
+    surface = self.quarter_cylinder()
+    points = [Vector(p) for p in surface.evaluate_grid([0, 1], [0, 0.5])]
+    half = BSplineFace(surface, points)
+    self.assertAlmostEqual(half.area(), math.pi/4, 2)
+    self.assertFalse(half.contains(Vector((1, 0, 0.9))))
+    near = Face(Plane((2, 0, 0), (1, 0, 0)),
+                loop([(2, 0, 0), (2, 1, 0), (2, 1, 1), (2, 0, 1)]))
+    far = Face(Plane((2, 0, 2), (1, 0, 0)),
+               loop([(2, 0, 2), (2, 1, 2), (2, 1, 3), (2, 0, 3)]))
+    self.assertTrue(half.shadow(near))
+    self.assertFalse(half.shadow(far))
+
+  def test_rational_curve(self):
+    """Test that a rational quarter circle's samples lie on the circle."""
+    w = math.sqrt(2)/2
+    curve = BSplineCurve(2, [(1, 0, 0), (1, 1, 0), (0, 1, 0)],
+                         expand_knots([0, 1], [3, 3]), [1, w, 1])
+    samples = curve.sample()
+    self.assertEqual(len(samples), 5)
+    self.assertEqual(samples[-1], (0, 1, 0))
+    for x, y, z in samples:
+      self.assertAlmostEqual(math.hypot(x, y), 1)
+
+
+class TestVectorArray(unittest.TestCase):
+  def setUp(self):
+    self.a = VectorArray([(1, 0, 0), (0, 2, 0)])
+    self.b = VectorArray([(0, 1, 0), (0, 0, 3)])
+
+  def test_batch_products(self):
+    """Test row-wise cross, dot, norm and unit against Vector."""
+    for i in range(2):
+      self.assertEqual(self.a.cross(self.b)[i],
+                       self.a[i].cross_product(self.b[i]))
+      self.assertEqual(self.a.dot(self.b)[i],
+                       self.a[i].dot_product(self.b[i]))
+      self.assertAlmostEqual(self.a.norm()[i], self.a[i].norm())
+      self.assertEqual(self.a.unit()[i], self.a[i].unit())
+
+  def test_broadcast_vector(self):
+    """Test that a single Vector is applied to every row."""
+    moved = self.a - Vector((1, 1, 1))
+    self.assertEqual(moved.row(1), (-1.0, 1.0, -1.0))
+
+
+class TestFaceSoA(unittest.TestCase):
+  def setUp(self):
+    c1, c2, c3, c4 = (0, 0, 0), (2, 0, 0), (2, 2, 0), (0, 2, 0)
+    plane = Plane((0, 0, 0), (0, 0, 1))
+    self.faces = [Face(plane, Bound([Edge(c1, c2), Edge(c2, c3),
+                                     Edge(c3, c1)])),
+                  Face(plane, Bound([Edge(c1, c3), Edge(c3, c4),
+                                     Edge(c4, c1)]))]
+    self.soa = FaceSoA(self.faces)
+
+  def test_shared_vertices(self):
+    """Test that vertices shared by faces are stored once."""
+    self.assertEqual(len(self.soa), 2)
+    self.assertEqual(len(self.soa.vertices), 4)
+
+  def test_areas(self):
+    """Test the batch areas against Face.area."""
+    for face, area in zip(self.faces, self.soa.areas()):
+      self.assertAlmostEqual(area, face.area())
+
+  def test_holes(self):
+    """Test that holes are kept in areas and in rebuilt faces."""
+    outer = square_face(0, 0, 0, 3)
+    outer.holes = [square_face(1, 1, 0).bound]
+    soa = FaceSoA([outer])
+    self.assertAlmostEqual(soa.areas()[0], 8)
+    face = soa.face(0)
+    self.assertEqual(len(face.holes), 1)
+    self.assertFalse(face.contains(Vector((1.5, 1.5, 0)), 0.001))
+    self.assertTrue(face.contains(Vector((0.5, 0.5, 0)), 0.001))
+
+
+class TestNativeParser(unittest.TestCase):
+  def setUp(self):
+    self.design = stp_parser.open_project(os.path.join(STP_DIR, 'test1.stp'))
+
+  def test_resolves_references(self):
+    """Test that references resolve to the attribute names _convert uses."""
+    face = next(e for e in self.design
+                if stp_parser.type(e) == 'advanced_face')
+    loc = face.face_geometry.position.location.coordinates
+    edge = face.bounds[0].bound.edge_list[0].edge_element
+    self.assertEqual(len(loc), 3)
+    self.assertEqual(stp_parser.type(edge.edge_start), 'vertex_point')
+
+  def test_complex_instance_type(self):
+    """Test that complex instances are named by their leaf types."""
+    types = {stp_parser.type(e) for e in self.design}
+    self.assertIn('length_unit_and_si_unit', types)
+
+  def test_type_index(self):
+    """Test that the offset index only visits the requested types."""
+    cursor = stp_parser.DesignCursor(self.design, ('vertex_point',))
+    types = {stp_parser.type(e) for e in cursor}
+    self.assertEqual(types, {'vertex_point'})
+    self.assertEqual(len(self.design.by_type['advanced_face']), 18)
+
+  def test_reads_planar_faces(self):
+    """Test the native backend reads the same faces as steptools did."""
+    design = STPFile(os.path.join(STP_DIR, 'test1.stp'), backend='native')
+    objects = design.get_3D_objects(('advanced_face',))
+    faces = [f for f in objects['advanced_face'] if isinstance(f, Face)]
+    self.assertEqual(len(faces), 12)
+    self.assertEqual(design.face_types['plane'], 12)
+
+
+class TestConversionMemo(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    self.design = STPFile(os.path.join(STP_DIR, 'test1.stp'),
+                          backend='native')
+    self.objects = self.design.get_3D_objects(('advanced_face',
+                                               'vertex_point'))
+
+  def test_faces_share_vertices(self):
+    """Test that faces and vertex points share one Vector per point."""
+    # Note: loops also hold points sampled along curves, between vertices.
+    shared = {tuple(v): id(v) for v in self.objects['vertex_point']}
+    ids = {tuple(v): id(v) for f in self.objects['advanced_face']
+           if isinstance(f, Face) for v in f.bound.get_vertex_loop()
+           if tuple(v) in shared}
+    self.assertEqual(ids, shared)
+
+  def test_precision_reuses_conversions(self):
+    """Test that another precision reuses the unrounded points."""
+    Config.DECIMALS = 1
+    points = self.design.get_3D_objects(('vertex_point',))['vertex_point']
+    self.assertEqual({id(v) for v in points},
+                     {id(v) for v in self.objects['vertex_point']})
+
+
+class TestLazyFace(DecimalsTest):
+  def test_bounds_built_on_first_use(self):
+    """Test that a LazyFace builds its Bounds once, and acts as a Face."""
+    outer = [Vector(c) for c in [(0, 0, 0), (4, 0, 0), (4, 4, 0), (0, 4, 0)]]
+    inner = [Vector(c) for c in [(1, 1, 0), (1, 2, 0), (2, 2, 0), (2, 1, 0)]]
+    face = LazyFace(Plane((0, 0, 0), (0, 0, 1)), (outer, [inner]))
+    self.assertFalse(face.is_built())
+    self.assertAlmostEqual(face.area(), 15)
+    self.assertTrue(face.is_built())
+    self.assertIs(face.bound, face.bound)
+    self.assertFalse(face.contains(Vector((1.5, 1.5, 0))))
+
+  def test_conversion_defers_bounds(self):
+    """Test that reading a file builds no Bound, and bad loops still fail."""
+    design = STPFile(os.path.join(STP_DIR, 'test1.stp'), backend='native')
+    faces = design.get_3D_objects(('advanced_face',))['advanced_face']
+    faces = [f for f in faces if isinstance(f, Face)]
+    self.assertTrue(faces and not any(f.is_built() for f in faces))
+    # Note: a circle read by its end points alone would be one vertex.
+    collapsed = [Vector((1, 0, 0))]
+    with self.assertRaises(AssertionError):
+      LazyFace(Plane((0, 0, 0), (0, 0, 1)), (collapsed, []))
+
+  def test_annulus_area(self):
+    """Test that a planar ring bounded by two circles keeps its area."""
+    design = STPFile(os.path.join(STP_DIR, 'hard.stp'), backend='native')
+    faces = design.get_3D_objects(('advanced_face',))['advanced_face']
+    areas = [f.area() for f in faces if isinstance(f, Face)]
+    self.assertTrue(all(area > 0 for area in areas))
+    # Note: the circles (r=62.5, hole r=62.15) are sampled as polygons.
+    ring = math.pi * (62.5**2 - 62.15**2)
+    self.assertTrue(any(abs(area - ring) < 0.02 * ring for area in areas))
+
+
+class TestStreaming(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    self.path = os.path.join(STP_DIR, 'test2.stp')
+
+  def test_stream_matches_lists(self):
+    """Test that the stream yields what get_3D_objects returns."""
+    types = ('advanced_face', 'vertex_point')
+    objects = STPFile(self.path, 'native').get_3D_objects(types)
+    streamed = dict()
+    for key, obj in STPFile(self.path, 'native').iter_3D_objects(types):
+      streamed[key] = streamed.get(key, 0) + 1
+    self.assertEqual(streamed, {k: len(v) for k, v in objects.items()})
+
+  def test_unkept_stream_summary(self):
+    """Test that without keep nothing is retained, and the summary counts."""
+    design = STPFile(self.path, 'native')
+    summary = collect_faces(design.iter_3D_objects(('advanced_face',),
+                                                   keep=False), summary=True)
+    self.assertEqual(design.memo, {})
+    self.assertEqual(len(design.topology), 0)
+    kept = STPFile(self.path, 'native')
+    faces = collect_faces(kept.iter_3D_objects(('advanced_face',)))
+    self.assertEqual(design.unreadable_count, len(kept.unreadable))
+    self.assertEqual(design.unreadable, [])
+    self.assertEqual(len(summary), len(faces))
+    self.assertEqual(len(summary.parallel), len(faces.parallel))
+    for direction, bucket in faces.parallel.items():
+      count, low, high = summary.parallel[summary.directions.find(direction)]
+      positions = faces.positions[direction]
+      self.assertEqual((count, low, high),
+                       (len(bucket), positions[0], positions[-1]))
+
+
+class TestTopology(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    self.path = os.path.join(STP_DIR, 'test3.stp')
+    self.design = STPFile(self.path, backend='native')
+    self.faces = self.design.get_3D_objects(('advanced_face',))
+    self.topology = self.design.topology
+
+  def test_closed_shell(self):
+    """Test that every face, readable or not, is in one closed shell."""
+    self.assertEqual(len(self.topology), 10)
+    self.assertEqual(self.topology.shells(), [list(range(10))])
+    self.assertTrue(all(len(self.topology.faces_of_edge(e)) == 2
+                        for e in range(self.topology.edge_count())))
+
+  def test_adjacency(self):
+    """Test that neighbours are symmetric and share an edge."""
+    face = next(f for f in self.faces['advanced_face'] if isinstance(f, Face))
+    f = self.topology.face_id(face)
+    for g in self.topology.neighbours(f):
+      self.assertIn(f, self.topology.neighbours(g))
+      self.assertTrue(self.topology.shared_edges(f, g))
+
+  def test_cached_topology(self):
+    """Test that the topology is restored (and usable) on a cache hit."""
+    cache_dir = tempfile.mkdtemp()
+    STPFile(self.path, 'native', cache_dir).get_3D_objects(('advanced_face',))
+    design = STPFile(self.path, 'native', cache_dir)
+    faces = design.get_3D_objects(('advanced_face',))['advanced_face']
+    self.assertIsNone(design.stp_file)
+    f = design.topology.face_id(faces[-1])
+    self.assertIs(design.topology.faces[f], faces[-1])
+
+
+class TestGeometryCache(DecimalsTest):
+  def setUp(self):
+    super().setUp()
+    self.cache_dir = tempfile.mkdtemp()
+    self.path = os.path.join(STP_DIR, 'test3.stp')
+
+  def read(self):
+    design = STPFile(self.path, backend='native', cache_dir=self.cache_dir)
+    return design, design.get_3D_objects(('advanced_face',))
+
+  def test_cache_hit_skips_parsing(self):
+    """Test that a second read is served from the cache."""
+    first, objects = self.read()
+    second, cached = self.read()
+    self.assertIsNone(second.stp_file)
+    self.assertEqual(len(cached['advanced_face']),
+                     len(objects['advanced_face']))
+    self.assertEqual(second.face_types, first.face_types)
+    self.assertEqual(len(second.unreadable), len(first.unreadable))
+    self.assertEqual(second.unreadable_types, first.unreadable_types)
+
+  def test_precision_shares_entry(self):
+    """Test that changing DECIMALS reuses the unrounded entry."""
+    self.read()
+    Config.DECIMALS = 2
+    design, _ = self.read()
+    self.assertIsNone(design.stp_file)
+    self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+  def test_backend_in_key(self):
+    """Test that entries of different backends are kept apart."""
+    types = ('advanced_face',)
+    self.assertNotEqual(cache_key('digest', types, 'native'),
+                        cache_key('digest', types, 'steptools'))
+    self.assertEqual(cache_key('digest', types, 'native'),
+                     cache_key('digest', list(types), 'native'))
+
+
+class TestBatch(unittest.TestCase):
+  def test_batch_report(self):
+    """Test that a pooled batch merges per-file reports."""
+    paths = [os.path.join(STP_DIR, f'test{i}.stp') for i in (1, 3)]
+    result = analyze_batch(paths, 3, ('advanced_face',), backend='native',
+                           workers=2)
+    faces = [report['faces'] for report in result['files']]
+    self.assertEqual(faces, [12, 7])
+    self.assertEqual(result['totals']['faces'], 19)
+    self.assertEqual(result['totals']['face_types']['plane'], 19)
+    self.assertEqual(result['totals']['failed'], 0)
+
+  def test_precision_groups_directions(self):
+    """Test that the report's direction counts follow the precision."""
+    path = os.path.join(STP_DIR, 'test1.stp')
+    coarse = analyze_file(path, 0, ('advanced_face',))
+    fine = analyze_file(path, 3, ('advanced_face',))
+    self.assertEqual(coarse['faces'], fine['faces'])
+    self.assertEqual((len(coarse['directions']), len(fine['directions'])),
+                     (2, 5))
+    self.assertEqual(sum(d['faces'] for d in coarse['directions']), 12)
+
+  def test_batch_error_is_reported(self):
+    """Test that an unreadable path is reported instead of raised."""
+    result = analyze_batch([os.path.join(STP_DIR, 'missing.stp')], 3,
+                           ('advanced_face',), backend='native', workers=1)
+    self.assertEqual(result['totals']['failed'], 1)
+
+
+class TestService(unittest.TestCase):
+  async def run_jobs(self, jobs):
+    """Returns the results of the jobs, and the service's stats."""
+    async with AnalysisService(workers=2, max_pending=2) as service:
+      server = await serve(service, port=0)
+      async with server:
+        port = server.sockets[0].getsockname()[1]
+        return await request(jobs, port=port), service.stats
+
+  def test_jobs_are_answered_and_shared(self):
+    """Test results by id, duplicates run once per precision, bad jobs fail."""
+    path = os.path.join(STP_DIR, 'test1.stp')
+    jobs = [{'id': 1, 'path': path}, {'id': 2, 'path': path},
+            {'id': 3, 'path': os.path.join(STP_DIR, 'test3.stp')},
+            {'id': 4, 'path': os.path.join(STP_DIR, 'missing.stp')},
+            {'id': 5}, {'id': 6, 'path': path, 'precision': 0}]
+    results, stats = asyncio.run(self.run_jobs(jobs))
+    by_id = {r['id']: r for r in results}
+    self.assertEqual(sorted(by_id), [1, 2, 3, 4, 5, 6])
+    self.assertEqual([by_id[i]['report']['faces'] for i in (1, 2, 3)],
+                     [12, 12, 7])
+    self.assertEqual(by_id[1]['report']['digest'],
+                     by_id[2]['report']['digest'])
+    self.assertIsNotNone(by_id[4]['report']['error'])
+    self.assertIn('Bad job', by_id[5]['error'])
+    self.assertEqual([len(by_id[i]['report']['directions']) for i in (1, 6)],
+                     [5, 2])
+    self.assertEqual((stats['runs'], stats['shared']), (4, 1))
+
+  def test_bad_types_and_precision(self):
+    """Test that jobs with bad types or precision get an error response."""
+    path = os.path.join(STP_DIR, 'test1.stp')
+    jobs = [{'id': 1, 'path': path, 'types': 'advanced_face'},
+            {'id': 2, 'path': path, 'types': [1]},
+            {'id': 3, 'path': path, 'precision': '3'},
+            {'id': 4, 'path': path, 'precision': 2.5}]
+    results, stats = asyncio.run(self.run_jobs(jobs))
+    for result in results:
+      self.assertIn('Bad job', result['error'])
+    self.assertEqual(len(results), 4)
+    self.assertEqual(stats['runs'], 0)
+
+
+class TestInstrument(DecimalsTest):
+  def test_hooks_by_type(self):
+    """Test that conversions are counted per face geometry type."""
+    with instrument.recording() as recorder:
+      design = STPFile(os.path.join(STP_DIR, 'test3.stp'), backend='native')
+      design.get_3D_objects(('advanced_face',))
+    hooks = recorder.to_dict()
+    self.assertEqual(hooks['convert.advanced_face.plane']['count'], 7)
+    self.assertEqual(hooks['convert.advanced_face.plane']['errors'], 0)
+    self.assertNotIn('bound.connect_edge_graph', hooks)
+
+  def test_inactive_and_callback(self):
+    """Test that nothing is recorded outside a block, and the callback."""
+    calls = []
+    with instrument.recording(trace=True, callback=lambda *a: calls.append(a)) \
+         as recorder:
+      square_face(0, 0, 0).shadow(square_face(0, 0, 1))
+    square_face(0, 0, 0).shadow(square_face(0, 0, 1))
+    self.assertEqual(recorder.counts['face.shadow'], 1)
+    self.assertEqual(len(recorder.to_trace()['traceEvents']), len(calls))
+
+  def test_passes_not_positions(self):
+    """Test that the build and shadow passes are timed, not each position."""
+    faces = [square_face(0, 0, z) for z in range(4)]
+    with instrument.recording() as recorder:
+      FaceCollection(faces).shadow_matrices(workers=0)
+    self.assertEqual(recorder.counts['collection.sort_by_axis_pos'], 1)
+    self.assertEqual(recorder.counts['pairwise.shadow_matrices'], 1)
+    self.assertNotIn('plane.pos_from_origin', recorder.counts)
+
+
+class TestBenchmark(DecimalsTest):
+  DECIMALS = None
+
+  def setUp(self):
+    super().setUp()
+    self.result = benchmark([os.path.join(STP_DIR, 'test3.stp')], repeat=1)
+
+  def test_stage_report(self):
+    """Test that every stage reports time, memory and throughput."""
+    report = self.result['files']['test3.stp']
+    self.assertEqual(report['stages']['convert']['items'], 10)
+    self.assertEqual(report['stages']['collection']['items'], 7)
+    self.assertTrue(all(s['peak_bytes'] >= 0 and s['seconds'] > 0
+                        for s in report['stages'].values()))
+    self.assertGreater(report['entities_per_sec'], 0)
+
+  def test_precision_not_global(self):
+    """Test that the precision reaches the run without changing Config."""
+    before = Config.DECIMALS
+    benchmark([os.path.join(STP_DIR, 'test3.stp')], precision=5, repeat=1)
+    self.assertEqual(Config.DECIMALS, before)
+
+  def test_compare_to_baseline(self):
+    """Test that only stages slower than the baseline are reported."""
+    self.assertEqual(compare(self.result, self.result), [])
+    baseline = json.loads(json.dumps(self.result))
+    self.result['files']['test3.stp']['stages']['convert']['seconds'] = 1.0
+    baseline['files']['test3.stp']['stages']['convert']['seconds'] = 0.5
+    regressions = compare(self.result, baseline)
+    self.assertEqual([r['stage'] for r in regressions], ['convert'])
+    self.assertAlmostEqual(regressions[0]['ratio'], 2.0)
+
+
 if __name__ == "__main__":
   unittest.main()
 
@@ -9,14 +9,33 @@
 
 
 import math
+from instrument import timed
+from shadow_engine import Overlap, convex_pieces, pieces_overlap, \
+                          subtract_pieces
 
 
 class Config:
   """Stores necesssary configurations."""
-  # NOTE! DECIMALS by default, unless changed.
+  # NOTE! The default precision of queries and indexes not given their own.
   DECIMALS = 0
 
 
+def tolerance(tol=None) -> float:
+  """Returns tol, or the tolerance of Config.DECIMALS when it is None."""
+  return 1/math.pow(10, Config.DECIMALS) if tol is None else tol
+
+
+def loop_area(verts) -> float:
+  """Returns the area of a planar vertex loop (half its Newell normal)."""
+  # Note: unlike a triangle fan, the Newell normal is right when non-convex.
+  nx = ny = nz = 0.0
+  for (x1, y1, z1), (x2, y2, z2) in zip(verts, verts[1:] + verts[:1]):
+    nx += (y1-y2) * (z1+z2)
+    ny += (z1-z2) * (x1+x2)
+    nz += (x1-x2) * (y1+y2)
+  return math.sqrt(nx*nx + ny*ny + nz*nz) / 2
+
+
 class Vector:
   """Stores a 3D point."""
   def __init__(self, c=None):
@@ -47,11 +66,8 @@ class Vector:
     return hash(self.coordinates)
 
   def __eq__(self, other):
-    """Checks if two vectors are equal."""
-    for c1, c2 in zip(self.coordinates, other.coordinates):
-      if abs(c1-c2) > (1/math.pow(10, Config.DECIMALS)):
-        return False
-    return True
+    """Checks if two vectors are equal (within Config.DECIMALS)."""
+    return self.is_close(other)
 
   def __add__(self, other):
     """Adds two Vector objects."""
@@ -70,6 +86,14 @@ class Vector:
     """Performs right-hand scalar multiplication."""
     return self * scalar
 
+  def is_close(self, other, tol=None):
+    """Checks if two vectors are equal within the tolerance."""
+    tol = tolerance(tol)
+    for c1, c2 in zip(self.coordinates, other.coordinates):
+      if abs(c1-c2) > tol:
+        return False
+    return True
+
   def distance_to_point(self, v):
     """Calculates the distance between self and v."""
     dx = (self.x-v.x)*(self.x-v.x)
@@ -96,13 +120,21 @@ class Vector:
     """Returns the unit vector."""
     return self*(1/self.norm())
 
+  def orthonormal_basis(self):
+    """Returns unit vectors u, v such that (u, v, self.unit()) is a frame."""
+    n = self.unit()
+    helper = Vector((1, 0, 0)) if abs(n.x) < 0.9 else Vector((0, 1, 0))
+    u = helper.cross_product(n).unit()
+    return u, n.cross_product(u)
+
 
 class Edge:
   """Stores two 3D points."""
   def __init__(self, start=None, end=None):
     """Initializes an Edge object."""
-    self.start = Vector(start)
-    self.end = Vector(end)
+    # Note: Vectors are never mutated, so a given one is shared, not copied.
+    self.start = start if isinstance(start, Vector) else Vector(start)
+    self.end = end if isinstance(end, Vector) else Vector(end)
 
   def __repr__(self):
     """Returns the string representation."""
@@ -116,12 +148,27 @@ class Edge:
 
 
 class Plane:
-  """Stores two vectors."""
+  """Stores two vectors, and the invariants derived from them."""
+  # Note: slots keep the many planes of a model small.
+  __slots__ = ('location', 'axis', 'ref_direction', 'normal', 'direction',
+               'offset')
+
   def __init__(self, loc=None, ax=None, ref_d=None):
     """Initializes a Plane object."""
     self.location = Vector(loc)
     self.axis = Vector(ax)
     self.ref_direction = ref_d
+    # Note: the unit normal, its canonical (abs) direction, and the signed
+    # offset of the plane along that direction (direction . x = offset).
+    self.normal, self.direction, self.offset = \
+      self._invariants(self.location, self.axis)
+
+  def __setattr__(self, name, value):
+    """Sets an attribute, deriving the invariants again if the plane moved."""
+    object.__setattr__(self, name, value)
+    if name in ('location', 'axis') and hasattr(self, 'offset'):
+      self.normal, self.direction, self.offset = \
+        self._invariants(self.location, self.axis)
 
   def __repr__(self):
     """Returns the string representation."""
@@ -135,61 +182,77 @@ class Plane:
     ref_eq = self.ref_direction == other.ref_direction
     return loc_eq and ax_eq and ref_eq
 
+  @staticmethod
+  def _invariants(location, axis):
+    """Returns the (normal, direction, offset), or Nones if undefined."""
+    if axis is None or None in axis.coordinates or not any(axis):
+      return None, None, None
+    normal = axis.unit()
+    direction = normal
+    # Note: the first non-zero value must be positive.
+    for k in normal:
+      if k > 0:
+        break
+      elif k < 0:
+        direction = (-1) * normal
+        break
+    offset = None
+    if location is not None and None not in location.coordinates:
+      offset = direction.dot_product(location)
+    return normal, direction, offset
+
   def nonempty(self):
     """Determines if the self object is empty."""
     return self.location is not None and self.axis is not None
 
-  def contains(self, v):
+  def contains(self, v, tol=None):
     """Determines if the Vector v is on the plane."""
-    dot_perp = (v-self.location).dot_product(self.axis)
-    return dot_perp <= 1/(math.pow(10, Config.DECIMALS)) and self.nonempty()
+    return self.distance_to_point(v) <= tolerance(tol) and self.nonempty()
 
-  def is_parallel_to(self, other):
+  def is_parallel_to(self, other, tol=None):
     """Determines if the Plane p is parallel to this plane."""
-    return self.abs_unit_dir() == other.abs_unit_dir() and self.nonempty()
+    return self.nonempty() and self.direction.is_close(other.direction, tol)
 
   def abs_unit_dir(self):
     """Returns the absolute unit direction of the plane."""
-    # Note: the first non-zero value must be positive.
-    ax_dir = self.axis.unit()
-    for k in ax_dir:
-      if k > 0:
-        return ax_dir
-      elif k < 0:
-        return (-1) * ax_dir
-    return ax_dir
+    return self.direction
 
-  def distance_to_plane(self, other):
+  def distance_to_plane(self, other, tol=None):
     """Calculates the distance between parallel planes."""
-    if self.is_parallel_to(other):
-      distance = abs((other.location-self.location).dot_product(self.axis.unit()))
-      return distance
+    if self.is_parallel_to(other, tol):
+      return abs(other.offset - self.offset)
     else:
       raise ValueError('Distance between planes exists iff parallel!')
 
   def distance_to_point(self, v):
     """Calculates the distance to point v."""
-    return abs((v-self.location).dot_product(self.axis.unit()))
-
-  def pos_from_origin(self, origin=Vector((0, 0, 0))):
-    """Calculates the position from zero, unless otherwise stated."""
-    dist_from_origin = self.distance_to_point(origin)
-    # Note: it is necessary to check whether the direction is the opposite.
-    if self.contains(self.abs_unit_dir()*dist_from_origin):
-      return dist_from_origin
-    elif self.contains((-1)*self.abs_unit_dir()*dist_from_origin):
-      return -dist_from_origin
-    else:
-      raise ValueError("Makes no sense. The plane has no pos from origin.")
+    d = self.direction
+    return abs(d.x*v.x + d.y*v.y + d.z*v.z - self.offset)
+
+  def pos_from_origin(self, origin=None):
+    """Calculates the signed position from zero, unless otherwise stated."""
+    # Note: along the canonical direction, so parallel planes sort together.
+    if origin is None:
+      return self.offset
+    return self.offset - self.direction.dot_product(origin)
 
 
 class Bound:
   """Stores a collection of edges."""
-  def __init__(self, edges=None):
+  def __init__(self, edges=None, loop=None):
     """Initializes a Bound object."""
-    self.vert_graph: dict = self._connect_edge_graph(edges)
-    self.vertices: dict = self._make_vertex_loop(self.vert_graph)
+    # Note: an ordered vertex loop (e.g. a stored one) needs no graph walk.
+    if loop is None:
+      self.vert_graph: dict = self._connect_edge_graph(edges)
+      self.vertices: dict = self._make_vertex_loop(self.vert_graph)
+    else:
+      self.vert_graph, self.vertices = self._ordered_loop(loop)
     self.edges: list = self.get_edge_loop()
+    # Note: (origin, normal, u, v, xs, ys) of the loop in its own 2D frame.
+    self.polygon: tuple = None
+    # Note: ((u, v), convex pieces) of the loop in the last shared frame
+    # asked for, so a face's parallel pairs split it once.
+    self.pieces: tuple = None
 
   def __repr__(self):
     """Returns the string representation."""
@@ -205,6 +268,7 @@ class Bound:
       yield edge
 
   @staticmethod
+  @timed('bound.connect_edge_graph')
   def _connect_edge_graph(edges):
     """Connects the edges as a graph."""
     con = dict()
@@ -218,6 +282,7 @@ class Bound:
     return con
 
   @staticmethod
+  @timed('bound.make_vertex_loop')
   def _make_vertex_loop(vert_graph):
     """Makes a dictionary of bound cycle."""
     vertices = dict()
@@ -229,13 +294,22 @@ class Bound:
       # Upon checking A -> {B, C} and B -> {A, D} etc.
       next_edge = vert_graph[curr_edge][0]
       if last_edge is not None:
-        if next_edge == last_edge: # A -> B -> A situation.
+        # Note: exact, as the graph is; close vertices are still distinct.
+        if next_edge.coordinates == last_edge.coordinates: # A -> B -> A.
           next_edge = vert_graph[curr_edge][1]
       vertices[curr_edge] = next_edge
       last_edge = curr_edge
       curr_edge = next_edge
     return vertices
 
+  @staticmethod
+  def _ordered_loop(loop):
+    """Returns the graph and the vertex cycle of an ordered vertex loop."""
+    after = loop[1:] + loop[:1]
+    before = loop[-1:] + loop[:-1]
+    vert_graph = {v: [a, b] for v, a, b in zip(loop, before, after)}
+    return vert_graph, dict(zip(loop, after))
+
   def get_vertex_loop(self, start_pos=None):
     """Returns a vertex loop that describes the bound."""
     output = []
@@ -275,72 +349,208 @@ class Bound:
     return v.cross_product(u).norm()/2.0
 
   @staticmethod
-  def _tri_contains(p, v1, v2, v3):
+  def _tri_contains(p, v1, v2, v3, tol=None):
     """Determines whether the point lies in the triangle inscribed."""
     total_area = Bound._tri_area(v1, v2, v3)
     t_sum = Bound._tri_area(p, v1, v2) + \
             Bound._tri_area(p, v2, v3) + \
             Bound._tri_area(p, v3, v1)
-    return abs(total_area-t_sum) < (1/math.pow(10, Config.DECIMALS))
+    return abs(total_area-t_sum) < tolerance(tol)
+
+  @staticmethod
+  def _rows(points):
+    """Returns the points as (x, y, z) rows; VectorArray is read by column."""
+    data = getattr(points, 'data', None)
+    if data is not None:
+      return list(zip(data[0::3], data[1::3], data[2::3]))
+    return [tuple(p) for p in points]
+
+  @staticmethod
+  def _newell_normal(verts):
+    """Returns the (unnormalized) normal of a vertex loop."""
+    nx = ny = nz = 0.0
+    for (x1, y1, z1), (x2, y2, z2) in zip(verts, verts[1:] + verts[:1]):
+      nx += (y1-y2) * (z1+z2)
+      ny += (z1-z2) * (x1+x2)
+      nz += (x1-x2) * (y1+y2)
+    return Vector((nx, ny, nz))
+
+  @staticmethod
+  def _in_polygon(s, t, xs, ys, tol, boundary=True):
+    """Determines if (s, t) is inside a 2D polygon (even-odd rule)."""
+    inside = False
+    x1, y1 = xs[-1], ys[-1]
+    for x2, y2 in zip(xs, ys):
+      ex, ey = x2-x1, y2-y1
+      length_sq = ex*ex + ey*ey
+      k = ((s-x1)*ex + (t-y1)*ey) / length_sq if length_sq else 0.0
+      k = min(1.0, max(0.0, k))
+      # Note: tol bounds the distance to the edge, as the plane test does
+      # (not the area test of _tri_contains, which would scale with the
+      # edge's length). Points on the boundary count as inside unless
+      # boundary is False.
+      if length_sq and math.hypot(s-x1-k*ex, t-y1-k*ey) < tol:
+        return boundary
+      if (y1 > t) != (y2 > t) and s < x1 + (t-y1)*ex/ey:
+        inside = not inside
+      x1, y1 = x2, y2
+    return inside
+
+  def get_polygon(self):
+    """Returns the loop projected into its own 2D frame, computed once."""
+    if self.polygon is None:
+      verts = [v.coordinates for v in self.get_vertex_loop()]
+      normal = self._newell_normal(verts)
+      if normal.norm() == 0:
+        normal = Vector((0, 0, 1)) # Note: degenerate, collinear loop.
+      u, v = normal.orthonormal_basis()
+      o = verts[0]
+      rel = [(x-o[0], y-o[1], z-o[2]) for x, y, z in verts]
+      xs = [p[0]*u.x + p[1]*u.y + p[2]*u.z for p in rel]
+      ys = [p[0]*v.x + p[1]*v.y + p[2]*v.z for p in rel]
+      self.polygon = (o, normal.unit().coordinates, u.coordinates,
+                      v.coordinates, xs, ys)
+    return self.polygon
+
+  def project(self, u, v):
+    """Returns the vertex loop as (s, t) tuples in the (u, v) frame."""
+    (ux, uy, uz), (vx, vy, vz) = u, v
+    return [(x*ux + y*uy + z*uz, x*vx + y*vy + z*vz)
+            for x, y, z in self.get_vertex_loop()]
+
+  def get_pieces(self, u, v):
+    """Returns the loop's convex pieces in the (u, v) frame, cached."""
+    frame = (tuple(u), tuple(v))
+    if self.pieces is None or self.pieces[0] != frame:
+      self.pieces = (frame, convex_pieces(self.project(u, v)))
+    return self.pieces[1]
+
+  def contains_many(self, points, boundary=True, tol=None):
+    """Returns a boolean mask of which points (N x 3) rest on the Bound."""
+    o, n, u, v, xs, ys = self.get_polygon()
+    tol = tolerance(tol)
+    min_s, max_s = min(xs)-tol, max(xs)+tol
+    min_t, max_t = min(ys)-tol, max(ys)+tol
+    mask = []
+    for x, y, z in self._rows(points):
+      dx, dy, dz = x-o[0], y-o[1], z-o[2]
+      if abs(dx*n[0] + dy*n[1] + dz*n[2]) >= tol:
+        mask.append(False)
+        continue
+      s = dx*u[0] + dy*u[1] + dz*u[2]
+      t = dx*v[0] + dy*v[1] + dz*v[2]
+      mask.append(min_s <= s <= max_s and min_t <= t <= max_t and
+                  self._in_polygon(s, t, xs, ys, tol, boundary))
+    return mask
 
   def area(self):
     """Returns the total area of the Bound object."""
-    verts = self.get_vertex_loop()
-    total_area = 0
-    for i in range(1, len(verts)-1):
-      total_area += self._tri_area(verts[0], verts[i], verts[i+1])
-    return total_area
+    return loop_area([v.coordinates for v in self.get_vertex_loop()])
 
-  def contains(self, v):
+  def contains(self, v, tol=None):
     """Determines if v rests on the Bound object."""
-    verts = self.get_vertex_loop()
-    pivot = verts[0]
-    for i in range(1, len(verts)-1):
-      if self._tri_contains(v, pivot, verts[i], verts[i+1]):
-        return True
-    return False
+    return self.contains_many((v,), tol=tol)[0]
 
 
 class Face:
-  """Stores a Plane and Bound object."""
-  def __init__(self, plane=None, bound=None):
+  """Stores a Plane, an outer Bound and the inner Bounds (holes)."""
+  def __init__(self, plane=None, bound=None, holes=None):
     """Initializes a Face object."""
     self.plane = plane
     self.bound = bound
+    self.holes: list = holes if holes is not None else []
 
   def __repr__(self):
     """Returns the string representation."""
     output = f'Face(\n  {self.plane}\n'
     for edge in self.bound:
       output += '  ' + str(edge) + '\n'
+    if self.holes:
+      output += f'  ({len(self.holes)} holes)\n'
     output += ')'
     return output
 
+  @staticmethod
+  def _project_loop(bound, u, v):
+    """Returns a Bound's vertex loop as (s, t) tuples in the (u, v) frame."""
+    return bound.project(u, v)
+
   def area(self):
-    """Returns the total area of the Face object."""
-    return self.bound.area()
+    """Returns the total area of the Face object, less its holes."""
+    return self.bound.area() - sum(hole.area() for hole in self.holes)
 
-  def contains(self, v):
+  def contains(self, v, tol=None):
     """Determines if v rests on the Face object."""
-    return self.plane.contains(v) and self.bound.contains(v)
+    return self.contains_many((v,), tol)[0]
+
+  def contains_many(self, points, tol=None):
+    """Returns a boolean mask of which points (N x 3) rest on the Face."""
+    rows = Bound._rows(points)
+    if not self.plane.nonempty():
+      return [False] * len(rows)
+    tol = tolerance(tol)
+    (ax, ay, az), (nx, ny, nz) = self.plane.location, self.plane.normal
+    on_plane = [abs((x-ax)*nx + (y-ay)*ny + (z-az)*nz) < tol
+                for x, y, z in rows]
+    on_bound = self.bound.contains_many(rows, tol=tol)
+    for hole in self.holes:
+      # Note: a hole's own edge is still part of the face.
+      in_hole = hole.contains_many(rows, boundary=False, tol=tol)
+      on_bound = [b and not h for b, h in zip(on_bound, in_hole)]
+    return [p and b for p, b in zip(on_plane, on_bound)]
+
+  def overlap(self, other, tol=None):
+    """Returns the Overlap of the two faces' shadows along the normal."""
+    assert self.plane.is_parallel_to(other.plane, tol)
+    u, v = self.plane.abs_unit_dir().orthonormal_basis()
+    pieces = pieces_overlap(self.bound.get_pieces(u, v),
+                            other.bound.get_pieces(u, v))
+    for hole in self.holes + other.holes:
+      pieces = subtract_pieces(pieces, hole.get_pieces(u, v))
+    return Overlap(pieces, u, v)
+
+  def project(self, u, v):
+    """Returns the outer vertex loop as (s, t) tuples in the (u, v) frame."""
+    return self._project_loop(self.bound, u, v)
+
+  @timed('face.shadow')
+  def shadow(self, other, tol=None):
+    """Determines if shadow overlaps occur."""
+    # Note: faces touching within the tolerance leave slivers along edges.
+    tol = tolerance(tol)
+    overlap = self.overlap(other, tol)
+    return bool(overlap) and not overlap.is_sliver(tol)
 
 
-  def shadow(self, other):
-    """Determines if shadow overlaps occur."""
-    self_verts = self.bound.get_vertex_loop()
-    other_verts = other.bound.get_vertex_loop()
-    normal_vec = self.plane.abs_unit_dir()
-    dist = self.plane.distance_to_plane(other.plane)
-  
-    assert self.plane.is_parallel_to(other.plane)
-    assert normal_vec == other.plane.abs_unit_dir()
-
-    for vert in self_verts + other_verts:
-      projections = [vert+(normal_vec*dist), vert-(normal_vec*dist)]
-      if any(other.contains(proj) for proj in projections):
-        return True
-      if any(self.contains(proj) for proj in projections):
-        return True
-  
-    return False
+class LazyFace(Face):
+  """Stores a Face whose Bounds are only built from its loops when used."""
+  def __init__(self, plane=None, loops=None):
+    """Initializes a LazyFace object."""
+    self.plane = plane
+    # Note: the (outer vertices, [hole vertices]) ordered loops. bound and
+    # holes are not set here: __getattr__ builds and sets them on first
+    # access.
+    self.loops: tuple = loops if loops is not None else ([], [])
+    for loop in [self.loops[0]] + self.loops[1]:
+      self._check_loop(loop)
+
+  def __getattr__(self, name):
+    """Builds the bound or holes on first access, caching the result."""
+    if name == 'bound':
+      value = Bound(loop=self.loops[0])
+    elif name == 'holes':
+      value = [Bound(loop=loop) for loop in self.loops[1]]
+    else:
+      raise AttributeError(name)
+    setattr(self, name, value)
+    return value
 
+  @staticmethod
+  def _check_loop(loop):
+    """Asserts the loop has three or more distinct vertices, as Bound needs."""
+    # Note: so degenerate loops fail at conversion, without building Bounds.
+    assert len({tuple(v) for v in loop}) == len(loop) >= 3
+
+  def is_built(self):
+    """Determines if the outer Bound has been built yet."""
+    return 'bound' in self.__dict__
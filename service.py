@@ -0,0 +1,191 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: the protocol is JSON lines over TCP. A client sends one job per line,
+# {"id": ..., "path": ..., "types": [...], "precision": 3}, and gets one
+# result per line, tagged with the job's id, in the order the jobs finish.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from batch import analyze_file
+from stp_cache import file_digest
+
+
+DEFAULT_PORT = 8765
+DEFAULT_TYPES = ('advanced_face',)
+
+
+class AnalysisService:
+  """Runs analysis jobs in a bounded process pool, sharing duplicate jobs."""
+  def __init__(self, workers=None, max_pending=16, backend='native',
+               cache_dir=None):
+    """Initializes an AnalysisService object."""
+    self.workers = workers
+    self.backend = backend
+    self.cache_dir = cache_dir
+    # Note: processes, since conversion is CPU-bound.
+    self.pool = None
+    # Note: submit() waits while max_pending jobs are unfinished.
+    self.pending = asyncio.Semaphore(max_pending)
+    # (file digest, precision, types) -> future of the running job.
+    self.running: dict = dict()
+    self.stats: dict = {'jobs': 0, 'runs': 0, 'shared': 0, 'failed': 0}
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'AnalysisService({self.workers} workers, {self.stats})'
+
+  async def __aenter__(self):
+    """Starts the process pool."""
+    # Note: spawned, as forking once the loop's threads run can deadlock.
+    self.pool = ProcessPoolExecutor(self.workers,
+                                    multiprocessing.get_context('spawn'))
+    return self
+
+  async def __aexit__(self, *exc):
+    """Shuts the process pool down."""
+    await asyncio.get_running_loop().run_in_executor(None, self.pool.shutdown)
+    self.pool = None
+
+  @staticmethod
+  def _digest(path):
+    """Returns the file's digest, or None when it cannot be read."""
+    try:
+      return file_digest(path)
+    except OSError:
+      return None
+
+  @staticmethod
+  def _check_job(types, precision):
+    """Raises ValueError unless types are strings and precision an int."""
+    if not isinstance(types, (list, tuple)) or \
+       not all(isinstance(t, str) for t in types):
+      raise ValueError(f'Bad job: types must be a list of strings, '
+                       f'not {types!r}.')
+    if not isinstance(precision, int) or isinstance(precision, bool):
+      raise ValueError(f'Bad job: precision must be an int, '
+                       f'not {precision!r}.')
+
+  async def analyze(self, path, types=DEFAULT_TYPES, precision=3) -> dict:
+    """Returns the report of a file, joining an identical running job."""
+    self._check_job(types, precision)
+    loop = asyncio.get_running_loop()
+    digest = await loop.run_in_executor(None, self._digest, path)
+    key = (digest or path, precision, tuple(sorted(types)))
+    self.stats['jobs'] += 1
+    if key in self.running:
+      self.stats['shared'] += 1
+      report = await asyncio.shield(self.running[key])
+    else:
+      future = self.running[key] = loop.create_future()
+      try:
+        self.stats['runs'] += 1
+        report = await loop.run_in_executor(
+          self.pool, partial(analyze_file, path, precision, list(types),
+                             self.backend, self.cache_dir))
+        future.set_result(report)
+      except Exception as e:
+        future.set_exception(e)
+        future.exception() # Note: marks it retrieved when nobody joined.
+        raise
+      finally:
+        del self.running[key]
+    if report['error'] is not None:
+      self.stats['failed'] += 1
+    return dict(report, digest=digest)
+
+  async def submit(self, path, types=DEFAULT_TYPES, precision=3):
+    """Returns a task analyzing the file, once fewer jobs are pending."""
+    await self.pending.acquire()
+    task = asyncio.create_task(self.analyze(path, types, precision))
+    task.add_done_callback(lambda _: self.pending.release())
+    return task
+
+  async def _respond(self, job_id, task, writer, lock):
+    """Writes a job's result (or error) as one JSON line."""
+    try:
+      result = {'id': job_id, 'report': await task}
+    except Exception as e:
+      result = {'id': job_id, 'error': f'{type(e).__name__}: {e}'}
+    async with lock:
+      writer.write((json.dumps(result) + '\n').encode())
+      await writer.drain()
+
+  async def handle(self, reader, writer):
+    """Serves one connection until the client stops sending jobs."""
+    lock = asyncio.Lock()
+    responses = []
+    while line := await reader.readline():
+      job = dict()
+      try:
+        job = json.loads(line)
+        task = await self.submit(job['path'],
+                                 job.get('types', DEFAULT_TYPES),
+                                 job.get('precision', 3))
+      except (ValueError, KeyError, TypeError, AttributeError) as e:
+        task = asyncio.get_running_loop().create_future()
+        task.set_exception(ValueError(f'Bad job: {e!r}'))
+      job_id = job.get('id') if isinstance(job, dict) else None
+      responses.append(asyncio.create_task(
+        self._respond(job_id, task, writer, lock)))
+    await asyncio.gather(*responses)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def serve(service, host='127.0.0.1', port=DEFAULT_PORT):
+  """Returns a started server handing connections to the service."""
+  return await asyncio.start_server(service.handle, host, port)
+
+
+async def request(jobs, host='127.0.0.1', port=DEFAULT_PORT) -> list:
+  """Sends jobs to a service, returning the results as they arrived."""
+  reader, writer = await asyncio.open_connection(host, port)
+  for job in jobs:
+    writer.write((json.dumps(job) + '\n').encode())
+  await writer.drain()
+  writer.write_eof()
+  results = [json.loads(line) async for line in reader]
+  writer.close()
+  await writer.wait_closed()
+  return results
+
+
+async def run(host, port, workers, max_pending, backend, cache_dir):
+  """Runs the service until it is interrupted."""
+  async with AnalysisService(workers, max_pending, backend,
+                             cache_dir) as service:
+    server = await serve(service, host, port)
+    async with server:
+      await server.serve_forever()
+
+
+# ------Execution below.------
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Serves STP analysis jobs.')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+  parser.add_argument('--workers', type=int, default=None)
+  parser.add_argument('--max-pending', type=int, default=16)
+  parser.add_argument('--backend', default='native',
+                      choices=['steptools', 'native'])
+  parser.add_argument('--cache-dir', default=None)
+  args = parser.parse_args()
+
+  try:
+    asyncio.run(run(args.host, args.port, args.workers, args.max_pending,
+                    args.backend, args.cache_dir))
+  except KeyboardInterrupt:
+    pass
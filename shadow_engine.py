@@ -0,0 +1,255 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: everything here works on 2D polygons, lists of (s, t) tuples, in the
+# frame shared by two parallel faces. Face.overlap does the projection.
+
+import math
+
+
+EPS = 1e-12
+
+
+def signed_area(poly) -> float:
+  """Returns the signed area of a polygon (positive if counterclockwise)."""
+  total = 0.0
+  for (x1, y1), (x2, y2) in zip(poly, poly[1:] + poly[:1]):
+    total += x1*y2 - x2*y1
+  return total / 2
+
+
+def bbox(poly) -> tuple:
+  """Returns the (min_s, min_t, max_s, max_t) box of a polygon."""
+  xs, ys = [p[0] for p in poly], [p[1] for p in poly]
+  return min(xs), min(ys), max(xs), max(ys)
+
+
+def boxes_overlap(a, b) -> bool:
+  """Determines if two boxes overlap."""
+  return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _cross(o, a, b):
+  """Returns the z of (a-o) x (b-o)."""
+  return (a[0]-o[0])*(b[1]-o[1]) - (a[1]-o[1])*(b[0]-o[0])
+
+
+def is_convex(poly) -> bool:
+  """Determines if a counterclockwise polygon is convex."""
+  n = len(poly)
+  return all(_cross(poly[i-2], poly[i-1], poly[i]) >= -EPS for i in range(n))
+
+
+def _in_triangle(p, a, b, c):
+  """Determines if p is inside or on a counterclockwise triangle."""
+  return _cross(a, b, p) >= -EPS and _cross(b, c, p) >= -EPS and \
+         _cross(c, a, p) >= -EPS
+
+
+def triangulate(poly) -> list:
+  """Splits a simple counterclockwise polygon into triangles (ear clipping)."""
+  idx = list(range(len(poly)))
+  tris = []
+  while len(idx) > 3:
+    for k in range(len(idx)):
+      a, b, c = poly[idx[k-1]], poly[idx[k]], poly[idx[(k+1) % len(idx)]]
+      turn = _cross(a, b, c)
+      if abs(turn) <= EPS:
+        break # Collinear: dropping b loses no area.
+      if turn < 0:
+        continue # Reflex corner.
+      # Note: only reflex vertices can poke into an ear.
+      if any(_in_triangle(poly[i], a, b, c) for j, i in enumerate(idx)
+             if poly[i] not in (a, b, c) and
+             _cross(poly[idx[j-1]], poly[i],
+                    poly[idx[(j+1) % len(idx)]]) < 0):
+        continue
+      tris.append([a, b, c])
+      break
+    else:
+      return tris # Note: only a self-intersecting loop ends up here.
+    del idx[k]
+  if len(idx) == 3:
+    tris.append([poly[i] for i in idx])
+  return tris
+
+
+def _merge_pair(a, b):
+  """Returns the union of two pieces sharing an edge if convex, else None."""
+  for i in range(len(a)):
+    p, q = a[i-1], a[i]
+    if q not in b:
+      continue
+    j = b.index(q)
+    if b[(j+1) % len(b)] != p:
+      continue
+    # Note: a from q round to p, then b's vertices strictly between p and q.
+    k = (j+1) % len(b)
+    union = a[i:] + a[:i] + (b[k:] + b[:k])[1:-1]
+    return union if is_convex(union) else None
+  return None
+
+
+def merge_convex(pieces) -> list:
+  """Joins pieces across shared edges while they stay convex."""
+  # Note: Hertel-Mehlhorn, so at most four times the fewest pieces.
+  pieces = list(pieces)
+  i = 0
+  while i < len(pieces):
+    j = i + 1
+    while j < len(pieces):
+      union = _merge_pair(pieces[i], pieces[j])
+      if union is None:
+        j += 1
+      else:
+        pieces[i] = union
+        del pieces[j]
+        j = i + 1
+    i += 1
+  return pieces
+
+
+def _clip_half(points, c1, c2) -> list:
+  """Keeps the part of a polygon left of (or on) the line c1 -> c2."""
+  output = []
+  if not points:
+    return output
+  p1 = points[-1]
+  d1 = _cross(c1, c2, p1)
+  for p2 in points:
+    d2 = _cross(c1, c2, p2)
+    if (d1 >= -EPS) != (d2 >= -EPS):
+      k = d1 / (d1 - d2)
+      output.append((p1[0] + k*(p2[0]-p1[0]), p1[1] + k*(p2[1]-p1[1])))
+    if d2 >= -EPS:
+      output.append(p2)
+    p1, d1 = p2, d2
+  return output
+
+
+def clip_convex(subject, clip) -> list:
+  """Clips a polygon by a convex counterclockwise one (Sutherland-Hodgman)."""
+  output = subject
+  for c1, c2 in zip(clip, clip[1:] + clip[:1]):
+    output = _clip_half(output, c1, c2)
+    if not output:
+      break
+  return output if len(output) >= 3 else []
+
+
+def subtract_convex(subject, clip) -> list:
+  """Returns convex pieces of a convex polygon minus a convex one."""
+  # Note: a polygon the clip misses (or only touches) is kept whole, not
+  # cut along the clip's edge lines.
+  common = clip_convex(subject, clip)
+  if not common or signed_area(common) <= EPS:
+    return [subject]
+  pieces, rest = [], subject
+  for c1, c2 in zip(clip, clip[1:] + clip[:1]):
+    # Note: the part outside this edge, but inside the edges before it.
+    outside = _clip_half(rest, c2, c1)
+    if len(outside) >= 3 and signed_area(outside) > EPS:
+      pieces.append(outside)
+    rest = _clip_half(rest, c1, c2)
+    if len(rest) < 3:
+      break
+  return pieces
+
+
+def convex_pieces(poly) -> list:
+  """Returns convex counterclockwise pieces that tile the polygon."""
+  if signed_area(poly) < 0:
+    poly = poly[::-1]
+  if is_convex(poly):
+    return [poly]
+  # Note: clipping and subtracting cost grows with the number of pieces,
+  # and a sampled curve ear-clips into many thin triangles.
+  return merge_convex(triangulate(poly))
+
+
+def subtract_pieces(pieces, hole_pieces) -> list:
+  """Removes one hole's convex pieces from convex pieces."""
+  for hole_piece in hole_pieces:
+    hole_box = bbox(hole_piece)
+    pieces = [rest for piece in pieces
+              for rest in (subtract_convex(piece, hole_piece)
+                           if boxes_overlap(bbox(piece), hole_box)
+                           else [piece])]
+  return pieces
+
+
+def subtract_holes(pieces, holes) -> list:
+  """Removes hole polygons from convex pieces, returning convex pieces."""
+  for hole in holes:
+    if len(hole) >= 3:
+      pieces = subtract_pieces(pieces, convex_pieces(hole))
+  return pieces
+
+
+def pieces_overlap(pieces_a, pieces_b) -> list:
+  """Returns the convex pieces of two sets of convex pieces' intersection."""
+  boxes_b = [(p, bbox(p)) for p in pieces_b]
+  result = []
+  for piece_a in pieces_a:
+    box_a = bbox(piece_a)
+    for piece_b, box_b in boxes_b:
+      if boxes_overlap(box_a, box_b):
+        clipped = clip_convex(piece_a, piece_b)
+        if clipped and signed_area(clipped) > EPS:
+          result.append(clipped)
+  return result
+
+
+def polygon_overlap(poly_a, poly_b, holes=None) -> list:
+  """Returns the convex pieces of two polygons' intersection, less holes."""
+  if len(poly_a) < 3 or len(poly_b) < 3 or \
+     not boxes_overlap(bbox(poly_a), bbox(poly_b)):
+    return []
+  return subtract_holes(pieces_overlap(convex_pieces(poly_a),
+                                       convex_pieces(poly_b)), holes or ())
+
+
+class Overlap:
+  """Stores the overlap of two parallel faces, in their shared 2D frame."""
+  def __init__(self, pieces=None, u=None, v=None):
+    """Initializes an Overlap object."""
+    self.pieces: list = pieces if pieces is not None else []
+    self.u = u
+    self.v = v
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'Overlap({len(self.pieces)} pieces, area={self.area()})'
+
+  def __bool__(self):
+    """Determines if there is any overlap."""
+    return bool(self.pieces)
+
+  def area(self):
+    """Returns the overlapping area."""
+    return sum(signed_area(piece) for piece in self.pieces)
+
+  def extent(self):
+    """Returns the diagonal of the overlap's bounding box."""
+    if not self.pieces:
+      return 0.0
+    boxes = [bbox(piece) for piece in self.pieces]
+    return math.hypot(max(b[2] for b in boxes) - min(b[0] for b in boxes),
+                      max(b[3] for b in boxes) - min(b[1] for b in boxes))
+
+  def is_sliver(self, tol):
+    """Determines if the overlap is thinner than tol on average."""
+    return self.area() <= tol * self.extent()
+
+  def polygons(self, plane):
+    """Returns the overlap pieces as Vector loops lying on the plane."""
+    n = self.u.cross_product(self.v)
+    offset = n * plane.location.dot_product(n)
+    return [[self.u*s + self.v*t + offset for s, t in piece]
+            for piece in self.pieces]
@@ -0,0 +1,121 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+import math
+from regular_obj import tolerance
+
+
+# NOTE! Boxes covering more cells than this are kept in one "large" list.
+MAX_CELLS = 64
+
+
+class FaceIndex:
+  """Stores, per direction, a uniform grid over the faces' 2D boxes."""
+  def __init__(self, parallel=None, tol=None):
+    """Initializes a FaceIndex object."""
+    self.parallel: dict = parallel if parallel is not None else dict()
+    # Note: pads the boxes, and is passed on to every shadow test.
+    self.tol = tolerance(tol)
+    # Direction -> [(min_s, min_t, max_s, max_t)], in bucket order.
+    self.boxes: dict = dict()
+    # Direction -> (cell size, {(i, j): [bucket positions]}); key None holds
+    # the large boxes, which are candidates for every face.
+    self.grids: dict = dict()
+    # id(face) -> (direction, bucket position).
+    self.locations: dict = dict()
+    for direction, faces in self.parallel.items():
+      u, v = direction.orthonormal_basis()
+      self.boxes[direction] = [self._bbox(f, u, v, self.tol) for f in faces]
+      self.grids[direction] = self._make_grid(self.boxes[direction], self.tol)
+      for pos, face in enumerate(faces):
+        self.locations[id(face)] = (direction, pos)
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'FaceIndex({len(self.locations)} faces, {len(self.grids)} dirs)'
+
+  @staticmethod
+  def _bbox(face, u, v, tol):
+    """Returns the face's bounding box in the (u, v) frame of its bucket."""
+    ss, ts = [], []
+    for x, y, z in face.bound.get_vertex_loop():
+      ss.append(x*u.x + y*u.y + z*u.z)
+      ts.append(x*v.x + y*v.y + z*v.z)
+    return (min(ss)-tol, min(ts)-tol, max(ss)+tol, max(ts)+tol)
+
+  @staticmethod
+  def _cells(box, cell):
+    """Returns the grid cells a box covers ([None] if too many)."""
+    i0, j0 = math.floor(box[0]/cell), math.floor(box[1]/cell)
+    i1, j1 = math.floor(box[2]/cell), math.floor(box[3]/cell)
+    if (i1-i0+1) * (j1-j0+1) > MAX_CELLS:
+      return [None]
+    return [(i, j) for i in range(i0, i1+1) for j in range(j0, j1+1)]
+
+  @staticmethod
+  def _make_grid(boxes, tol):
+    """Buckets the boxes into square cells about the mean box size."""
+    if not boxes:
+      return 1.0, dict()
+    extent = sum(max(b[2]-b[0], b[3]-b[1]) for b in boxes) / len(boxes)
+    cell = max(extent, tol)
+    grid = dict()
+    for pos, box in enumerate(boxes):
+      for key in FaceIndex._cells(box, cell):
+        grid.setdefault(key, []).append(pos)
+    return cell, grid
+
+  @staticmethod
+  def _overlap(a, b):
+    """Determines if two boxes overlap."""
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+  def candidate_indices(self, direction):
+    """Returns the (i, j) bucket positions, i < j, whose boxes overlap."""
+    faces, boxes = self.parallel[direction], self.boxes[direction]
+    grid = self.grids[direction][1]
+    pairs = set()
+    for key, members in grid.items():
+      if key is not None:
+        for k, i in enumerate(members):
+          pairs.update((i, j) if i < j else (j, i) for j in members[k+1:])
+    for i in grid.get(None, ()):
+      pairs.update((i, j) if i < j else (j, i)
+                   for j in range(len(faces)) if j != i)
+    return [(i, j) for i, j in sorted(pairs)
+            if self._overlap(boxes[i], boxes[j])]
+
+  def candidate_pairs(self, direction):
+    """Returns the face pairs of a direction whose boxes overlap."""
+    faces = self.parallel[direction]
+    return [(faces[i], faces[j]) for i, j in self.candidate_indices(direction)]
+
+  def overlapping_pairs(self, direction):
+    """Returns the face pairs of a direction that shadow each other."""
+    return [(a, b) for a, b in self.candidate_pairs(direction)
+            if a.shadow(b, self.tol)]
+
+  def faces_shadowing(self, face):
+    """Returns the faces (of the same direction) that shadow the face."""
+    direction, pos = self.locations[id(face)]
+    faces, boxes = self.parallel[direction], self.boxes[direction]
+    cell, grid = self.grids[direction]
+    keys = self._cells(boxes[pos], cell)
+    if keys == [None]:
+      keys = list(grid) # Note: a large box may meet any face.
+    else:
+      keys.append(None)
+    found = set()
+    for key in keys:
+      for i in grid.get(key, ()):
+        if i != pos and i not in found and \
+           self._overlap(boxes[pos], boxes[i]):
+          found.add(i)
+    return [faces[i] for i in sorted(found)
+            if face.shadow(faces[i], self.tol)]
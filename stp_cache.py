@@ -0,0 +1,76 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+
+
+# NOTE! Entries are pickles, and unpickling runs code: only point the cache
+# at a directory that no one untrusted can write to.
+
+# NOTE! Bump whenever the pickled objects change shape.
+CACHE_VERSION = 11
+
+
+def file_digest(file_path, chunk_size=1 << 20) -> str:
+  """Returns the SHA-256 hex digest of a file's content."""
+  digest = hashlib.sha256()
+  with open(file_path, 'rb') as f:
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+def cache_key(digest, types, backend) -> str:
+  """Returns the cache key of a content digest, types and backend."""
+  # Note: geometry is stored unrounded, so one entry serves every precision;
+  # backends differ in what they read (and topology keys), so they do not.
+  spec = f'{CACHE_VERSION}|{backend}|{digest}|{",".join(sorted(types))}'
+  return hashlib.sha256(spec.encode()).hexdigest()
+
+
+class GeometryCache:
+  """Stores converted geometry on disk, one compressed file per key."""
+  def __init__(self, cache_dir=None):
+    """Initializes a GeometryCache object."""
+    self.cache_dir = cache_dir
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'GeometryCache({self.cache_dir})'
+
+  @staticmethod
+  def _path(cache_dir, key):
+    """Returns the file path of a key."""
+    return os.path.join(cache_dir, f'{key}.bin')
+
+  def load(self, key):
+    """Returns the entry stored under key, or None if there is none."""
+    try:
+      with open(self._path(self.cache_dir, key), 'rb') as f:
+        return pickle.loads(zlib.decompress(f.read()))
+    except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+      return None
+
+  def store(self, key, entry):
+    """Stores an entry under key, replacing the file atomically."""
+    os.makedirs(self.cache_dir, exist_ok=True)
+    data = zlib.compress(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+    fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+      os.replace(tmp_path, self._path(self.cache_dir, key))
+    except OSError:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+      raise
@@ -0,0 +1,404 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: this module mimics the small part of the `steptools.step` interface
+# that stp_reader uses (open_project, DesignCursor, type), so STPFile can
+# swap between the two backends without touching the conversion code.
+
+import mmap
+import os
+import re
+import weakref
+from array import array
+from bisect import bisect_left
+
+
+# Statement scanner: strings and comments may hold ';', so they are matched
+# whole. An unterminated string/comment only matches up to the buffer end.
+_STATEMENT = re.compile(rb"'(?:[^']|'')*'?|/\*(?:.*?\*/|.*)|;", re.S)
+_INSTANCE = re.compile(rb'\s*#(\d+)\s*=\s*')
+_KEYWORD = re.compile(rb'\s*([A-Za-z_][A-Za-z0-9_]*)')
+_TOKEN = re.compile(r"""\s*(?:
+  (?P<str>'(?:[^']|'')*')|
+  (?P<ref>\#\d+)|
+  (?P<enum>\.[A-Za-z0-9_]+\.)|
+  (?P<real>[+-]?\d+\.\d*(?:[Ee][+-]?\d+)?)|
+  (?P<int>[+-]?\d+)|
+  (?P<kw>[A-Za-z_][A-Za-z0-9_]*)|
+  (?P<bin>"[0-9A-Fa-f]*")|
+  (?P<sym>[()$*]))""", re.X)
+_COMMENT = re.compile(r"'(?:[^']|'')*'|(/\*.*?\*/)", re.S)
+_X2 = re.compile(r'\\X2\\([0-9A-Fa-f]*)\\X0\\')
+
+# Entity name -> (supertype, own explicit attributes), in EXPRESS order.
+SCHEMA = {
+  'representation_item': (None, ('name',)),
+  'geometric_representation_item': ('representation_item', ()),
+  'topological_representation_item': ('representation_item', ()),
+  'point': ('geometric_representation_item', ()),
+  'cartesian_point': ('point', ('coordinates',)),
+  'direction': ('geometric_representation_item', ('direction_ratios',)),
+  'vector': ('geometric_representation_item', ('orientation', 'magnitude')),
+  'placement': ('geometric_representation_item', ('location',)),
+  'axis1_placement': ('placement', ('axis',)),
+  'axis2_placement_2d': ('placement', ('ref_direction',)),
+  'axis2_placement_3d': ('placement', ('axis', 'ref_direction')),
+  'curve': ('geometric_representation_item', ()),
+  'line': ('curve', ('pnt', 'dir')),
+  'conic': ('curve', ('position',)),
+  'circle': ('conic', ('radius',)),
+  'ellipse': ('conic', ('semi_axis_1', 'semi_axis_2')),
+  'bounded_curve': ('curve', ()),
+  'b_spline_curve': ('bounded_curve', ('degree', 'control_points_list',
+                                       'curve_form', 'closed_curve',
+                                       'self_intersect')),
+  'b_spline_curve_with_knots': ('b_spline_curve', ('knot_multiplicities',
+                                                   'knots', 'knot_spec')),
+  'rational_b_spline_curve': ('b_spline_curve', ('weights_data',)),
+  'surface': ('geometric_representation_item', ()),
+  'elementary_surface': ('surface', ('position',)),
+  'plane': ('elementary_surface', ()),
+  'cylindrical_surface': ('elementary_surface', ('radius',)),
+  'conical_surface': ('elementary_surface', ('radius', 'semi_angle')),
+  'spherical_surface': ('elementary_surface', ('radius',)),
+  'toroidal_surface': ('elementary_surface', ('major_radius',
+                                              'minor_radius')),
+  'swept_surface': ('surface', ('swept_curve',)),
+  'surface_of_linear_extrusion': ('swept_surface', ('extrusion_axis',)),
+  'surface_of_revolution': ('swept_surface', ('axis_position',)),
+  'bounded_surface': ('surface', ()),
+  'b_spline_surface': ('bounded_surface', ('u_degree', 'v_degree',
+                                           'control_points_list',
+                                           'surface_form', 'u_closed',
+                                           'v_closed', 'self_intersect')),
+  'b_spline_surface_with_knots': ('b_spline_surface', ('u_multiplicities',
+                                                       'v_multiplicities',
+                                                       'u_knots', 'v_knots',
+                                                       'knot_spec')),
+  'rational_b_spline_surface': ('b_spline_surface', ('weights_data',)),
+  'vertex': ('topological_representation_item', ()),
+  'vertex_point': ('vertex', ('vertex_geometry',)),
+  'edge': ('topological_representation_item', ('edge_start', 'edge_end')),
+  'edge_curve': ('edge', ('edge_geometry', 'same_sense')),
+  'oriented_edge': ('edge', ('edge_element', 'orientation')),
+  'loop': ('topological_representation_item', ()),
+  'edge_loop': ('loop', ('edge_list',)),
+  'vertex_loop': ('loop', ('loop_vertex',)),
+  'face_bound': ('topological_representation_item', ('bound',
+                                                     'orientation')),
+  'face_outer_bound': ('face_bound', ()),
+  'face': ('topological_representation_item', ('bounds',)),
+  'face_surface': ('face', ('face_geometry', 'same_sense')),
+  'advanced_face': ('face_surface', ()),
+  'connected_face_set': ('topological_representation_item', ('cfs_faces',)),
+  'open_shell': ('connected_face_set', ()),
+  'closed_shell': ('connected_face_set', ()),
+  'solid_model': ('geometric_representation_item', ()),
+  'manifold_solid_brep': ('solid_model', ('outer',)),
+}
+
+# Supertypes that a complex instance names but which never label it.
+ABSTRACT = {'representation_item', 'geometric_representation_item',
+            'topological_representation_item', 'curve', 'bounded_curve',
+            'b_spline_curve', 'surface', 'bounded_surface',
+            'b_spline_surface', 'named_unit', 'representation_context'}
+
+
+class Reference(int):
+  """Stores an unresolved "#id" instance reference."""
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'#{int(self)}'
+
+
+class Entity:
+  """Stores one DATA section instance, decoded on first attribute use."""
+  def __init__(self, design=None, eid=None, etype=None):
+    """Initializes an Entity object."""
+    self._design = design
+    self._id = eid
+    self._type = etype
+    self._params = None
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'Entity(#{self._id}, {self._type})'
+
+  def __getattr__(self, name):
+    """Resolves a schema attribute by name, caching the result."""
+    if name.startswith('_'):
+      raise AttributeError(name)
+    if self._params is None:
+      self._params = self._design.params(self._id)
+    if name in DERIVED.get(self._type, {}):
+      value = DERIVED[self._type][name](self)
+    else:
+      value = self._design.resolve(self._lookup(self._type, self._params,
+                                                name))
+    setattr(self, name, value)
+    return value
+
+  @staticmethod
+  def _lookup(etype, params, name):
+    """Returns the raw parameter stored under the attribute name."""
+    if isinstance(params, dict):
+      for partial, values in params.items():
+        attrs = SCHEMA.get(partial, (None, ()))[1]
+        if name in attrs:
+          return values[attrs.index(name)]
+    else:
+      attrs = attribute_names(etype)
+      if name in attrs:
+        return params[attrs.index(name)]
+    raise AttributeError(f'{etype} has no attribute "{name}"')
+
+
+def _oriented(attr, flipped):
+  """Returns a getter for an oriented_edge's derived start/end vertex."""
+  def getter(entity):
+    edge = entity.edge_element
+    return getattr(edge, attr if entity.orientation else flipped)
+  return getter
+
+
+# Derived ("*") attributes that _convert relies on.
+DERIVED = {
+  'oriented_edge': {'edge_start': _oriented('edge_start', 'edge_end'),
+                    'edge_end': _oriented('edge_end', 'edge_start')},
+}
+
+
+class Design:
+  """Stores a memory-mapped Part 21 file and an offset index of its DATA."""
+  def __init__(self, file_path=None):
+    """Initializes a Design object."""
+    self.file_path = file_path
+    self.buffer = self._map(file_path) if file_path else b''
+    # Record i (in file order) is #ids[i], its body is buffer[starts[i]:ends[i]].
+    self.ids, self.starts, self.ends, self.codes, self.type_names = \
+      self._scan(self.buffer)
+    self.sorted_ids, self.sorted_pos = self._sort_ids(self.ids)
+    self.by_type: dict = self._group_types(self.codes, self.type_names)
+    self.entities = weakref.WeakValueDictionary()
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'Design({self.file_path})'
+
+  def __len__(self):
+    """Returns the number of instances."""
+    return len(self.ids)
+
+  def __iter__(self):
+    """Iterates the instances in file order."""
+    for i in range(len(self.ids)):
+      yield self.entity(self.ids[i])
+
+  @staticmethod
+  def _map(file_path):
+    """Memory-maps the file read-only."""
+    with open(file_path, 'rb') as f:
+      if os.fstat(f.fileno()).st_size == 0:
+        return b''
+      return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+  @staticmethod
+  def _scan(buffer):
+    """Indexes the DATA section records in one pass over the buffer."""
+    ids, starts, ends, codes = array('q'), array('q'), array('q'), array('l')
+    type_names, type_codes = [], dict()
+    in_data = False
+    start = 0
+    for m in _STATEMENT.finditer(buffer):
+      tok = m.group()
+      if tok.startswith(b'/*'):
+        if not buffer[start:m.start()].strip():
+          start = m.end() # Skips comments between statements.
+        continue
+      elif tok != b';':
+        continue
+      stmt_start, start = start, m.end()
+      if not in_data:
+        in_data = buffer[stmt_start:m.start()].strip() == b'DATA'
+        continue
+      head = _INSTANCE.match(buffer, stmt_start, m.start())
+      if head is None:
+        in_data = buffer[stmt_start:m.start()].strip() != b'ENDSEC'
+        continue
+      body_start = head.end()
+      kw = _KEYWORD.match(buffer, body_start, m.start())
+      if kw is not None:
+        name = kw.group(1).decode().lower()
+      else:
+        name = record_type(buffer[body_start:m.start()])
+      if name not in type_codes:
+        type_codes[name] = len(type_names)
+        type_names.append(name)
+      ids.append(int(head.group(1)))
+      starts.append(body_start)
+      ends.append(m.start())
+      codes.append(type_codes[name])
+    return ids, starts, ends, codes, type_names
+
+  @staticmethod
+  def _sort_ids(ids):
+    """Returns the ids sorted, and their record positions, for bisection."""
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    return array('q', (ids[i] for i in order)), array('q', order)
+
+  @staticmethod
+  def _group_types(codes, type_names):
+    """Returns the record positions of each type, in file order."""
+    by_type = {name: array('q') for name in type_names}
+    for i, code in enumerate(codes):
+      by_type[type_names[code]].append(i)
+    return by_type
+
+  def position(self, eid):
+    """Returns the record position of an instance id."""
+    pos = bisect_left(self.sorted_ids, eid)
+    if pos == len(self.sorted_ids) or self.sorted_ids[pos] != eid:
+      raise KeyError(f'#{eid}')
+    return self.sorted_pos[pos]
+
+  def entity(self, eid):
+    """Returns the (shared) Entity of the instance id."""
+    ent = self.entities.get(eid)
+    if ent is None:
+      pos = self.position(eid)
+      ent = Entity(self, eid, self.type_names[self.codes[pos]])
+      self.entities[eid] = ent
+    return ent
+
+  def entities_of(self, types):
+    """Iterates the instances of the given types only, in file order."""
+    positions = [self.by_type.get(t, ()) for t in types]
+    for i in sorted(p for group in positions for p in group):
+      yield self.entity(self.ids[i])
+
+  def params(self, eid):
+    """Parses the parameters of an instance."""
+    pos = self.position(eid)
+    body = memoryview(self.buffer)[self.starts[pos]:self.ends[pos]]
+    return parse_record(body)
+
+  def resolve(self, value):
+    """Turns references (also nested in lists) into Entity objects."""
+    if isinstance(value, Reference):
+      return self.entity(value)
+    elif isinstance(value, list):
+      return [self.resolve(v) for v in value]
+    elif isinstance(value, tuple):
+      return self.resolve(value[1][0]) if len(value[1]) == 1 else \
+             self.resolve(value[1])
+    return value
+
+  def close(self):
+    """Releases the memory map."""
+    if isinstance(self.buffer, mmap.mmap):
+      self.buffer.close()
+
+
+class DesignCursor:
+  """Iterates the instances of a Design, optionally of some types only."""
+  def __init__(self, design=None, types=None):
+    """Initializes a DesignCursor object."""
+    self.design = design
+    self.types = types
+
+  def __iter__(self):
+    """Iterates the instances in file order."""
+    if self.types is None:
+      return iter(self.design)
+    return self.design.entities_of(self.types)
+
+
+def _decode_string(text):
+  """Decodes a Part 21 string literal body."""
+  text = text.replace("''", "'")
+  if '\\' in text:
+    text = _X2.sub(lambda m: bytes.fromhex(m.group(1)).decode('utf-16-be'),
+                   text).replace('\\\\', '\\')
+  return text
+
+
+def parse_record(body):
+  """Parses a record body into nested lists (complex ones into a dict)."""
+  text = str(body, 'latin-1')
+  if '/*' in text:
+    text = _COMMENT.sub(lambda m: m.group() if m.group(1) is None else ' ',
+                        text)
+  stack, names = [[]], [None]
+  pending = None
+  for m in _TOKEN.finditer(text):
+    kind = m.lastgroup
+    tok = m.group(kind)
+    if kind == 'sym':
+      if tok == '(':
+        stack.append([])
+        names.append(pending)
+        pending = None
+      elif tok == ')':
+        items, name = stack.pop(), names.pop()
+        stack[-1].append(items if name is None else (name.lower(), items))
+      else:
+        stack[-1].append(None)
+    elif kind == 'kw':
+      pending = tok
+    elif kind == 'ref':
+      stack[-1].append(Reference(tok[1:]))
+    elif kind == 'real':
+      stack[-1].append(float(tok))
+    elif kind == 'int':
+      stack[-1].append(int(tok))
+    elif kind == 'str':
+      stack[-1].append(_decode_string(tok[1:-1]))
+    elif kind == 'enum':
+      tok = tok[1:-1].lower()
+      stack[-1].append({'t': True, 'f': False, 'u': None}.get(tok, tok))
+    else:
+      stack[-1].append(tok[1:-1])
+  top = stack[0][0]
+  if isinstance(top, tuple):
+    return top[1]
+  return {name: items for name, items in top}
+
+
+def record_type(body):
+  """Returns the lowercase type name of a record body."""
+  m = _KEYWORD.match(bytes(body))
+  if m is not None:
+    return m.group(1).decode().lower()
+  partials = parse_record(body)
+  leaves = [name for name in partials if name not in ABSTRACT]
+  return '_and_'.join(leaves or partials)
+
+
+def attribute_names(etype):
+  """Returns all explicit attribute names of a type, inherited first."""
+  names = ()
+  while etype is not None and etype in SCHEMA:
+    etype, own = SCHEMA[etype]
+    names = own + names
+  return names
+
+
+def open_project(file_path):
+  """Opens a Part 21 file."""
+  return Design(file_path)
+
+
+def entity_id(obj):
+  """Returns the instance id of an Entity."""
+  return obj._id
+
+
+def type(obj):
+  """Returns the type name of an Entity."""
+  return obj._type
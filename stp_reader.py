@@ -10,19 +10,45 @@
 # TODO: Finish up the utilization of "shadow", according to program features in the user manual.
 # TODO: Examine why this simple counter thing has a problem.
 
-from steptools import step
-from regular_obj import Config, Face, Bound, Plane, Edge, Vector
-from nonregular_obj import ToroidalFace
-
-
-def approx(tup) -> tuple:
-  """Returns approximated values for tuples."""
-  return tuple(round(e, Config.DECIMALS) for e in tup)
+from bisect import bisect_left, bisect_right
+from heapq import merge
+try:
+  from steptools import step
+except ImportError: # NOTE: the native backend works without a license.
+  step = None
+import stp_parser
+from stp_cache import GeometryCache, cache_key, file_digest
+from regular_obj import Config, Face, LazyFace, Plane, Vector, loop_area
+from nonregular_obj import Circle, CylindricalFace, ConicalFace, ToroidalFace
+from array_obj import FaceSoA
+from freeform_obj import BSplineCurve, BSplineSurface, BSplineFace, \
+                         expand_knots
+from spatial_index import FaceIndex
+from pairwise import distance_matrix, shadow_matrices
+from coplanar import merge_coplanar
+from face_store import export_faces
+from direction_index import DirectionIndex
+from instrument import timed
+from topology import Topology
+
+
+def approx(tup, decimals=None) -> tuple:
+  """Returns approximated values for tuples (for keys, not geometry)."""
+  decimals = Config.DECIMALS if decimals is None else decimals
+  return tuple(round(e, decimals) for e in tup)
+
+
+def approx_vec(vec, decimals=None) -> tuple:
+  """Returns approximated values for Vectors."""
+  return Vector(approx(vec.coordinates, decimals))
 
 
-def approx_vec(vec) -> tuple:
-  """Returns approximated values for Vectors."""
-  return Vector(approx(vec.coordinates))
+def convert_key(design, obj) -> str:
+  """Returns the instrumentation name of a conversion: its entity type."""
+  k = design.step.type(obj)
+  if k == 'advanced_face':
+    return f'{k}.{design.step.type(obj.face_geometry)}'
+  return k
 
 
 def withdividers(func):
@@ -48,82 +74,183 @@ def display_all_objects(objects):
 
 class STPFile:
   """Stores an STP file."""
-  def __init__(self, file_path=None):
+  def __init__(self, file_path=None, backend='native', cache_dir=None):
     """Initializes an STPFile object."""
-    if file_path is not None:
-      self.stp_file = step.open_project(file_path)
+    self.file_path = file_path
+    self.backend = backend
+    self.step = self._init_backend(backend)
+    # Note: the file is opened on first use, so cache hits never parse it.
+    self.stp_file = None
+    self.cache = GeometryCache(cache_dir) if cache_dir is not None else None
     self.unreadable = []
+    self.unreadable_count = 0
     self.unreadable_types = set()
     self.face_types = dict()
+    # Note: entity id -> converted object, shared across faces. Conversion
+    # keeps full precision, so one memo serves every tolerance.
+    self.memo: dict = dict()
+    # Note: filled in by get_3D_objects when it reads advanced_faces.
+    self.topology = Topology()
 
   def __repr__(self):
     """Returns the string representation."""
-    return f'STPFile({file_path})'
+    return f'STPFile({self.file_path})'
+
+  @staticmethod
+  def _init_backend(backend):
+    """Returns the module reading the file: "steptools" or "native"."""
+    if backend == 'native':
+      return stp_parser
+    elif backend == 'steptools':
+      if step is None:
+        raise ImportError('steptools is not installed, use backend="native".')
+      return step
+    raise ValueError(f'Unknown backend "{backend}".')
+
+  def _open(self):
+    """Opens the file with the backend, unless it is open already."""
+    if self.stp_file is None:
+      self.stp_file = self.step.open_project(self.file_path)
+    return self.stp_file
+
+  def _cursor(self, keys):
+    """Returns a cursor over the file, narrowed to keys when supported."""
+    self._open()
+    if self.step is stp_parser:
+      # Note: the native index jumps straight to the requested types.
+      return stp_parser.DesignCursor(self.stp_file, keys)
+    return self.step.DesignCursor(self.stp_file)
 
   def _count_face_type(self, face_obj):
     """Counts the face type."""
-    if step.type(face_obj) == 'advanced_face':
-      k = step.type(face_obj.face_geometry)
+    if self.step.type(face_obj) == 'advanced_face':
+      k = self.step.type(face_obj.face_geometry)
       if k in self.face_types:
         self.face_types[k] += 1
       else:
         self.face_types[k] = 1
 
+  @timed('convert', key=convert_key)
   def _convert(self, obj):
     """Converts an stp object to a self defined one."""
-    def pt_tup(cartesian_point_obj) -> tuple:
-      return approx(tuple(cartesian_point_obj.coordinates))
-    
-    def vec_tup(direction_obj) -> tuple:
-      return approx(tuple(direction_obj.direction_ratios))
-  
+    def pt_vec(cartesian_point_obj) -> Vector:
+      return self._memo(cartesian_point_obj, lambda p:
+                        Vector(tuple(p.coordinates)))
+
+    def vec_tup(direction_obj, default=None) -> tuple:
+      if direction_obj is None:
+        return default # Note: an unset ($) optional direction.
+      return self._memo(direction_obj, lambda d:
+                        tuple(d.direction_ratios))
+
     def get_pos_attr(pos) -> tuple:
-      loc, ax, ref_d = pos.location, pos.axis, pos.ref_direction
-      return (pt_tup(loc), vec_tup(ax), vec_tup(ref_d))
+      return self._memo(pos, lambda p: (pt_vec(p.location),
+                                        vec_tup(p.axis, (0.0, 0.0, 1.0)),
+                                        vec_tup(p.ref_direction)))
 
     def get_plane_attr(face_obj) -> tuple:
       pos = face_obj.face_geometry.position
       return get_pos_attr(pos)
 
-    def get_face_edges(face_obj) -> list:
-      e_list = face_obj.bounds[0].bound.edge_list
-      edges = []
-      for edge in e_list:
-        v_s = edge.edge_element.edge_start.vertex_geometry
-        v_e = edge.edge_element.edge_end.vertex_geometry
-        edges.append(Edge(pt_tup(v_s), pt_tup(v_e)))
-      return edges
-
-    def get_tor_edges(face_obj):
-      e = face_obj.bounds[0].bound.edge_list[0].edge_element
-
-      v_s = e.edge_start.vertex_geometry
-      v_e = e.edge_end.vertex_geometry
-      eg = e.edge_geometry
-
-      plane = Plane(*get_pos_attr(eg.position))
-      edge = Edge(pt_tup(v_s), pt_tup(v_e))
-      return edge, plane
-      
+    def get_circle(circle_obj) -> Circle:
+      return self._memo(circle_obj, lambda c:
+                        Circle(c.radius, Plane(*get_pos_attr(c.position))))
+
+    def get_curve(curve_obj) -> BSplineCurve:
+      def make(c):
+        rational = 'rational_b_spline_curve' in self.step.type(c)
+        return BSplineCurve(c.degree,
+                            [pt_vec(p).coordinates
+                             for p in c.control_points_list],
+                            expand_knots(c.knots, c.knot_multiplicities),
+                            c.weights_data if rational else None)
+      return self._memo(curve_obj, make)
+
+    def get_edge_points(e) -> list:
+      # Note: from edge_start to edge_end; curves are sampled, then cut at
+      # the samples nearest to the vertices (the whole curve if closed).
+      start = pt_vec(e.edge_start.vertex_geometry)
+      end = pt_vec(e.edge_end.vertex_geometry)
+      curve = self.step.type(e.edge_geometry)
+      if curve == 'circle':
+        circle = get_circle(e.edge_geometry)
+        return circle.arc_points(start, end, e.same_sense)
+      if 'b_spline_curve_with_knots' not in curve:
+        return [start, end]
+      samples = [Vector(p) for p in get_curve(e.edge_geometry).sample()]
+      if not e.same_sense:
+        samples.reverse()
+      first = min(range(len(samples)), key=lambda k: (samples[k]-start).norm())
+      last = min(range(len(samples)), key=lambda k: (samples[k]-end).norm())
+      if start.coordinates == end.coordinates or last <= first:
+        first, last = 0, len(samples) - 1
+      return [start] + samples[first+1:last] + [end]
+
+    def get_boundary_loops(face_obj) -> list:
+      # Note: each loop is turned to keep the face on its left, seen along
+      # the surface's normal (a face_bound or face may be reversed).
+      loops = []
+      for b in face_obj.bounds:
+        loop = b.bound
+        if self.step.type(loop) == 'vertex_loop':
+          loops.append([pt_vec(loop.loop_vertex.vertex_geometry)])
+          continue
+        points = []
+        for edge in loop.edge_list:
+          edge_points = get_edge_points(edge.edge_element)
+          if not edge.orientation:
+            edge_points.reverse()
+          points.extend(edge_points[:-1])
+        if b.orientation != face_obj.same_sense:
+          points.reverse()
+        loops.append(points)
+      return loops
+
+    def get_bspline(surface_obj) -> BSplineSurface:
+      def make(s):
+        points = [[pt_vec(p).coordinates for p in row]
+                  for row in s.control_points_list]
+        rational = 'rational_b_spline_surface' in self.step.type(s)
+        return BSplineSurface(s.u_degree, s.v_degree, points,
+                              expand_knots(s.u_knots, s.u_multiplicities),
+                              expand_knots(s.v_knots, s.v_multiplicities),
+                              s.weights_data if rational else None)
+      return self._memo(surface_obj, make)
+
     def create_face(obj):
-      fg = step.type(obj.face_geometry)
+      surface = obj.face_geometry
+      fg = self.step.type(surface)
       if fg == 'plane':
-        bound = Bound(get_face_edges(obj))
+        # Note: the outer loop encloses the holes, so it is the largest one
+        # (files may give every loop as a plain face_bound).
+        loops = sorted(get_boundary_loops(obj), reverse=True,
+                       key=lambda loop: loop_area([tuple(v) for v in loop]))
         plane = Plane(*get_plane_attr(obj))
-        return Face(plane, bound)
+        return LazyFace(plane, (loops[0], loops[1:]))
+      elif fg == 'cylindrical_surface':
+        plane = Plane(*get_pos_attr(surface.position))
+        return CylindricalFace(plane, surface.radius, None,
+                               get_boundary_loops(obj))
+      elif fg == 'conical_surface':
+        plane = Plane(*get_pos_attr(surface.position))
+        return ConicalFace(plane, surface.radius, surface.semi_angle, None,
+                           get_boundary_loops(obj))
       elif fg == 'toroidal_surface':
-        edge, plane = get_tor_edges(obj)
-        maj_r, min_r = fg.major_radius, fg.minor_radius
-        return ToroidalFace(plane, edge, maj_r, min_r)
+        plane = Plane(*get_pos_attr(surface.position))
+        return ToroidalFace(plane, surface.major_radius,
+                            surface.minor_radius, None,
+                            get_boundary_loops(obj))
+      elif 'b_spline_surface_with_knots' in fg:
+        points = [p for loop in get_boundary_loops(obj) for p in loop]
+        return BSplineFace(get_bspline(surface), points)
       else:
         raise Exception('Cannot be created.')
     
-    if step.type(obj) == 'advanced_face':
+    if self.step.type(obj) == 'advanced_face':
       return create_face(obj)
 
-    if step.type(obj) == 'vertex_point':
-      pt_geometry = obj.vertex_geometry
-      return Vector(pt_tup(pt_geometry))
+    if self.step.type(obj) == 'vertex_point':
+      return pt_vec(obj.vertex_geometry)
   
     return None
 
@@ -135,35 +262,134 @@ class STPFile:
 
   def print_errors(self):
     """Prints all objects that had error being read."""
-    if len(self.unreadable):
-      print(f'- Out of all faces, {len(self.unreadable)} are '+
+    if self.unreadable_count:
+      print(f'- Out of all faces, {self.unreadable_count} are '+
           f'unreadable, with formats {self.unreadable_types}.') 
     else:
       print('All faces are readable.')
 
-  def get_3D_objects(self, types=None):
-    """Returns the 3D objects in the file."""
-    keys = set(types)
-    objects = {key: [] for key in keys}
+  def _entity_ref(self, obj):
+    """Returns a picklable reference to an entity (its id, if known)."""
+    if self.step is stp_parser:
+      return stp_parser.entity_id(obj)
+    return None
 
-    for obj in step.DesignCursor(self.stp_file):
-      if step.type(obj) in keys and len(keys):
+  def _topology_key(self, obj, fallback):
+    """Returns an entity's id, or fallback() when ids are unknown."""
+    ref = self._entity_ref(obj)
+    return ref if ref is not None else fallback()
+
+  def _add_topology(self, face_obj, face):
+    """Adds an advanced_face's loops (readable or not) to the topology."""
+    def vertex_key(vertex_obj):
+      return self._topology_key(vertex_obj, lambda:
+                                approx(tuple(vertex_obj.vertex_geometry.
+                                             coordinates)))
+
+    loops = []
+    for bound in face_obj.bounds:
+      edges = []
+      # Note: vertex_loops (single-point bounds) have no edges.
+      for oriented in getattr(bound.bound, 'edge_list', ()):
+        e = oriented.edge_element
+        start, end = vertex_key(e.edge_start), vertex_key(e.edge_end)
+        # Note: without ids, an edge is known by its two vertices.
+        key = self._topology_key(e, lambda: frozenset((start, end)))
+        edges.append((key, start, end))
+      loops.append((self.step.type(bound) == 'face_outer_bound', edges))
+    self.topology.add_face(loops, face)
+
+  def _memo(self, obj, make):
+    """Returns make(obj), converting each entity once."""
+    ref = self._entity_ref(obj)
+    if ref is None:
+      return make(obj) # Note: steptools objects have no stable id here.
+    if ref not in self.memo:
+      self.memo[ref] = make(obj)
+    return self.memo[ref]
+
+  def _load_cached(self, key):
+    """Restores the results stored under key; returns None on a miss."""
+    entry = self.cache.load(key)
+    if entry is None:
+      return None
+    self.topology = entry['topology']
+    for k, n in entry['face_types'].items():
+      self.face_types[k] = self.face_types.get(k, 0) + n
+    self.unreadable.extend(entry['unreadable'])
+    self.unreadable_count += len(entry['unreadable'])
+    self.unreadable_types.update(entry['unreadable_types'])
+    return entry['objects']
+
+  def _store_cached(self, key, objects):
+    """Stores the results of get_3D_objects under key."""
+    self.cache.store(key, {
+      'objects': objects,
+      'face_types': self.face_types,
+      'unreadable': [self._entity_ref(obj) for obj in self.unreadable],
+      'unreadable_types': self.unreadable_types,
+      'topology': self.topology,
+    })
+
+  def iter_3D_objects(self, types=None, keep=True):
+    """Yields (type, object) as the entities of the types are converted."""
+    # Note: without keep, nothing outlives its entity (no memo, topology,
+    # unreadable objects or cache entry), so memory stays flat.
+    keys = set(types)
+    entry_key = None
+    if self.cache is not None:
+      entry_key = cache_key(file_digest(self.file_path), keys,
+                            self.backend)
+      objects = self._load_cached(entry_key)
+      if objects is not None:
+        for key in objects:
+          yield from ((key, obj) for obj in objects[key])
+        return
+
+    # Note: kept for the cache entry only.
+    stored = {key: [] for key in keys} if keep and entry_key else None
+    if 'advanced_face' in keys:
+      self.topology = Topology()
+
+    for obj in self._cursor(keys):
+      kind = self.step.type(obj)
+      if kind in keys and len(keys):
         self._count_face_type(obj)
+        converted = None
         try:
-          objects[step.type(obj)].append(self._convert(obj))
+          converted = self._convert(obj)
         except Exception as e:
-          self.unreadable.append(obj)
-          self.unreadable_types.add(step.type(obj.face_geometry))
+          self.unreadable_count += 1
+          self.unreadable_types.add(self.step.type(obj.face_geometry))
+          if keep:
+            self.unreadable.append(obj)
+        else:
+          if stored is not None:
+            stored[kind].append(converted)
+          yield kind, converted
+        if not keep:
+          self.memo.clear()
+        elif kind == 'advanced_face':
+          self._add_topology(obj, converted)
+
+    if stored is not None:
+      self._store_cached(entry_key, stored)
 
+  def get_3D_objects(self, types=None):
+    """Returns the 3D objects in the file."""
+    objects = {key: [] for key in types}
+    for key, obj in self.iter_3D_objects(types):
+      objects[key].append(obj)
     return objects
 
 
 class PlaneCollection:
   """Stores planes."""
-  def __init__(self, planes=None):
+  def __init__(self, planes=None, decimals=None):
     """Initializes a PlaneCollection object."""
     self.planes = planes
-    self.parallel = self._make_parallel(planes)
+    self.directions = DirectionIndex(decimals)
+    self.parallel = self._make_parallel(planes, self.directions)
     self._sort_by_axis_pos(self.parallel)
 
   def __repr__(self):
@@ -171,16 +397,9 @@ class PlaneCollection:
     return f'PlaneCollection({str(self.planes)})'
 
   @staticmethod
-  def _make_parallel(planes: list):
+  def _make_parallel(planes: list, directions):
     """Returns a dictionary of planes sorted by axis."""
-    parallel = dict()
-    for plane in planes:
-      abs_unit_ax = approx_vec(plane.abs_unit_dir())
-      if abs_unit_ax in parallel:
-        parallel[abs_unit_ax].append(plane)
-      else:
-        parallel[abs_unit_ax] = [plane]
-    return parallel
+    return directions.group(planes, lambda p: p.abs_unit_dir())
 
   @staticmethod
   def _sort_by_axis_pos(planes_by_dir: dict):
@@ -190,6 +409,11 @@ class PlaneCollection:
       planes_by_dir[key] = sorted(planes, key=lambda p:\
                                   p.pos_from_origin())
 
+  def distance_matrices(self):
+    """Returns, per direction, the distances between all its planes."""
+    return {direction: distance_matrix([p.pos_from_origin() for p in planes])
+            for direction, planes in self.parallel.items()}
+
   @withdividers
   def display_planes(self):
     """Prints out each direction and its planes."""
@@ -207,20 +431,33 @@ class PlaneCollection:
       print(f'At direction {direction}:')
       for i in range(len(self.parallel[direction])-1):
         print(f'Plane {i} and Plane {i+1} distance:', \
-              f'{col[i].distance_to_plane(col[i+1])}')
+              f'{col[i].distance_to_plane(col[i+1], self.directions.tol)}')
       total = len(self.parallel[direction])-1
       print(f'Plane 0 and Plane {total} distance:', \
-            f'{col[0].distance_to_plane(col[total])}')
+            f'{col[0].distance_to_plane(col[total], self.directions.tol)}')
       print('------')
 
 
 class FaceCollection:
   """Stores faces."""
-  def __init__(self, faces=None):
+  def __init__(self, faces=None, buckets=None, decimals=None):
     """Initializes a FaceCollection object."""
-    self.faces = faces
-    self.parallel = self._make_parallel(faces)
-    self._sort_by_axis_pos(self.parallel)
+    self.faces = list(faces) if faces is not None else []
+    # Note: the collection's own precision (Config.DECIMALS if None), used
+    # by its indexes and queries; the faces themselves are unrounded.
+    self.directions = DirectionIndex(decimals)
+    self.tol = self.directions.tol
+    if buckets is None:
+      self.parallel = self._make_parallel(self.faces, self.directions)
+      # Note: each face's axis position, computed once, parallel to its bucket.
+      self.positions: dict = self._sort_by_axis_pos(self.parallel)
+    else:
+      # Note: {direction: (faces, positions)}, already grouped and sorted
+      # (e.g. a FaceStore's), so they are taken as they are.
+      self.parallel, self.positions = self._take_buckets(buckets,
+                                                         self.directions)
+      self.faces = [f for faces in self.parallel.values() for f in faces]
+    self.index = None # Note: built on the first shadow query.
 
   def __repr__(self):
     """Returns the string representation."""
@@ -231,32 +468,147 @@ class FaceCollection:
     return len(self.faces)
 
   @staticmethod
-  def _make_parallel(faces: list):
+  def _direction(face):
+    """Returns the (unrounded) axis direction of a face."""
+    return face.plane.abs_unit_dir()
+
+  @staticmethod
+  @timed('collection.make_parallel')
+  def _make_parallel(faces: list, directions):
     """Returns a dictionary of faces sorted by axis."""
-    parallel = dict()
-    for face in faces:
-      abs_unit_ax = approx_vec(face.plane.abs_unit_dir())
-      if abs_unit_ax in parallel:
-        parallel[abs_unit_ax].append(face)
-      else:
-        parallel[abs_unit_ax] = [face]
-    return parallel
+    return directions.group(faces, FaceCollection._direction)
 
   @staticmethod
+  @timed('collection.sort_by_axis_pos')
   def _sort_by_axis_pos(faces_by_dir: dict):
-    """Sorts values (in face lists) by axis positions."""
+    """Sorts values (in face lists) by axis positions, returning those."""
+    positions = dict()
     for key in faces_by_dir:
-      faces = faces_by_dir[key]
-      faces_by_dir[key] = sorted(faces, key=lambda f:\
-                                  f.plane.pos_from_origin())
+      keyed = sorted(((f.plane.pos_from_origin(), i, f) for i, f in
+                      enumerate(faces_by_dir[key])), key=lambda k: k[:2])
+      faces_by_dir[key] = [f for _, _, f in keyed]
+      positions[key] = [pos for pos, _, _ in keyed]
+    return positions
+
+  @staticmethod
+  def _take_buckets(buckets: dict, directions):
+    """Returns the faces and positions of presorted buckets, by direction."""
+    parallel, positions = dict(), dict()
+    for direction, (faces, pos) in buckets.items():
+      key = directions.key(direction)
+      if key in parallel:
+        # Note: buckets a coarser precision joins are merged by position.
+        merged = list(merge(zip(positions[key], parallel[key]),
+                            zip(pos, faces), key=lambda k: k[0]))
+        positions[key] = [p for p, _ in merged]
+        parallel[key] = [f for _, f in merged]
+      else:
+        parallel[key], positions[key] = list(faces), list(pos)
+    return parallel, positions
+
+  def _locate(self, face):
+    """Returns the direction and bucket position of a stored face."""
+    direction = self.directions.find(self._direction(face))
+    faces, positions = self.parallel.get(direction, []), \
+                       self.positions.get(direction, [])
+    i = bisect_left(positions, face.plane.pos_from_origin())
+    # Note: equal positions are told apart by identity.
+    while i < len(faces) and faces[i] is not face:
+      i += 1
+    if i == len(faces):
+      raise ValueError('The face is not in the collection.')
+    return direction, i
+
+  def add(self, face):
+    """Inserts a face into its direction bucket, keeping the order."""
+    # Note: the bisection is O(log n), but list.insert shifts the bucket,
+    # so an update is O(n) (one memmove, no re-sort or re-grouping).
+    direction = self.directions.key(self._direction(face))
+    pos = face.plane.pos_from_origin()
+    faces = self.parallel.setdefault(direction, [])
+    positions = self.positions.setdefault(direction, [])
+    i = bisect_right(positions, pos)
+    faces.insert(i, face)
+    positions.insert(i, pos)
+    self.faces.append(face)
+    self.index = None
+
+  def remove(self, face):
+    """Removes a face (O(n), as add is: lookup alone is O(log n))."""
+    direction, i = self._locate(face)
+    del self.parallel[direction][i]
+    del self.positions[direction][i]
+    if not self.parallel[direction]:
+      del self.parallel[direction]
+      del self.positions[direction]
+    self.faces.remove(face)
+    self.index = None
+
+  def faces_between(self, direction, low, high):
+    """Returns the faces of a direction with low <= position <= high."""
+    direction = self.directions.find(direction)
+    positions = self.positions.get(direction, [])
+    i, j = bisect_left(positions, low), bisect_right(positions, high)
+    return self.parallel[direction][i:j] if i < j else []
+
+  def nearest_parallel(self, face):
+    """Returns the closest other face of the same direction, or None."""
+    direction, i = self._locate(face)
+    faces, positions = self.parallel[direction], self.positions[direction]
+    neighbours = [k for k in (i-1, i+1) if 0 <= k < len(faces)]
+    if not neighbours:
+      return None
+    k = min(neighbours, key=lambda k: abs(positions[k]-positions[i]))
+    return faces[k]
+
+  def get_index(self):
+    """Returns the spatial index of the faces, building it once."""
+    if self.index is None:
+      self.index = FaceIndex(self.parallel, self.tol)
+    return self.index
+
+  def overlapping_pairs(self, direction):
+    """Returns the face pairs of a direction that shadow each other."""
+    direction = self.directions.find(direction)
+    if direction is None:
+      return []
+    return self.get_index().overlapping_pairs(direction)
+
+  def faces_shadowing(self, face):
+    """Returns the faces that shadow the face."""
+    return self.get_index().faces_shadowing(face)
+
+  def distance_matrices(self):
+    """Returns, per direction, the distances between all its faces' planes."""
+    return {direction: distance_matrix(positions)
+            for direction, positions in self.positions.items()}
+
+  def shadow_matrices(self, workers=None):
+    """Returns, per direction, which faces shadow which (workers=0: serial)."""
+    return shadow_matrices(self.parallel, self.get_index(), workers)
+
+  def merge_coplanar(self, tol=None):
+    """Returns a FaceCollection with coplanar faces sharing edges merged."""
+    tol = self.tol if tol is None else tol
+    return FaceCollection(merge_coplanar(self.parallel, self.positions, tol),
+                          decimals=self.directions.decimals)
+
+  def to_arrays(self):
+    """Returns the faces as a FaceSoA sharing one vertex buffer."""
+    return FaceSoA(self.faces)
+
+  def export(self, path, face_types=None):
+    """Writes the faces (and face type counts) to a columnar FaceStore file."""
+    export_faces(self, path, face_types)
 
   @withdividers
   def display_faces(self):
     """Prints out each direction and its planes."""
     for direction in self.parallel:
       print(f'Direction: {direction.coordinates}')
-      for face in self.parallel[direction]:
-        print(f'Position {face.plane.pos_from_origin()}, {face}')
+      for pos, face in zip(self.positions[direction],
+                           self.parallel[direction]):
+        print(f'Position {pos}, {face}')
       print('------')
 
   @withdividers
@@ -268,26 +620,88 @@ class FaceCollection:
       for i in range(len(face_list)-1):
         print(face_list[i])
         print(face_list[i+1])
-        print(face_list[i].shadow(face_list[i+1]))
+        print(face_list[i].shadow(face_list[i+1], self.tol))
         print()
       print()
   
 
+class FaceSummary:
+  """Stores per-direction counts and position ranges of faces, not faces."""
+  def __init__(self, faces=None, decimals=None):
+    """Initializes a FaceSummary object."""
+    self.directions = DirectionIndex(decimals)
+    # Direction key -> [count, lowest position, highest position].
+    self.parallel: dict = dict()
+    self.count = 0
+    for face in faces or ():
+      self.add(face)
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'FaceSummary({self.count} faces, {len(self.parallel)} directions)'
+
+  def __len__(self):
+    """Returns the number of faces added."""
+    return self.count
+
+  def add(self, face):
+    """Counts a face in its direction's summary."""
+    direction = self.directions.key(FaceCollection._direction(face))
+    pos = face.plane.pos_from_origin()
+    summary = self.parallel.get(direction)
+    if summary is None:
+      self.parallel[direction] = [1, pos, pos]
+    else:
+      summary[0] += 1
+      summary[1], summary[2] = min(summary[1], pos), max(summary[2], pos)
+    self.count += 1
+
+  @withdividers
+  def display_faces(self):
+    """Prints out each direction's face count and position range."""
+    for direction, (count, low, high) in self.parallel.items():
+      print(f'Direction: {direction.coordinates}, {count} faces, '
+            f'positions {low} to {high}')
+
+
+def load_faces(store, decimals=None) -> FaceCollection:
+  """Returns a FaceStore's FaceCollection, at the stored precision if None."""
+  decimals = store.layout['decimals'] if decimals is None else decimals
+  return FaceCollection(buckets=store.to_buckets(), decimals=decimals)
+
+
+def collect_faces(objects, summary=False, decimals=None):
+  """Returns a FaceCollection (or FaceSummary) of a (type, object) stream."""
+  faces = FaceSummary(decimals=decimals) if summary else \
+          FaceCollection(decimals=decimals)
+  for key, obj in objects:
+    if key == 'advanced_face' and isinstance(obj, Face):
+      faces.add(obj)
+  return faces
+
+
 # ------Execution below.------
 
 
-def main(precision, path, types, out=True):
+def main(precision, path, types, out=True, backend='native',
+         cache_dir=None):
   """Executes the parallel-finding program."""
-  # Setting up.
-  Config.DECIMALS = precision
-  design = STPFile(path)
-
-  # Gets the self-defined objects by type.
-  objects = design.get_3D_objects(types)
+  # Setting up (the precision is the collection's, not a global).
+  design = STPFile(path, backend, cache_dir)
 
-  # Gets the planes and categorize by parallel.
-  face_list = objects['advanced_face']
-  faces = FaceCollection([f for f in face_list if type(f) == Face])
+  # Gets the self-defined objects by type, streamed into per-direction
+  # summaries (with out only, nothing else is needed). A cache still needs
+  # the objects kept, to store them on a miss.
+  if out:
+    faces = collect_faces(design.iter_3D_objects(types, cache_dir is not None),
+                          True, precision)
+  else:
+    objects = design.get_3D_objects(types)
+
+    # Gets the planes and categorize by parallel.
+    face_list = objects['advanced_face']
+    faces = FaceCollection([f for f in face_list if isinstance(f, Face)],
+                           decimals=precision)
   
   # # NOTE: now here are three things we can do.
 
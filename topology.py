@@ -0,0 +1,175 @@
+# Code Style:
+# 1. All object attributes are shown in the __init__ methods.
+# 2. All helper methods "_func()" are front-underscored and are static methods.
+# 3. All dunder "__func__()" are defined first, then the helpers, then the rest.
+# 4. All classes and methods, including dunders and helpers, have docstrings.
+# 5. All objects can be created without default parameters.
+# 6. Use 2 spaces for a tab, 2 lines for level 1, and 1 line for level 2.
+
+
+# NOTE: ids are consecutive integers, and "CSR" means a pair of arrays
+# (offsets, values) where item i's values are values[offsets[i]:offsets[i+1]].
+
+from array import array
+
+
+class Topology:
+  """Stores the vertices, edges, loops and faces of a model, by integer id."""
+  def __init__(self):
+    """Initializes a Topology object."""
+    # Vertex and edge keys (entity ids, when known) -> integer ids.
+    self.vertex_ids: dict = dict()
+    self.edge_ids: dict = dict()
+    # Edge e runs from edge_vertices[2*e] to edge_vertices[2*e+1].
+    self.edge_vertices = array('q')
+    # CSR: face f -> its loops, loop l -> its edges (in loop order).
+    self.face_loops = array('q', [0])
+    self.loop_edges = array('q', [0])
+    self.loop_edge_ids = array('q')
+    self.loop_outer = array('b')
+    # Face f's converted object (None when unreadable).
+    self.faces: list = []
+    # id(face object) -> face id, built on the first face_id query.
+    self.face_index: dict = None
+    # CSRs derived on the first adjacency query.
+    self.edge_faces: tuple = None
+    self.face_faces: tuple = None
+
+  def __repr__(self):
+    """Returns the string representation."""
+    return f'Topology({len(self.faces)} faces, {self.edge_count()} edges, ' \
+           f'{len(self.vertex_ids)} vertices)'
+
+  def __len__(self):
+    """Returns the number of faces."""
+    return len(self.faces)
+
+  def __getstate__(self):
+    """Returns the picklable state (object ids do not survive pickling)."""
+    state = dict(self.__dict__)
+    state['face_index'] = None
+    return state
+
+  @staticmethod
+  def _csr(n, pairs):
+    """Returns the (offsets, values) CSR of (row, value) pairs, n rows."""
+    offsets = array('q', bytes(8 * (n+1)))
+    for row, _ in pairs:
+      offsets[row+1] += 1
+    for i in range(n):
+      offsets[i+1] += offsets[i]
+    values = array('q', bytes(8 * len(pairs)))
+    cursor = offsets[:-1]
+    for row, value in pairs:
+      values[cursor[row]] = value
+      cursor[row] += 1
+    return offsets, values
+
+  @staticmethod
+  def _row(csr, i):
+    """Returns row i of a CSR."""
+    offsets, values = csr
+    return values[offsets[i]:offsets[i+1]]
+
+  def _vertex(self, key):
+    """Returns the id of a vertex, adding it when it is new."""
+    vid = self.vertex_ids.get(key)
+    if vid is None:
+      vid = self.vertex_ids[key] = len(self.vertex_ids)
+    return vid
+
+  def _edge(self, key, start, end):
+    """Returns the id of an edge, adding it when it is new."""
+    eid = self.edge_ids.get(key)
+    if eid is None:
+      eid = self.edge_ids[key] = len(self.edge_ids)
+      self.edge_vertices.extend((self._vertex(start), self._vertex(end)))
+    return eid
+
+  def _build(self):
+    """Derives the edge -> faces and face -> faces CSRs."""
+    pairs = [(e, f) for f in range(len(self.faces))
+             for e in set(self.edges_of(f))]
+    self.edge_faces = self._csr(self.edge_count(), pairs)
+    neighbours = set()
+    for e in range(self.edge_count()):
+      faces = self._row(self.edge_faces, e)
+      neighbours.update((f, g) for f in faces for g in faces if f != g)
+    self.face_faces = self._csr(len(self.faces), sorted(neighbours))
+
+  def add_face(self, loops, face=None):
+    """Adds a face from [(is outer, [(edge, start, end) keys])], by loop."""
+    for outer, edges in loops:
+      self.loop_edge_ids.extend(self._edge(*keys) for keys in edges)
+      self.loop_edges.append(len(self.loop_edge_ids))
+      self.loop_outer.append(outer)
+    self.face_loops.append(len(self.loop_outer))
+    self.faces.append(face)
+    self.face_index = self.edge_faces = self.face_faces = None
+    return len(self.faces) - 1
+
+  def edge_count(self):
+    """Returns the number of edges."""
+    return len(self.edge_vertices) // 2
+
+  def face_id(self, face):
+    """Returns the id of a converted face object."""
+    if self.face_index is None:
+      self.face_index = {id(f): fid for fid, f in enumerate(self.faces)
+                         if f is not None}
+    if id(face) not in self.face_index:
+      raise ValueError('The face is not in the topology.')
+    return self.face_index[id(face)]
+
+  def loops_of(self, f):
+    """Returns the loop ids of face f."""
+    return range(self.face_loops[f], self.face_loops[f+1])
+
+  def loop(self, l):
+    """Returns the edge ids of loop l, in order."""
+    return self.loop_edge_ids[self.loop_edges[l]:self.loop_edges[l+1]]
+
+  def edges_of(self, f):
+    """Returns the edge ids of face f, loop by loop."""
+    lo, hi = self.face_loops[f], self.face_loops[f+1]
+    return self.loop_edge_ids[self.loop_edges[lo]:self.loop_edges[hi]]
+
+  def vertices_of_edge(self, e):
+    """Returns the (start, end) vertex ids of edge e."""
+    return self.edge_vertices[2*e], self.edge_vertices[2*e+1]
+
+  def faces_of_edge(self, e):
+    """Returns the ids of the faces using edge e."""
+    if self.edge_faces is None:
+      self._build()
+    return self._row(self.edge_faces, e)
+
+  def neighbours(self, f):
+    """Returns the ids of the faces sharing an edge with face f."""
+    if self.face_faces is None:
+      self._build()
+    return self._row(self.face_faces, f)
+
+  def shared_edges(self, f, g):
+    """Returns the ids of the edges faces f and g share."""
+    edges = set(self.edges_of(g))
+    return [e for e in dict.fromkeys(self.edges_of(f)) if e in edges]
+
+  def shells(self):
+    """Returns the connected sets of faces, as sorted lists of ids."""
+    seen = bytearray(len(self.faces))
+    shells = []
+    for start in range(len(self.faces)):
+      if seen[start]:
+        continue
+      seen[start] = 1
+      shell, stack = [], [start]
+      while stack:
+        f = stack.pop()
+        shell.append(f)
+        for g in self.neighbours(f):
+          if not seen[g]:
+            seen[g] = 1
+            stack.append(g)
+      shells.append(sorted(shell))
+    return shells